@@ -92,19 +92,24 @@ def has_staging_data() -> bool:
         return False
 
 
-def auto_commit_staging():
+def auto_commit_staging(mm=None):
     """自动提交暂存区数据（静默）"""
     try:
         from memory_staging import commit_staging
-        result = commit_staging()
+        result = commit_staging(mm=mm)
         # 如果提交了数据，需要刷新缓存
         return result.get("committed", 0) > 0
     except Exception:
         return False
 
 
-def main():
-    """主函数：依次执行初始化步骤"""
+def main(mm=None):
+    """
+    主函数：依次执行初始化步骤
+
+    Args:
+        mm: 常驻进程（memory_daemon）传入的 MemoryManager，复用其已加载的存储
+    """
     try:
         # 设置环境变量解决编码问题
         os.environ['PYTHONIOENCODING'] = 'utf-8'
@@ -112,7 +117,7 @@ def main():
         # 1. 检查暂存区，有数据则自动提交
         staging_committed = False
         if has_staging_data():
-            staging_committed = auto_commit_staging()
+            staging_committed = auto_commit_staging(mm)
 
         # 2. 检查缓存新鲜度（如果暂存区提交了数据，强制刷新缓存）
         if not staging_committed and is_cache_fresh():
@@ -126,7 +131,7 @@ def main():
         old_stdout = sys.stdout
         sys.stdout = io.StringIO()
 
-        quick_load_main()
+        quick_load_main(mm.storage if mm is not None else None)
 
         sys.stdout = old_stdout
 
@@ -136,4 +141,9 @@ def main():
 
 
 if __name__ == "__main__":
+    # 有常驻进程（memory_daemon）时交给它执行
+    from memory_daemon import forward
+    exit_code = forward("activate", sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
     main()
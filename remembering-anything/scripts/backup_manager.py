@@ -16,6 +16,10 @@ from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+from memory_journal import journal_path, access_log_path
+from memory_conflicts import CONFLICTS_FILE
+from memory_storage import read_store
+
 
 class BackupManager:
     """Manage memory backups and exports."""
@@ -81,11 +85,9 @@ class BackupManager:
         }
 
         # Load memory files
-        for memory_type in ['facts', 'preferences', 'experiences']:
-            memory_file = self.user_data / "memory" / f"{memory_type}.json"
-            if memory_file.exists():
-                with open(memory_file, 'r', encoding='utf-8') as f:
-                    export_data['memories'][memory_type] = json.load(f)
+        memory_dir = self.user_data / "memory"
+        for memory_type in ['fact', 'preference', 'experience']:
+            export_data['memories'][f"{memory_type}s"] = read_store(memory_dir, memory_type)
 
         # Load notes metadata
         notes = []
@@ -118,36 +120,31 @@ class BackupManager:
 
         # Export facts
         md_lines.append("## 📌 事实记忆\n")
-        facts_file = self.user_data / "memory" / "facts.json"
-        if facts_file.exists():
-            with open(facts_file, 'r', encoding='utf-8') as f:
-                facts = json.load(f)
-                for fact in facts.values():
-                    if fact.get('status') == 'active':
-                        md_lines.append(f"- **{fact.get('category', 'general')}**: {fact.get('content', '')}")
-                        if fact.get('tags'):
-                            md_lines.append(f"  - 标签: {', '.join(fact['tags'])}")
+        memory_dir = self.user_data / "memory"
+        facts = read_store(memory_dir, "fact")
+        if facts:
+            for fact in facts.values():
+                if fact.get('status') == 'active':
+                    md_lines.append(f"- **{fact.get('category', 'general')}**: {fact.get('content', '')}")
+                    if fact.get('tags'):
+                        md_lines.append(f"  - 标签: {', '.join(fact['tags'])}")
 
         # Export preferences
         md_lines.append("\n## 💝 偏好记忆\n")
-        prefs_file = self.user_data / "memory" / "preferences.json"
-        if prefs_file.exists():
-            with open(prefs_file, 'r', encoding='utf-8') as f:
-                prefs = json.load(f)
-                for pref in prefs.values():
-                    if pref.get('status') == 'active':
-                        md_lines.append(f"- **{pref.get('category', 'general')}**: {pref.get('content', '')}")
+        prefs = read_store(memory_dir, "preference")
+        if prefs:
+            for pref in prefs.values():
+                if pref.get('status') == 'active':
+                    md_lines.append(f"- **{pref.get('category', 'general')}**: {pref.get('content', '')}")
 
         # Export experiences
         md_lines.append("\n## 📚 经历记忆\n")
-        exp_file = self.user_data / "memory" / "experiences.json"
-        if exp_file.exists():
-            with open(exp_file, 'r', encoding='utf-8') as f:
-                exps = json.load(f)
-                for exp in exps.values():
-                    if exp.get('status') == 'active':
-                        date = exp.get('timestamp', '')[:10] if exp.get('timestamp') else ''
-                        md_lines.append(f"- **[{date}]** {exp.get('content', '')}")
+        exps = read_store(memory_dir, "experience")
+        if exps:
+            for exp in exps.values():
+                if exp.get('status') == 'active':
+                    date = exp.get('timestamp', '')[:10] if exp.get('timestamp') else ''
+                    md_lines.append(f"- **[{date}]** {exp.get('content', '')}")
 
         # Notes summary
         md_lines.append("\n## 📝 笔记列表\n")
@@ -212,6 +209,18 @@ class BackupManager:
         print("[i] Creating backup of current state...")
         self.create_full_backup("Pre-restore backup")
 
+        # Drop current journals, access logs and conflict reports so they are
+        # not applied to the restored snapshots (the backup's own copies are
+        # extracted below)
+        memory_dir = self.user_data / "memory"
+        derived = [memory_dir / CONFLICTS_FILE]
+        for memory_type in ['facts', 'preferences', 'experiences']:
+            store = memory_dir / f"{memory_type}.json"
+            derived += [journal_path(store), access_log_path(store)]
+        for path in derived:
+            if path.exists():
+                path.unlink()
+
         # Extract backup
         print(f"[i] Restoring from: {backup_path}")
         with zipfile.ZipFile(backup_path, 'r') as zipf:
@@ -0,0 +1,433 @@
+"""
+asyncio API for the memory manager.
+
+AsyncMemoryManager mirrors the public methods of MemoryManager as
+coroutines for hosts that run an event loop. Every call runs on a bounded
+thread pool, so disk reads and JSON parsing never block the loop.
+
+MemoryManager is not thread-safe, so each worker thread owns its own
+MemoryManager (with its own read cache). The workers only meet on disk,
+where they synchronize through the store locks like separate sessions do
+(see memory_lock): a write made on one worker is seen by the next read on
+any other. Calls that read several stores (get_core_memories,
+get_memories_by_importance, export_memories, substring search over all
+types) read each store on its own worker concurrently.
+
+MemoryManager returns copies of its cached records, so later writes on a
+worker never change a dict the caller holds.
+"""
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, List, Dict, Any, Tuple, Callable, TypeVar
+
+from memory_manager import MemoryManager
+from memory_storage import MEMORY_TYPES
+from memory_index import DEFAULT_SIMILARITY_THRESHOLD
+from memory_schema import FactMemory, PreferenceMemory, ExperienceMemory, ConflictReport, copy_record
+
+DEFAULT_WORKERS = 4
+
+T = TypeVar("T")
+
+
+def _write_json(output_file: str, data: Dict[str, Any]):
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+class AsyncMemoryManager:
+    """
+    Coroutine version of MemoryManager backed by a bounded thread pool.
+
+    Settings changed through this object (similarity_threshold,
+    merge_similar, set_single_value_categories, clear_cache) reach every
+    worker before its next call. For a unit of work spanning several calls
+    (MemoryManager.batch), pass a function to run(), which gets one
+    worker's MemoryManager.
+
+    Example:
+        async with AsyncMemoryManager() as amm:
+            core, results = await asyncio.gather(
+                amm.get_core_memories(), amm.search_memories("咖啡", rank="bm25"))
+    """
+
+    def __init__(self, memory_dir: Optional[str] = None, max_workers: int = DEFAULT_WORKERS, **options):
+        """
+        Initialize the async memory manager.
+
+        Args:
+            memory_dir: Path to memory directory. If None, uses global path.
+            max_workers: Number of worker threads (each with its own
+                MemoryManager and read cache)
+            **options: Further MemoryManager arguments (backend, journal, ...)
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self._options = dict(options, memory_dir=memory_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="memory")
+        self._closed = False
+        self._local = threading.local()
+
+        # Settings every worker applies before its next call, and a counter
+        # of clear_cache() requests
+        self._settings: Dict[str, Any] = {}
+        self._version = 0
+        self._clears = 0
+        # Cache counters of each worker after its last call
+        self._cache_stats: Dict[int, Dict[str, int]] = {}
+
+        # Near duplicates found by the last add_* call (see find_similar)
+        self.last_similar: List[Dict[str, Any]] = []
+        # Cursor of the page after the last get_active_* call (None if it was the last page)
+        self.next_cursor: Optional[str] = None
+
+    async def __aenter__(self) -> "AsyncMemoryManager":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # ========== Worker threads ==========
+
+    def _manager(self) -> MemoryManager:
+        """The MemoryManager of the calling worker thread, brought up to date with the settings."""
+        local = self._local
+        if getattr(local, "manager", None) is None:
+            local.manager = MemoryManager(**self._options)
+            local.version = local.clears = 0
+
+        mm = local.manager
+        if local.clears != self._clears:
+            local.clears = self._clears
+            mm.clear_cache()
+        if local.version != self._version:
+            local.version = self._version
+            for name, value in list(self._settings.items()):
+                if name == "single_value_categories":
+                    mm.set_single_value_categories(value)
+                else:
+                    setattr(mm, name, value)
+        return mm
+
+    def _call(self, fn: Callable[[MemoryManager], T]) -> T:
+        mm = self._manager()
+        try:
+            return fn(mm)
+        finally:
+            self._cache_stats[threading.get_ident()] = mm.get_cache_stats()
+
+    async def run(self, fn: Callable[[MemoryManager], T]) -> T:
+        """
+        Run fn with a worker's MemoryManager on the thread pool.
+
+        Example:
+            def add_all(mm):
+                with mm.batch():
+                    return [mm.add_fact(**item) for item in items]
+            ids = await amm.run(add_all)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn)
+
+    def _change(self, name: str, value: Any):
+        self._settings[name] = value
+        self._version += 1
+
+    async def close(self):
+        """Close every worker's storage (in its own thread) and stop the pool."""
+        if self._closed:
+            return
+        self._closed = True
+        # The barrier holds each task until all are running, so each one
+        # lands on a different thread
+        barrier = threading.Barrier(self.max_workers)
+
+        def close_worker():
+            barrier.wait()
+            manager = getattr(self._local, "manager", None)
+            if manager is not None:
+                manager.close()
+                self._local.manager = None
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, close_worker)
+                               for _ in range(self.max_workers)))
+        self._executor.shutdown(wait=True)
+
+    # ========== Settings ==========
+
+    @property
+    def similarity_threshold(self) -> Optional[float]:
+        return self._settings.get("similarity_threshold", self._options.get("similarity_threshold", DEFAULT_SIMILARITY_THRESHOLD))
+
+    @similarity_threshold.setter
+    def similarity_threshold(self, value: Optional[float]):
+        self._change("similarity_threshold", value)
+
+    @property
+    def merge_similar(self) -> bool:
+        return self._settings.get("merge_similar", self._options.get("merge_similar", False))
+
+    @merge_similar.setter
+    def merge_similar(self, value: bool):
+        self._change("merge_similar", value)
+
+    # ========== Add Operations ==========
+
+    async def _add(self, method: str, *args, **kwargs) -> str:
+        memory_id, self.last_similar = await self.run(
+            lambda mm: (getattr(mm, method)(*args, **kwargs), mm.last_similar))
+        return memory_id
+
+    async def add_fact(
+        self,
+        content: str,
+        category: str,
+        source: str,
+        confidence: float = 1.0,
+        tags: Optional[List[str]] = None,
+        supersedes: Optional[str] = None,
+        importance: str = "active",
+        context_tags: Optional[List[str]] = None,
+        attachments: Optional[List[str]] = None,
+    ) -> str:
+        """See MemoryManager.add_fact; near duplicates are left in last_similar."""
+        return await self._add("add_fact", content, category, source, confidence, tags,
+                               supersedes, importance, context_tags, attachments)
+
+    async def add_preference(
+        self,
+        content: str,
+        category: str,
+        source: str,
+        strength: str = "moderate",
+        confidence: float = 1.0,
+        tags: Optional[List[str]] = None,
+        importance: str = "active",
+        context_tags: Optional[List[str]] = None,
+        attachments: Optional[List[str]] = None,
+    ) -> str:
+        """See MemoryManager.add_preference."""
+        return await self._add("add_preference", content, category, source, strength, confidence,
+                               tags, importance, context_tags, attachments)
+
+    async def add_experience(
+        self,
+        content: str,
+        category: str,
+        source: str,
+        date: Optional[str] = None,
+        outcome: Optional[str] = None,
+        confidence: float = 1.0,
+        tags: Optional[List[str]] = None,
+        importance: str = "active",
+        context_tags: Optional[List[str]] = None,
+        attachments: Optional[List[str]] = None,
+    ) -> str:
+        """See MemoryManager.add_experience."""
+        return await self._add("add_experience", content, category, source, date, outcome,
+                               confidence, tags, importance, context_tags, attachments)
+
+    # ========== Query Operations ==========
+
+    async def get_memory(self, memory_id: str, memory_type: str) -> Optional[Dict]:
+        """Get a specific memory by ID."""
+        return await self.run(lambda mm: mm.get_memory(memory_id, memory_type))
+
+    async def find_duplicate(self, memory_type: str, content: str, category: str) -> Optional[str]:
+        """See MemoryManager.find_duplicate."""
+        return await self.run(lambda mm: mm.find_duplicate(memory_type, content, category))
+
+    async def find_similar(
+        self,
+        memory_type: str,
+        content: str,
+        category: str,
+        threshold: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """See MemoryManager.find_similar."""
+        return await self.run(lambda mm: mm.find_similar(memory_type, content, category, threshold))
+
+    async def _active_page(self, method: str, *args) -> List[Dict]:
+        records, self.next_cursor = await self.run(
+            lambda mm: (getattr(mm, method)(*args), mm.next_cursor))
+        return records
+
+    async def get_active_facts(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[FactMemory]:
+        """See MemoryManager.get_active_facts; the next page's cursor is left in next_cursor."""
+        return await self._active_page("get_active_facts", category, limit, cursor, since, until)
+
+    async def get_active_preferences(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[PreferenceMemory]:
+        """Get active preferences, newest first; paging as in get_active_facts()."""
+        return await self._active_page("get_active_preferences", category, limit, cursor, since, until)
+
+    async def get_active_experiences(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[ExperienceMemory]:
+        """Get active experiences, newest first; paging as in get_active_facts()."""
+        return await self._active_page("get_active_experiences", category, limit, cursor, since, until)
+
+    async def get_recent_memories(
+        self,
+        memory_type: str,
+        limit: Optional[int] = 10,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Dict]:
+        """See MemoryManager.get_recent_memories."""
+        return await self.run(lambda mm: mm.get_recent_memories(memory_type, limit, since, until))
+
+    async def search_memories(
+        self,
+        query: str,
+        memory_type: Optional[str] = None,
+        rank: Optional[str] = None,
+        top_k: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        See MemoryManager.search_memories.
+
+        A substring search over all types reads the stores concurrently;
+        BM25 ranks with statistics of all searched stores, so it runs as
+        one call.
+        """
+        if memory_type is not None or rank is not None:
+            return await self.run(lambda mm: mm.search_memories(query, memory_type, rank, top_k))
+
+        per_type = await asyncio.gather(*(
+            self.run(partial(MemoryManager.search_memories, query=query, memory_type=t))
+            for t in MEMORY_TYPES))
+        results = [memory for memories in per_type for memory in memories]
+        return results if top_k is None else results[:max(top_k, 0)]
+
+    async def semantic_search(self, query: str, k: int = 5, memory_type: Optional[str] = None) -> List[Dict]:
+        """See MemoryManager.semantic_search."""
+        return await self.run(lambda mm: mm.semantic_search(query, k, memory_type))
+
+    # ========== Update Operations ==========
+
+    async def update_fact(self, memory_id: str, **updates) -> bool:
+        """Update a fact memory."""
+        return await self.run(lambda mm: mm.update_fact(memory_id, **updates))
+
+    async def deprecate_memory(self, memory_id: str, memory_type: str) -> bool:
+        """Mark a memory as deprecated."""
+        return await self.run(lambda mm: mm.deprecate_memory(memory_id, memory_type))
+
+    async def delete_memory(self, memory_id: str, memory_type: str) -> bool:
+        """Permanently delete a memory."""
+        return await self.run(lambda mm: mm.delete_memory(memory_id, memory_type))
+
+    # ========== Conflict Detection ==========
+
+    async def detect_conflicts(self) -> List[ConflictReport]:
+        """See MemoryManager.detect_conflicts."""
+        return await self.run(MemoryManager.detect_conflicts)
+
+    async def single_value_categories(self) -> List[str]:
+        """Fact categories that may hold only one active fact."""
+        return await self.run(lambda mm: mm.single_value_categories)
+
+    async def set_single_value_categories(self, categories: List[str]):
+        """See MemoryManager.set_single_value_categories."""
+        self._change("single_value_categories", list(categories))
+        # Applied (and the conflicts recomputed) by the worker before the call
+        await self.run(lambda mm: None)
+
+    # ========== Layered Memory Operations ==========
+
+    async def get_core_memories(self) -> Dict[str, List[Dict]]:
+        """See MemoryManager.get_core_memories."""
+        return await self.get_memories_by_importance("core")
+
+    async def get_memories_by_importance(self, importance_level: str) -> Dict[str, List[Dict]]:
+        """See MemoryManager.get_memories_by_importance; the three stores are read concurrently."""
+        facts, preferences, experiences = await asyncio.gather(*(
+            self.run(lambda mm, t=t: [copy_record(m) for m in mm.storage.select(t, importance=importance_level)])
+            for t in MEMORY_TYPES))
+        return {"facts": facts, "preferences": preferences, "experiences": experiences}
+
+    async def query_by_context(self, context_tags: List[str], limit: int = 5) -> List[Dict]:
+        """See MemoryManager.query_by_context."""
+        return await self.run(lambda mm: mm.query_by_context(context_tags, limit))
+
+    async def mark_accessed(self, memory_id: str, memory_type: str):
+        """Mark a memory as accessed (updates access_count and last_accessed)."""
+        await self.run(lambda mm: mm.mark_accessed(memory_id, memory_type))
+
+    async def mark_accessed_many(self, accesses: List[Tuple[str, str]]) -> int:
+        """See MemoryManager.mark_accessed_many."""
+        return await self.run(lambda mm: mm.mark_accessed_many(accesses))
+
+    async def flush_access(self) -> Dict[str, int]:
+        """See MemoryManager.flush_access."""
+        return await self.run(MemoryManager.flush_access)
+
+    async def auto_maintain_importance(self, days_active: int = 7, days_contextual: int = 30) -> Dict[str, int]:
+        """See MemoryManager.auto_maintain_importance."""
+        return await self.run(lambda mm: mm.auto_maintain_importance(days_active, days_contextual))
+
+    # ========== Utility Functions ==========
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Read cache counters summed over the workers (as of each worker's last call)."""
+        totals: Dict[str, int] = {}
+        for stats in list(self._cache_stats.values()):
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def clear_cache(self):
+        """Drop every worker's cached store contents before its next call."""
+        self._clears += 1
+
+    async def compact(self) -> Dict[str, int]:
+        """See MemoryManager.compact."""
+        return await self.run(MemoryManager.compact)
+
+    async def get_all_categories(self, memory_type: str) -> List[str]:
+        """Get all unique categories for a memory type."""
+        return await self.run(lambda mm: mm.get_all_categories(memory_type))
+
+    async def export_memories(self, output_file: str):
+        """Export all memories to a single JSON file, reading the stores concurrently."""
+        facts, preferences, experiences, metadata = await asyncio.gather(
+            *(self.run(lambda mm, t=t: {i: copy_record(m) for i, m in mm.storage.load(t).items()})
+              for t in MEMORY_TYPES),
+            self.run(lambda mm: copy_record(mm.storage.get_metadata())))
+        export_data = {
+            "facts": facts,
+            "preferences": preferences,
+            "experiences": experiences,
+            "metadata": metadata,
+        }
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, _write_json, output_file, export_data)
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        """See MemoryManager.get_statistics."""
+        return await self.run(MemoryManager.get_statistics)
@@ -0,0 +1,939 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the memory storage layer.
+
+Builds synthetic memory stores of the requested sizes in a temporary
+directory and times the indexed code paths against the plain scans they
+replace. Results of both paths are compared, so a benchmark run doubles as
+a consistency check.
+
+Usage:
+    python memory_benchmark.py search [--sizes 10000,100000] [--repeat 5]
+    python memory_benchmark.py context
+    python memory_benchmark.py records
+    python memory_benchmark.py columns
+    python memory_benchmark.py jsonl --sizes 600000    # ~100 MB facts store
+    python memory_benchmark.py mmap --sizes 50000
+    python memory_benchmark.py shards --sizes 50000
+    python memory_benchmark.py near --sizes 100000
+    python memory_benchmark.py rank
+    python memory_benchmark.py semantic --sizes 10000,100000
+    python memory_benchmark.py pages
+    python memory_benchmark.py epochs --sizes 100000
+    python memory_benchmark.py async --sizes 10000      # 100 concurrent queries on an event loop
+    python memory_benchmark.py daemon --sizes 10000     # script calls with and without memory_daemon
+    python memory_benchmark.py forkserver --sizes 10000 # script startup with and without memory_forkserver
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import memory_journal
+import memory_jsonl
+import memory_mmap
+import memory_shards
+from memory_schema import create_memory_id, compact_records, record_epoch, to_epoch_micros, MICROS_PER_DAY
+from memory_storage import (
+    MEMORY_TYPES, MemoryStorage, JsonStorage, create_storage, convert_store_format, shard_stores,
+    read_store, read_recent, backfill_epochs,
+)
+import memory_columns
+import memory_rank
+import memory_vectors
+from memory_columns import ColumnarView
+from memory_manager import MemoryManager
+from memory_async import AsyncMemoryManager
+
+# Vocabulary for synthetic content, mostly Chinese like real user data
+WORDS = [
+    "用户", "喜欢", "咖啡", "北京", "上海", "编程", "项目", "周末", "跑步", "阅读",
+    "工作", "学习", "机器学习", "前端", "后端", "数据库", "旅行", "音乐", "电影", "早起",
+    "Python", "TypeScript", "React", "Docker", "Linux", "API", "vim", "tea", "remote", "deadline",
+]
+TAGS = ["工作", "生活", "技术", "健康", "学习", "coding", "travel", "food"]
+CATEGORIES = ["location", "occupation", "education", "hobby", "skill"]
+
+CONTEXT_QUERIES = [["coding"], ["工作", "学习"], ["travel", "food", "健康"], ["不存在"]]
+
+SEARCH_QUERIES = ["咖啡", "京", "机器学习", "python", "用户喜欢", "docker", "前端 项目", "不存在的词"]
+
+
+def make_content(rng: random.Random, index: int) -> str:
+    """Build one synthetic memory text."""
+    words = rng.sample(WORDS, rng.randint(3, 8))
+    return " ".join(words) + f" #{index}"
+
+
+def build_store_dir(size: int, seed: int = 42, step: timedelta = timedelta(minutes=1)) -> Path:
+    """
+    Create a memory directory holding `size` synthetic memories.
+
+    Memories are split evenly over the three stores and created `step`
+    apart; about a tenth are deprecated so status filtering is exercised
+    as well.
+    """
+    rng = random.Random(seed)
+    memory_dir = Path(tempfile.mkdtemp(prefix="memory_bench_"))
+    stores: Dict[str, Dict[str, Dict]] = {memory_type: {} for memory_type in MEMORY_TYPES}
+    base_time = datetime(2024, 1, 1)
+
+    for i in range(size):
+        memory_type = MEMORY_TYPES[i % len(MEMORY_TYPES)]
+        content = make_content(rng, i)
+        timestamp = (base_time + step * i).isoformat()
+        memory = {
+            "id": create_memory_id(),
+            "type": memory_type,
+            "category": rng.choice(CATEGORIES),
+            "content": content,
+            "source": "benchmark",
+            "timestamp": timestamp,
+            "last_updated": timestamp,
+            "confidence": 1.0,
+            "status": "deprecated" if rng.random() < 0.1 else "active",
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "importance": rng.choice(["core", "active", "active", "contextual", "archived"]),
+            "context_tags": rng.sample(TAGS, rng.randint(0, 2)),
+            "access_count": rng.randint(0, 50),
+            "last_accessed": None,
+        }
+        stores[memory_type][memory["id"]] = memory
+
+    for memory_type, data in stores.items():
+        memory_journal.write_snapshot(JsonStorage(memory_dir).files[memory_type], data)
+    return memory_dir
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    """Best wall time of `repeat` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_search(size: int, repeat: int) -> bool:
+    """Compare indexed search against the substring scan."""
+    memory_dir = build_store_dir(size)
+    try:
+        # The n-gram index is read explicitly: search() scans until a store was searched a few times
+        start = time.perf_counter()
+        storage = JsonStorage(memory_dir)
+        for memory_type in MEMORY_TYPES:
+            storage.load_indexes(memory_type)[1]["ngram"]
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        reloaded = JsonStorage(memory_dir)
+        for memory_type in MEMORY_TYPES:
+            reloaded.load_indexes(memory_type)[1]["ngram"]
+        warm_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n== search: {size} memories ==")
+        print(f"load + build index: {cold_ms:8.1f} ms   load with saved index: {warm_ms:8.1f} ms")
+        print(f"{'query':<14}{'hits':>8}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        types = list(MEMORY_TYPES)
+        consistent = True
+        for query in SEARCH_QUERIES:
+            indexed = storage.search(query, types)
+            scanned = MemoryStorage.search(storage, query, types)
+            if [m["id"] for m in indexed] != [m["id"] for m in scanned]:
+                consistent = False
+                print(f"[!] Result mismatch for '{query}'")
+
+            scan_ms = best_of(lambda: MemoryStorage.search(storage, query, types), repeat)
+            index_ms = best_of(lambda: storage.search(query, types), repeat)
+            speedup = scan_ms / index_ms if index_ms else float("inf")
+            print(f"{query:<14}{len(indexed):>8}{scan_ms:>12.2f}{index_ms:>12.2f}{speedup:>9.1f}x")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def bench_context(size: int, repeat: int) -> bool:
+    """Compare the tag index top-k against the full context scan."""
+    memory_dir = build_store_dir(size)
+    try:
+        storage = JsonStorage(memory_dir)
+        print(f"\n== context: {size} memories ==")
+        print(f"{'tags':<24}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        consistent = True
+        for tags in CONTEXT_QUERIES:
+            indexed = storage.query_by_context(tags, 5)
+            scanned = MemoryStorage.query_by_context(storage, tags, 5)
+            if [m["id"] for m in indexed] != [m["id"] for m in scanned]:
+                consistent = False
+                print(f"[!] Result mismatch for {tags}")
+
+            scan_ms = best_of(lambda: MemoryStorage.query_by_context(storage, tags, 5), repeat)
+            index_ms = best_of(lambda: storage.query_by_context(tags, 5), repeat)
+            speedup = scan_ms / index_ms if index_ms else float("inf")
+            label = ",".join(tags)
+            print(f"{label:<24}{scan_ms:>12.2f}{index_ms:>12.2f}{speedup:>9.1f}x")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def measure_bytes(build: Callable[[], object]) -> Tuple[object, int]:
+    """Bytes allocated (and still held) by the object `build` returns."""
+    tracemalloc.start()
+    try:
+        result = build()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, allocated
+
+
+def bench_records(size: int, repeat: int) -> bool:
+    """Compare bytes per record of JSON dicts and CompactMemory records."""
+    memory_dir = build_store_dir(size)
+    try:
+        path = JsonStorage(memory_dir).files["fact"]
+        dicts, dict_bytes = measure_bytes(lambda: memory_journal.load_store(path))
+        compact, compact_bytes = measure_bytes(lambda: compact_records(memory_journal.load_store(path)))
+        count = len(dicts)
+
+        print(f"\n== records: {count} facts ==")
+        print(f"{'form':<16}{'total KB':>12}{'bytes/record':>16}")
+        print(f"{'dict':<16}{dict_bytes / 1024:>12.0f}{dict_bytes / count:>16.0f}")
+        print(f"{'CompactMemory':<16}{compact_bytes / 1024:>12.0f}{compact_bytes / count:>16.0f}")
+        print(f"saved: {1 - compact_bytes / dict_bytes:.0%}")
+
+        consistent = all(compact[memory_id].to_dict() == record for memory_id, record in dicts.items())
+        if not consistent:
+            print("[!] CompactMemory round trip differs from the JSON dicts")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def scan_where(data: Dict[str, Dict], status=None, importance=None, before=None) -> List[str]:
+    """Dict-loop equivalent of ColumnarView.where()."""
+    results = []
+    for memory in data.values():
+        if status is not None and memory.get("status") != status:
+            continue
+        if importance is not None and memory.get("importance") != importance:
+            continue
+        if before is not None and not datetime.fromisoformat(memory["timestamp"]) < before:
+            continue
+        results.append(memory["id"])
+    return results
+
+
+def bench_columns(size: int, repeat: int) -> bool:
+    """Compare columnar predicates against dict loops."""
+    memory_dir = build_store_dir(size)
+    try:
+        data = JsonStorage(memory_dir).load("fact")
+        start = time.perf_counter()
+        view = ColumnarView(data)
+        build_ms = (time.perf_counter() - start) * 1000
+        cutoff = datetime(2024, 1, 1) + timedelta(minutes=size // 2)
+
+        backend = "numpy" if memory_columns.np is not None else "pure Python"
+        print(f"\n== columns: {len(data)} facts ({backend}) ==")
+        print(f"build view: {build_ms:8.1f} ms")
+        print(f"{'predicate':<18}{'hits':>8}{'scan ms':>12}{'column ms':>12}{'speedup':>10}")
+
+        predicates = {
+            "active core": {"status": "active", "importance": "core"},
+            "older than": {"before": cutoff},
+            "active old": {"status": "active", "before": cutoff},
+        }
+        consistent = True
+        for label, filters in predicates.items():
+            columnar = view.where(**filters)
+            if columnar != scan_where(data, **filters):
+                consistent = False
+                print(f"[!] Result mismatch for '{label}'")
+
+            scan_ms = best_of(lambda: scan_where(data, **filters), repeat)
+            column_ms = best_of(lambda: view.where(**filters), repeat)
+            speedup = scan_ms / column_ms if column_ms else float("inf")
+            print(f"{label:<18}{len(columnar):>8}{scan_ms:>12.2f}{column_ms:>12.2f}{speedup:>9.1f}x")
+
+        top = view.top_access(10, status="active")
+        expected = [m["id"] for m in sorted(
+            (m for m in data.values() if m["status"] == "active"),
+            key=lambda m: -m["access_count"])[:10]]
+        if top != expected:
+            consistent = False
+            print("[!] Result mismatch for top access")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def cold_call(fn: Callable[[], object]) -> Tuple[object, float, int]:
+    """Run fn once with a clean offset cache; returns (result, ms, peak bytes)."""
+    memory_jsonl._offsets_cache.clear()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_jsonl(size: int, repeat: int) -> bool:
+    """Compare cold reads of a JSON snapshot and a JSONL snapshot with offset index."""
+    json_dir = build_store_dir(size)
+    jsonl_dir = Path(tempfile.mkdtemp(prefix="memory_bench_"))
+    try:
+        shutil.copytree(json_dir, jsonl_dir, dirs_exist_ok=True)
+        convert_store_format(jsonl_dir, "jsonl")
+        json_path = JsonStorage(json_dir).files["fact"]
+        jsonl_path = JsonStorage(jsonl_dir).files["fact"]
+        size_mb = json_path.stat().st_size / 1024 / 1024
+        ids = list(JsonStorage(json_dir).load("fact"))  # also saves the JSON index
+        probe = ids[len(ids) // 2]
+
+        print(f"\n== jsonl: {len(ids)} facts ({size_mb:.0f} MB as JSON, "
+              f"{jsonl_path.stat().st_size / 1024 / 1024:.0f} MB as JSONL) ==")
+        print(f"{'operation':<18}{'json ms':>12}{'jsonl ms':>12}{'json MB':>10}{'jsonl MB':>10}")
+
+        # Every call uses a fresh storage, as a new process would
+        operations = {
+            "get_memory": lambda d: JsonStorage(d).get("fact", probe),
+            "get_active": lambda d: JsonStorage(d).select("fact"),
+            "search": lambda d: JsonStorage(d).search("咖啡", ["fact"]),
+        }
+        consistent = True
+        for label, operation in operations.items():
+            json_result, json_ms, json_peak = min(
+                (cold_call(lambda: operation(json_dir)) for _ in range(repeat)), key=lambda r: r[1])
+            jsonl_result, jsonl_ms, jsonl_peak = min(
+                (cold_call(lambda: operation(jsonl_dir)) for _ in range(repeat)), key=lambda r: r[1])
+            if json_result != jsonl_result:
+                consistent = False
+                print(f"[!] Result mismatch for '{label}'")
+            print(f"{label:<18}{json_ms:>12.1f}{jsonl_ms:>12.1f}"
+                  f"{json_peak / 1024 / 1024:>10.1f}{jsonl_peak / 1024 / 1024:>10.1f}")
+        return consistent
+    finally:
+        shutil.rmtree(json_dir, ignore_errors=True)
+        shutil.rmtree(jsonl_dir, ignore_errors=True)
+
+
+def quick_load_workload(memory_dir: Path, lazy: bool) -> Tuple:
+    """What quick_load reads at activation: fact/preference categories and the latest experience."""
+    stores = {memory_type: read_store(memory_dir, memory_type, lazy=lazy) for memory_type in MEMORY_TYPES}
+    personal = [dict(m.get("metadata", {})) for m in stores["fact"].values() if m.get("category") == "personal"]
+    preferences = sorted({m.get("category", "other") for m in stores["preference"].values()})
+    latest = max(stores["experience"].values(), key=lambda m: m.get("timestamp", ""), default=None)
+    return personal, preferences, latest["id"] if latest else None
+
+
+def bench_mmap(size: int, repeat: int) -> bool:
+    """Compare cold reads through the binary snapshots against JSON parsing."""
+    memory_dir = build_store_dir(size)
+    try:
+        storage = JsonStorage(memory_dir)
+        for memory_type in MEMORY_TYPES:
+            storage.load(memory_type)  # writes the binary snapshots
+        json_mb = sum(storage.files[t].stat().st_size for t in MEMORY_TYPES) / 1024 / 1024
+        bin_mb = sum(memory_mmap.binary_path(storage.files[t]).stat().st_size
+                     for t in MEMORY_TYPES) / 1024 / 1024
+
+        print(f"\n== mmap: {size} memories ({json_mb:.0f} MB JSON, {bin_mb:.0f} MB binary) ==")
+        print(f"{'operation':<18}{'json ms':>12}{'mmap ms':>12}{'speedup':>10}")
+
+        consistent = True
+        operations = {
+            "open stores": lambda lazy: [len(read_store(memory_dir, t, lazy=lazy)) for t in MEMORY_TYPES],
+            "quick_load": lambda lazy: quick_load_workload(memory_dir, lazy),
+        }
+        for label, operation in operations.items():
+            if operation(False) != operation(True):
+                consistent = False
+                print(f"[!] Result mismatch for '{label}'")
+            json_ms = best_of(lambda: operation(False), repeat)
+            mmap_ms = best_of(lambda: operation(True), repeat)
+            speedup = json_ms / mmap_ms if mmap_ms else float("inf")
+            print(f"{label:<18}{json_ms:>12.1f}{mmap_ms:>12.1f}{speedup:>9.1f}x")
+
+        lazy = read_store(memory_dir, "fact", lazy=True)
+        full = read_store(memory_dir, "fact")
+        if any(dict(lazy[memory_id]) != record for memory_id, record in full.items()):
+            consistent = False
+            print("[!] Binary snapshot records differ from the JSON records")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def bench_shards(size: int, repeat: int) -> bool:
+    """Compare recent-memory reads and compaction cost of a sharded directory against one store."""
+    # Two years of memories, so each store spans about 25 month shards
+    plain_dir = build_store_dir(size, step=timedelta(days=730) / size)
+    sharded_dir = Path(tempfile.mkdtemp(prefix="memory_bench_"))
+    try:
+        for memory_type in MEMORY_TYPES:
+            JsonStorage(plain_dir).load(memory_type)
+        shutil.copytree(plain_dir, sharded_dir, dirs_exist_ok=True)
+        shard_stores(sharded_dir)
+
+        print(f"\n== shards: {size} memories ==")
+        print(f"{'operation':<22}{'single ms':>12}{'sharded ms':>12}{'speedup':>10}")
+
+        consistent = True
+        since = (datetime(2024, 1, 1) + timedelta(days=700)).isoformat()
+        operations = {
+            "latest 10": lambda d: [m["id"] for m in create_storage(d).recent("experience", 10)],
+            "last month": lambda d: [m["id"] for m in create_storage(d).recent("experience", since=since)],
+            "read_recent 1": lambda d: [m["id"] for m in read_recent(d, "experience", 1)],
+        }
+        for label, operation in operations.items():
+            if operation(plain_dir) != operation(sharded_dir):
+                consistent = False
+                print(f"[!] Result mismatch for '{label}'")
+            plain_ms = best_of(lambda: operation(plain_dir), repeat)
+            sharded_ms = best_of(lambda: operation(sharded_dir), repeat)
+            speedup = plain_ms / sharded_ms if sharded_ms else float("inf")
+            print(f"{label:<22}{plain_ms:>12.1f}{sharded_ms:>12.1f}{speedup:>9.1f}x")
+
+        # A compaction after adding one experience to the last month rewrites only that shard
+        for memory_dir in (plain_dir, sharded_dir):
+            storage = create_storage(memory_dir)
+            record = dict(next(iter(read_store(plain_dir, "experience").values())),
+                          id=create_memory_id(), timestamp=since)
+            storage.apply("experience", [memory_journal.make_op(memory_journal.OP_ADD, record["id"], record=record)])
+            before = {p: p.stat().st_mtime_ns for p in memory_dir.rglob("*.json")}
+            storage.compact()
+            rewritten = [p for p in memory_dir.rglob("*.json") if before.get(p) != p.stat().st_mtime_ns]
+            label = "single" if memory_dir == plain_dir else "sharded"
+            print(f"compact after 1 add ({label}): {sum(p.stat().st_size for p in rewritten) / 1024:.0f} KB rewritten")
+        return consistent
+    finally:
+        shutil.rmtree(plain_dir, ignore_errors=True)
+        shutil.rmtree(sharded_dir, ignore_errors=True)
+
+
+def bench_rank(size: int, repeat: int) -> bool:
+    """Compare BM25 top 10 from the n-gram index against statistics built by a scan."""
+    memory_dir = build_store_dir(size)
+    try:
+        storage = JsonStorage(memory_dir)
+        types = list(MEMORY_TYPES)
+        backend = "numpy" if memory_rank.np is not None else "pure Python"
+        print(f"\n== rank: {size} memories ({backend}) ==")
+        print(f"{'query':<14}{'matches':>9}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        consistent = True
+        for query in SEARCH_QUERIES:
+            indexed = storage.search_ranked(query, types, 10)
+            scanned = MemoryStorage.search_ranked(storage, query, types, 10)
+            if ([m["id"] for m, _ in indexed] != [m["id"] for m, _ in scanned] or
+                    any(abs(a - b) > 1e-9 for (_, a), (_, b) in zip(indexed, scanned))):
+                consistent = False
+                print(f"[!] Result mismatch for '{query}'")
+
+            matches = len(storage.search(query, types))
+            scan_ms = best_of(lambda: MemoryStorage.search_ranked(storage, query, types, 10), repeat)
+            index_ms = best_of(lambda: storage.search_ranked(query, types, 10), repeat)
+            speedup = scan_ms / index_ms if index_ms else float("inf")
+            print(f"{query:<14}{matches:>9}{scan_ms:>12.2f}{index_ms:>12.2f}{speedup:>9.1f}x")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def bench_semantic(size: int, repeat: int) -> bool:
+    """Compare semantic search through the clustered index against brute force."""
+    memory_dir = build_store_dir(size)
+    try:
+        data, indexes = JsonStorage(memory_dir).load_indexes("fact")
+        index = indexes["vector"]
+        start = time.perf_counter()
+        index.ensure(data)
+        build_ms = (time.perf_counter() - start) * 1000
+        rng = random.Random(11)
+        queries = [" ".join(rng.sample(WORDS, 3)) for _ in range(20)]
+        clustered = memory_vectors.np is not None and len(index) >= memory_vectors.IVF_MIN_ROWS
+        if clustered:
+            index.search(queries[0], 10)  # trains the clusters
+        mode = "IVF" if clustered else "brute force"
+
+        backend = "numpy" if memory_vectors.np is not None else "pure Python"
+        print(f"\n== semantic: {len(index)} active facts ({backend}, {mode}) ==")
+        print(f"build vectors: {build_ms:8.1f} ms")
+
+        found = 0
+        exact_ms = index_ms = 0.0
+        for query in queries:
+            exact = index.search(query, 10, exhaustive=True)
+            approximate = index.search(query, 10)
+            # Synthetic texts tie a lot, so count results scoring at least the exact 10th
+            cutoff = exact[-1][1] - 1e-6 if exact else 0.0
+            found += len([score for _, score in approximate if score >= cutoff])
+            exact_ms += best_of(lambda: index.search(query, 10, exhaustive=True), repeat)
+            index_ms += best_of(lambda: index.search(query, 10), repeat)
+
+        exact_ms, index_ms = exact_ms / len(queries), index_ms / len(queries)
+        speedup = exact_ms / index_ms if index_ms else float("inf")
+        print(f"{'top 10':<10}{'exact ms':>12}{mode + ' ms':>16}{'speedup':>10}{'recall':>9}")
+        print(f"{'average':<10}{exact_ms:>12.2f}{index_ms:>16.2f}{speedup:>9.1f}x"
+              f"{found / (10 * len(queries)):>9.0%}")
+        return True
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def bench_near(size: int, repeat: int) -> bool:
+    """Compare near-duplicate lookup through the LSH index against a category scan."""
+    memory_dir = build_store_dir(size)
+    try:
+        storage = JsonStorage(memory_dir)
+        facts = storage.select("fact")
+        rng = random.Random(7)
+        # Reworded repeats of existing facts, like "住在北京" -> "现在住在北京"
+        probes = [(f"现在{m['content']}", m["category"]) for m in rng.sample(facts, 20)]
+        threshold = 0.7
+
+        print(f"\n== near: {size} memories ({len(facts)} active facts, threshold {threshold}) ==")
+        print(f"{'lookup':<10}{'hits':>8}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        consistent = True
+        found = expected = 0
+        scan_total = index_total = 0.0
+        for content, category in probes:
+            indexed = storage.find_similar("fact", content, category, threshold)
+            scanned = MemoryStorage.find_similar(storage, "fact", content, category, threshold)
+            # LSH may miss a match but never reports a wrong one
+            if not set(indexed) <= set(scanned):
+                consistent = False
+                print(f"[!] Result mismatch for '{content}'")
+            found += len(indexed)
+            expected += len(scanned)
+            scan_total += best_of(
+                lambda: MemoryStorage.find_similar(storage, "fact", content, category, threshold), repeat)
+            index_total += best_of(lambda: storage.find_similar("fact", content, category, threshold), repeat)
+
+        scan_ms, index_ms = scan_total / len(probes), index_total / len(probes)
+        speedup = scan_ms / index_ms if index_ms else float("inf")
+        print(f"{'average':<10}{found / len(probes):>8.1f}{scan_ms:>12.2f}{index_ms:>12.2f}{speedup:>9.1f}x")
+        print(f"recall: {found}/{expected} matches found through the index")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def bench_pages(size: int, repeat: int) -> bool:
+    """Compare cursor pages from the time index against sorting the store per page."""
+    memory_dir = build_store_dir(size)
+    try:
+        storage = JsonStorage(memory_dir)
+        facts = storage.select("fact")
+        category = facts[0]["category"]
+        page_size = 50
+        # A cursor halfway through the timeline
+        middle = storage.timeline("fact", len(facts) // 2)[-1][0]
+        since = sorted(m["timestamp"] for m in facts)[len(facts) // 2]
+
+        print(f"\n== pages: {size} memories ({len(facts)} active facts, {page_size} per page) ==")
+        print(f"{'page':<16}{'sort ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        consistent = True
+        operations = {
+            "first": dict(),
+            "middle": dict(cursor=memory_shards.encode_cursor(middle)),
+            "category": dict(category=category),
+            "since": dict(since=since),
+        }
+
+        def sorted_page(cursor=None, **options):
+            after = memory_shards.decode_cursor(cursor) if cursor else None
+            return [m["id"] for _, m in MemoryStorage.timeline(storage, "fact", page_size, after, **options)]
+
+        for label, options in operations.items():
+            if [m["id"] for m in storage.page("fact", page_size, **options)[0]] != sorted_page(**options):
+                consistent = False
+                print(f"[!] Result mismatch for '{label}'")
+            sort_ms = best_of(lambda: sorted_page(**options), repeat)
+            index_ms = best_of(lambda: storage.page("fact", page_size, **options), repeat)
+            speedup = sort_ms / index_ms if index_ms else float("inf")
+            print(f"{label:<16}{sort_ms:>12.2f}{index_ms:>12.3f}{speedup:>9.1f}x")
+
+        # Walking every page visits each active fact exactly once
+        seen, cursor = [], None
+        while True:
+            records, cursor = storage.page("fact", 1000, cursor)
+            seen += [m["id"] for m in records]
+            if cursor is None:
+                break
+        if seen != [m["id"] for m in storage.recent("fact")]:
+            consistent = False
+            print("[!] Walking all pages does not match recent()")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+def bench_epochs(size: int, repeat: int) -> bool:
+    """Compare time filters on ISO strings against the precomputed epoch fields."""
+    memory_dir = build_store_dir(size)
+    try:
+        parsed_data = JsonStorage(memory_dir).load("experience")
+        for memory_type in MEMORY_TYPES:
+            JsonStorage(memory_dir).load(memory_type)  # builds the indexes, outside the timing
+        start = time.perf_counter()
+        backfill_epochs(memory_dir)
+        backfill_ms = (time.perf_counter() - start) * 1000
+        epoch_data = JsonStorage(memory_dir).load("experience")
+
+        now = datetime(2024, 1, 1) + timedelta(minutes=size // 2)
+        now_epoch = to_epoch_micros(now)
+        cutoff = now - timedelta(days=7)
+        cutoff_epoch = to_epoch_micros(cutoff)
+
+        def iso(value):
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+        # (ISO parsing version, epoch version) of the hot loops of reminders, visualizer and maintenance
+        operations = {
+            "days since update": (
+                lambda: [(now - iso(m["last_updated"])).days for m in parsed_data.values()],
+                lambda: [(now_epoch - record_epoch(m, "last_updated")) // MICROS_PER_DAY
+                         for m in epoch_data.values()],
+            ),
+            "older than 7d": (
+                lambda: [m["id"] for m in parsed_data.values()
+                         if iso(m.get("last_accessed") or m["timestamp"]) < cutoff],
+                lambda: [m["id"] for m in epoch_data.values()
+                         if record_epoch(m, "last_accessed" if m.get("last_accessed") else "timestamp")
+                         < cutoff_epoch],
+            ),
+            "timeline top 10": (
+                lambda: [m["id"] for m in sorted(parsed_data.values(), key=lambda m: iso(m["timestamp"]),
+                                                 reverse=True)[:10]],
+                lambda: [m["id"] for m in sorted(epoch_data.values(), key=lambda m: record_epoch(m, "timestamp"),
+                                                 reverse=True)[:10]],
+            ),
+            "columns build": (
+                lambda: list(ColumnarView(parsed_data).timestamp),
+                lambda: list(ColumnarView(epoch_data).timestamp),
+            ),
+        }
+
+        print(f"\n== epochs: {len(epoch_data)} experiences (backfill of {size} memories: {backfill_ms:.0f} ms) ==")
+        print(f"{'operation':<20}{'parse ms':>12}{'epoch ms':>12}{'speedup':>10}")
+        consistent = True
+        for label, (parsed, epochs) in operations.items():
+            if parsed() != epochs():
+                consistent = False
+                print(f"[!] Result mismatch for '{label}'")
+            parse_ms = best_of(parsed, repeat)
+            epoch_ms = best_of(epochs, repeat)
+            speedup = parse_ms / epoch_ms if epoch_ms else float("inf")
+            print(f"{label:<20}{parse_ms:>12.1f}{epoch_ms:>12.1f}{speedup:>9.1f}x")
+
+        if backfill_epochs(memory_dir) != {memory_type: 0 for memory_type in MEMORY_TYPES}:
+            consistent = False
+            print("[!] A second backfill changed records")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+# Concurrent queries per round and worker threads of the async manager
+ASYNC_QUERIES = 100
+ASYNC_WORKERS = 4
+
+
+def async_queries(memory_dir: Path, count: int) -> List[Tuple[str, tuple, dict]]:
+    """A mix of (method, args, kwargs) read calls shared by MemoryManager and AsyncMemoryManager."""
+    rng = random.Random(7)
+    ids = list(read_store(memory_dir, "fact"))
+    kinds = [
+        lambda: ("search_memories", (rng.choice(SEARCH_QUERIES),), {"rank": "bm25", "top_k": 10}),
+        lambda: ("query_by_context", (rng.choice(CONTEXT_QUERIES),), {"limit": 5}),
+        lambda: ("get_core_memories", (), {}),
+        lambda: ("get_memory", (rng.choice(ids), "fact"), {}),
+        lambda: ("get_recent_memories", (rng.choice(MEMORY_TYPES),), {"limit": 10}),
+    ]
+    return [kinds[i % len(kinds)]() for i in range(count)]
+
+
+async def timed_round(calls: List[Callable]) -> Tuple[list, float, List[float], float]:
+    """
+    Start every call at once on the running loop.
+
+    Returns:
+        (results, wall ms, latency ms of each call, longest event loop stall in ms)
+    """
+    stop = asyncio.Event()
+    stalls: List[float] = []
+
+    async def ticker():
+        # A responsive loop wakes this every millisecond
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stalls.append(now - last - 0.001)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    latencies: List[float] = []
+
+    async def timed(call):
+        result = await call()
+        latencies.append((time.perf_counter() - start) * 1000)
+        return result
+
+    results = await asyncio.gather(*(timed(call) for call in calls))
+    wall = (time.perf_counter() - start) * 1000
+    stop.set()
+    await tick
+    return results, wall, latencies, max(stalls, default=0.0) * 1000
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_async(size: int, repeat: int) -> bool:
+    """Compare concurrent queries through AsyncMemoryManager against blocking MemoryManager calls."""
+    memory_dir = build_store_dir(size)
+    try:
+        queries = async_queries(memory_dir, ASYNC_QUERIES)
+        print(f"\n== async: {ASYNC_QUERIES} concurrent queries on {size} memories ==")
+        print(f"{'mode':<24}{'round':<7}{'wall ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'loop stall ms':>15}")
+
+        def report(mode, label, wall, latencies, stall):
+            print(f"{mode:<24}{label:<7}{wall:>10.1f}{percentile(latencies, 0.5):>10.1f}"
+                  f"{percentile(latencies, 0.95):>10.1f}{stall:>15.1f}")
+
+        async def blocking():
+            # What a host gets by calling MemoryManager from a coroutine
+            mm = MemoryManager(memory_dir)
+
+            def call(name, args, kwargs):
+                async def run():
+                    return getattr(mm, name)(*args, **kwargs)
+                return run
+
+            rounds = []
+            for i in range(repeat + 1):
+                rounds.append(await timed_round([call(*query) for query in queries]))
+                report("blocking MemoryManager", "cold" if i == 0 else "warm", *rounds[-1][1:])
+            mm.close()
+            return rounds[0][0]
+
+        async def offloaded():
+            async with AsyncMemoryManager(memory_dir, max_workers=ASYNC_WORKERS) as amm:
+                def call(name, args, kwargs):
+                    return lambda: getattr(amm, name)(*args, **kwargs)
+
+                rounds = []
+                for i in range(repeat + 1):
+                    rounds.append(await timed_round([call(*query) for query in queries]))
+                    report(f"async, {ASYNC_WORKERS} workers", "cold" if i == 0 else "warm", *rounds[-1][1:])
+            return rounds[0][0]
+
+        expected = asyncio.run(blocking())
+        # Blocking results are cache entries; compare them as JSON
+        expected = json.dumps(expected, ensure_ascii=False, sort_keys=True)
+        consistent = json.dumps(asyncio.run(offloaded()), ensure_ascii=False, sort_keys=True) == expected
+        if not consistent:
+            print("[!] Result mismatch between blocking and async queries")
+        return consistent
+    finally:
+        shutil.rmtree(memory_dir, ignore_errors=True)
+
+
+# Script calls of a session: (script, argv, output compared between both paths)
+SCRIPT_COMMANDS = [
+    ("activate.py", [], True),
+    ("memory_cli.py", ["stats"], True),
+    ("memory_cli.py", ["search", "咖啡"], True),
+    ("memory_staging.py", ["count"], True),
+    ("memory_staging.py", ["list"], True),
+    ("memory_staging.py", ["add", "--type", "fact", "--content", "benchmark staged fact"], False),
+]
+
+
+def build_skill_tree(size: int) -> Tuple[Path, Path]:
+    """
+    Copy the scripts into a throwaway skill tree whose memory directory
+    holds `size` synthetic memories (the scripts find their data next to
+    themselves). Returns (root, scripts directory).
+    """
+    memory_dir = build_store_dir(size)
+    root = Path(tempfile.mkdtemp(prefix="memory_bench_"))
+    scripts = root / "remembering-anything" / "scripts"
+    shutil.copytree(Path(__file__).parent, scripts, ignore=shutil.ignore_patterns("__pycache__"))
+    (scripts.parent / "user-data").mkdir()
+    shutil.move(str(memory_dir), str(scripts.parent / "user-data" / "memory"))
+    return root, scripts
+
+
+def bench_daemon(size: int, repeat: int) -> bool:
+    """Compare script calls served by memory_daemon against fresh interpreters."""
+    import memory_daemon
+
+    root, scripts = build_skill_tree(size)
+    socket_file = scripts.parent / "user-data" / "memory" / ".daemon.sock"
+
+    direct_env = dict(os.environ, **{memory_daemon.NO_DAEMON_ENV: "1"})
+    client_env = {k: v for k, v in os.environ.items() if k != memory_daemon.NO_DAEMON_ENV}
+
+    def call(script, argv, env):
+        result = subprocess.run([sys.executable, str(scripts / script)] + argv, cwd=str(root), env=env,
+                                capture_output=True, text=True)
+        return result.stdout, result.returncode
+
+    try:
+        began = time.perf_counter()
+        subprocess.run([sys.executable, str(scripts / "memory_daemon.py"), "start", "--detach"],
+                       cwd=str(root), env=client_env, check=True, capture_output=True)
+        started = (time.perf_counter() - began) * 1000
+
+        print(f"\n== daemon: script calls on {size} memories (daemon started in {started:.0f} ms) ==")
+        print(f"{'command':<36}{'direct ms':>12}{'daemon ms':>12}{'speedup':>10}")
+        consistent = True
+        for script, argv, compare in SCRIPT_COMMANDS:
+            outputs = {}
+
+            def timed(env, key):
+                def run():
+                    outputs[key] = call(script, argv, env)
+                return run
+
+            direct = best_of(timed(direct_env, "direct"), repeat)
+            served = best_of(timed(client_env, "daemon"), repeat)
+            label = " ".join([script] + argv)[:34]
+            print(f"{label:<36}{direct:>12.1f}{served:>12.1f}{direct / served:>9.1f}x")
+            if outputs["direct"][1] != 0 or outputs["daemon"][1] != 0:
+                consistent = False
+                print(f"[!] {label} failed")
+            elif compare and outputs["direct"] != outputs["daemon"]:
+                consistent = False
+                print(f"[!] Output mismatch for {label}")
+        return consistent
+    finally:
+        subprocess.run([sys.executable, str(scripts / "memory_daemon.py"), "stop"],
+                       cwd=str(root), env=client_env, capture_output=True)
+        if socket_file.exists():
+            print("[!] Daemon did not stop")
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_forkserver(size: int, repeat: int) -> bool:
+    """Compare script startup through memory_launch and a fork server against fresh interpreters."""
+    import memory_daemon
+
+    root, scripts = build_skill_tree(size)
+    socket_file = scripts.parent / "user-data" / "memory" / ".forkserver.sock"
+    env = dict(os.environ, **{memory_daemon.NO_DAEMON_ENV: "1"})
+
+    def call(args):
+        result = subprocess.run([sys.executable] + args, cwd=str(root), env=env, capture_output=True, text=True)
+        return result.stdout, result.returncode
+
+    def timed(args, outputs, key):
+        def run():
+            outputs[key] = call(args)
+        return run
+
+    try:
+        interpreter = best_of(lambda: call(["-c", "pass"]), repeat)
+        began = time.perf_counter()
+        call([str(scripts / "memory_forkserver.py"), "start", "--detach"])
+        started = (time.perf_counter() - began) * 1000
+        if not socket_file.exists():
+            print("[!] Fork server did not start")
+            return False
+
+        print(f"\n== forkserver: script startup on {size} memories "
+              f"(server started in {started:.0f} ms, bare interpreter {interpreter:.1f} ms) ==")
+        print(f"{'command':<36}{'direct ms':>12}{'forked ms':>12}{'speedup':>10}")
+        consistent = True
+        for script, argv, compare in SCRIPT_COMMANDS:
+            outputs = {}
+            direct = best_of(timed([str(scripts / script)] + argv, outputs, "direct"), repeat)
+            launcher = [str(scripts / "memory_launch.py"), script.removesuffix(".py")] + argv
+            forked = best_of(timed(launcher, outputs, "forked"), repeat)
+            label = " ".join([script] + argv)[:34]
+            print(f"{label:<36}{direct:>12.1f}{forked:>12.1f}{direct / forked:>9.1f}x")
+            if outputs["direct"][1] != 0 or outputs["forked"][1] != 0:
+                consistent = False
+                print(f"[!] {label} failed")
+            elif compare and outputs["direct"] != outputs["forked"]:
+                consistent = False
+                print(f"[!] Output mismatch for {label}")
+        return consistent
+    finally:
+        call([str(scripts / "memory_forkserver.py"), "stop"])
+        if socket_file.exists():
+            print("[!] Fork server did not stop")
+        shutil.rmtree(root, ignore_errors=True)
+
+
+BENCHMARKS = {
+    "search": bench_search,
+    "context": bench_context,
+    "records": bench_records,
+    "columns": bench_columns,
+    "jsonl": bench_jsonl,
+    "mmap": bench_mmap,
+    "shards": bench_shards,
+    "near": bench_near,
+    "rank": bench_rank,
+    "semantic": bench_semantic,
+    "pages": bench_pages,
+    "epochs": bench_epochs,
+    "async": bench_async,
+    "daemon": bench_daemon,
+    "forkserver": bench_forkserver,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory storage benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', default='10000,100000',
+                        help='Comma-separated store sizes (default: 10000,100000)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timing repetitions per measurement (default: 5)')
+    args = parser.parse_args()
+
+    sizes: List[int] = [int(s) for s in args.sizes.split(',') if s.strip()]
+    ok = True
+    for size in sizes:
+        ok = BENCHMARKS[args.benchmark](size, args.repeat) and ok
+
+    if not ok:
+        print("\n[!] Benchmarked and reference results differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
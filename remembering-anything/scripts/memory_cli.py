@@ -4,25 +4,78 @@ Command-line interface for memory management.
 """
 
 import sys
+import json
 import argparse
 from pathlib import Path
+from typing import List, Optional
 
 # scripts -> remembering-anything -> claude-memory
 SKILL_DIR = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(SKILL_DIR / "remembering-anything" / "scripts"))
 
+if __name__ == "__main__":
+    # Hand the command to a running memory daemon before the heavy imports
+    from memory_daemon import forward
+    exit_code = forward("memory_cli", sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
 from memory_manager import MemoryManager
 from summary_engine import SummaryEngine
+from memory_storage import migrate_json_to_sqlite, convert_store_format, shard_stores, merge_shards, backfill_epochs
+
+def main(argv: Optional[List[str]] = None, mm: Optional[MemoryManager] = None):
+    """
+    Run a CLI command.
 
-def main():
+    Args:
+        argv: Command line arguments (default: sys.argv[1:])
+        mm: MemoryManager to use (the memory daemon passes its resident one)
+    """
     parser = argparse.ArgumentParser(description='Memory CLI')
-    parser.add_argument('command', choices=['stats', 'search', 'conflicts', 'unprocessed', 'export', 'list'])
+    parser.add_argument('command', choices=['stats', 'search', 'conflicts', 'unprocessed', 'export', 'list', 'migrate'])
     parser.add_argument('args', nargs='*')
     parser.add_argument('--type', choices=['fact', 'preference', 'experience'])
+    parser.add_argument('--rank', choices=['bm25', 'substring'], default='substring',
+                        help='search: substring matches in store order (default) or BM25 ranking')
+    parser.add_argument('--top', type=int,
+                        help='search: maximum number of results (default: all)')
+    parser.add_argument('--json', action='store_true', help='search: print results as JSON')
+    parser.add_argument('--limit', type=int, help='list: page size (default: all)')
+    parser.add_argument('--cursor', help='list: continue after the page that printed this cursor')
+    parser.add_argument('--since', help='list: only memories created at or after this ISO time')
+    parser.add_argument('--until', help='list: only memories created before this ISO time')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='list: one JSON record per line (next cursor on stderr)')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        target = args.args[0] if args.args else "sqlite"
+        memory_dir = SKILL_DIR / "remembering-anything" / "user-data" / "memory"
+        if target == "sqlite":
+            migrated = migrate_json_to_sqlite(memory_dir)
+            print("\n[v] Migrated to SQLite:")
+        elif target in ("json", "jsonl"):
+            migrated = convert_store_format(memory_dir, target)
+            print(f"\n[v] Converted stores to {target}:")
+        elif target == "sharded":
+            migrated = shard_stores(memory_dir)
+            print("\n[v] Split stores into month shards:")
+        elif target == "unsharded":
+            migrated = merge_shards(memory_dir)
+            print("\n[v] Merged month shards:")
+        elif target == "epochs":
+            migrated = backfill_epochs(memory_dir)
+            print("\n[v] Backfilled epoch timestamps:")
+        else:
+            print(f"\n[!] Unsupported migration target: {target}")
+            sys.exit(1)
+        for mem_type, count in migrated.items():
+            print(f"    {mem_type}: {count}")
+        return
 
-    mm = MemoryManager()
+    mm = mm or MemoryManager()
     se = SummaryEngine()
 
     if args.command == 'stats':
@@ -33,10 +86,15 @@ def main():
 
     elif args.command == 'search':
         query = args.args[0] if args.args else ""
-        results = mm.search_memories(query, args.type)
+        rank = "bm25" if args.rank == "bm25" else None
+        results = mm.search_memories(query, args.type, rank=rank, top_k=args.top or None)
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+            return
         print(f"\n[?] Search results for '{query}':")
         for r in results:
-            print(f"    [{r['type']}] {r['content']}")
+            score = f" ({r['score']:.2f})" if "score" in r else ""
+            print(f"    [{r['type']}]{score} {r['content']}")
 
     elif args.command == 'conflicts':
         conflicts = mm.detect_conflicts()
@@ -58,14 +116,27 @@ def main():
     elif args.command == 'list':
         mem_type = args.type or 'fact'
         if mem_type == 'fact':
-            items = mm.get_active_facts()
+            get_active = mm.get_active_facts
         elif mem_type == 'preference':
-            items = mm.get_active_preferences()
+            get_active = mm.get_active_preferences
         else:
-            items = mm.get_active_experiences()
+            get_active = mm.get_active_experiences
+        try:
+            items = get_active(limit=args.limit, cursor=args.cursor, since=args.since, until=args.until)
+        except ValueError as e:
+            print(f"\n[!] {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.jsonl:
+            for item in items:
+                print(json.dumps(item, ensure_ascii=False))
+            if mm.next_cursor:
+                print(f"next_cursor: {mm.next_cursor}", file=sys.stderr)
+            return
         print(f"\n[-] Active {mem_type}s ({len(items)}):")
         for item in items:
             print(f"    [{item['category']}] {item['content']}")
+        if mm.next_cursor:
+            print(f"\n    More: --cursor {mm.next_cursor}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,291 @@
+"""
+Columnar view of memory metadata for vectorized filters.
+
+A ColumnarView holds one store's metadata as parallel arrays (timestamps,
+last access, access count, confidence and enum codes) so predicates such
+as "active core memories", "created before a cutoff" or "most accessed"
+are evaluated column-wise instead of by looping over record dicts.
+
+NumPy is used when installed; otherwise the same operations run on
+array.array columns in plain Python, with identical results. A view is a
+snapshot: build it once per store generation and rebuild it after writes
+(JsonStorage.columns() does this automatically).
+
+Times are the records' precomputed epoch fields (ts_epoch, ...; see
+memory_schema.to_epoch_micros) in seconds, so building a view parses no
+ISO strings; datetime cutoffs are converted the same way. Missing or
+unparseable times are NaN and never match a time predicate.
+"""
+
+import math
+import heapq
+from array import array
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Union
+
+from memory_schema import ENUM_FIELDS, ENUM_CODES, to_epoch_micros, from_epoch_micros, record_epoch
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+# Code of stored values outside the known enum / category set
+UNKNOWN = -1
+# Code of filter values outside it, so they match no row
+NO_MATCH = -2
+
+Cutoff = Union[datetime, float, None]
+
+
+def to_epoch(value: Any) -> float:
+    """Epoch seconds of an ISO timestamp or datetime, NaN if missing or invalid."""
+    micros = to_epoch_micros(value)
+    return math.nan if micros is None else micros / 1e6
+
+
+def _seconds(micros: Optional[int]) -> float:
+    return math.nan if micros is None else micros / 1e6
+
+
+def to_datetime(seconds: float) -> datetime:
+    """Naive datetime of epoch seconds from to_epoch() (inverse up to float precision)."""
+    return from_epoch_micros(round(seconds * 1e6))
+
+
+def _cutoff(value: Cutoff) -> Optional[float]:
+    return to_epoch(value) if isinstance(value, datetime) else value
+
+
+class ColumnarView:
+    """
+    Parallel metadata columns of one store, in insertion order.
+
+    Columns: ids, timestamp, last_accessed, recency (last access, else
+    creation), access_count, confidence, type/status/importance codes and
+    category ids (see `categories`).
+    """
+
+    def __init__(self, data: Dict[str, Dict]):
+        records = list(data.values())
+        self.ids: List[str] = [record["id"] for record in records]
+
+        self.categories: List[str] = []
+        self._category_ids: Dict[str, int] = {}
+        for record in records:
+            category = record.get("category")
+            if isinstance(category, str) and category not in self._category_ids:
+                self._category_ids[category] = len(self.categories)
+                self.categories.append(category)
+
+        timestamp = [_seconds(record_epoch(r, "timestamp")) for r in records]
+        last_accessed = [_seconds(record_epoch(r, "last_accessed")) for r in records]
+        recency = [la if r.get("last_accessed") else ts
+                   for r, ts, la in zip(records, timestamp, last_accessed)]
+
+        self.timestamp = self._floats(timestamp)
+        self.last_accessed = self._floats(last_accessed)
+        self.recency = self._floats(recency)
+        self.access_count = self._ints([
+            int(r["access_count"]) if isinstance(r.get("access_count"), (int, float)) else 0
+            for r in records
+        ])
+        self.confidence = self._floats([
+            float(r["confidence"]) if isinstance(r.get("confidence"), (int, float)) else math.nan
+            for r in records
+        ])
+        self.type = self._codes([self.code("type", r.get("type")) for r in records])
+        self.status = self._codes([self.code("status", r.get("status")) for r in records])
+        self.importance = self._codes([self.code("importance", r.get("importance")) for r in records])
+        self.category = self._ints([
+            self._category_ids.get(r.get("category"), UNKNOWN) if isinstance(r.get("category"), str) else UNKNOWN
+            for r in records
+        ])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ========== Column construction ==========
+
+    @staticmethod
+    def _floats(values: List[float]):
+        return np.array(values, dtype=np.float64) if np is not None else array("d", values)
+
+    @staticmethod
+    def _ints(values: List[int]):
+        return np.array(values, dtype=np.int64) if np is not None else array("q", values)
+
+    @staticmethod
+    def _codes(values: List[int]):
+        return np.array(values, dtype=np.int8) if np is not None else array("b", values)
+
+    @staticmethod
+    def code(field: str, value: Any) -> int:
+        """Enum code of a status/importance/type value (UNKNOWN if not known)."""
+        return ENUM_CODES[field].get(value, UNKNOWN) if isinstance(value, str) else UNKNOWN
+
+    # ========== Predicates ==========
+
+    def mask(
+        self,
+        status: Optional[str] = None,
+        importance: Optional[str] = None,
+        memory_type: Optional[str] = None,
+        category: Optional[str] = None,
+        before: Cutoff = None,
+        after: Cutoff = None,
+        field: str = "timestamp",
+    ):
+        """
+        Boolean mask of the rows matching every given filter.
+
+        Args:
+            status, importance, memory_type, category: Required values
+            before: Keep rows whose `field` time is strictly earlier
+            after: Keep rows whose `field` time is at or after this
+            field: Time column for before/after (timestamp, last_accessed, recency)
+        """
+        tests = []
+        if status is not None:
+            tests.append((self.status, "eq", ENUM_CODES["status"].get(status, NO_MATCH)))
+        if importance is not None:
+            tests.append((self.importance, "eq", ENUM_CODES["importance"].get(importance, NO_MATCH)))
+        if memory_type is not None:
+            tests.append((self.type, "eq", ENUM_CODES["type"].get(memory_type, NO_MATCH)))
+        if category is not None:
+            tests.append((self.category, "eq", self._category_ids.get(category, NO_MATCH)))
+        if before is not None:
+            tests.append((getattr(self, field), "lt", _cutoff(before)))
+        if after is not None:
+            tests.append((getattr(self, field), "ge", _cutoff(after)))
+
+        if np is not None:
+            result = np.ones(len(self.ids), dtype=bool)
+            for column, test, value in tests:
+                if test == "eq":
+                    result &= column == value
+                elif test == "lt":
+                    result &= column < value
+                else:
+                    result &= column >= value
+            return result
+
+        result = [True] * len(self.ids)
+        for column, test, value in tests:
+            # NaN compares False, so missing times never match
+            if test == "eq":
+                result = [m and c == value for m, c in zip(result, column)]
+            elif test == "lt":
+                result = [m and c < value for m, c in zip(result, column)]
+            else:
+                result = [m and c >= value for m, c in zip(result, column)]
+        return result
+
+    def rows(self, mask) -> List[int]:
+        """Row numbers set in a mask, ascending."""
+        if np is not None:
+            return np.flatnonzero(mask).tolist()
+        return [i for i, flag in enumerate(mask) if flag]
+
+    def where(self, **filters) -> List[str]:
+        """Ids of rows matching the filters of mask(), in insertion order."""
+        return [self.ids[i] for i in self.rows(self.mask(**filters))]
+
+    def top_access(self, k: int, **filters) -> List[str]:
+        """Ids of the k most accessed matching rows; ties keep insertion order."""
+        if k <= 0:
+            return []
+        rows = self.rows(self.mask(**filters))
+        if np is not None:
+            counts = self.access_count[rows]
+            order = np.argsort(-counts, kind="stable")[:k]
+            return [self.ids[rows[i]] for i in order.tolist()]
+        best = heapq.nsmallest(k, rows, key=lambda i: (-self.access_count[i], i))
+        return [self.ids[i] for i in best]
+
+    def transition_rows(self, active_before: Cutoff, contextual_before: Cutoff,
+                        promote_count: int) -> List[int]:
+        """
+        Rows of active records whose importance may change.
+
+        The same candidates as the schedule index: active records used
+        before active_before, contextual ones used before contextual_before,
+        and records that are neither core nor active with at least
+        promote_count accesses used at or after active_before.
+        """
+        active_before = _cutoff(active_before)
+        contextual_before = _cutoff(contextual_before)
+        active = self.code("importance", "active")
+        contextual = self.code("importance", "contextual")
+        core = self.code("importance", "core")
+
+        if np is not None:
+            live = (self.status == self.code("status", "active")) & ~np.isnan(self.recency)
+            due = (
+                ((self.importance == active) & (self.recency < active_before)) |
+                ((self.importance == contextual) & (self.recency < contextual_before)) |
+                ((self.importance != active) & (self.importance != core) &
+                 (self.access_count >= promote_count) & (self.recency >= active_before))
+            )
+            return np.flatnonzero(live & due).tolist()
+
+        status_active = self.code("status", "active")
+        rows = []
+        for i, importance in enumerate(self.importance):
+            recency = self.recency[i]
+            if self.status[i] != status_active or math.isnan(recency):
+                continue
+            if ((importance == active and recency < active_before) or
+                    (importance == contextual and recency < contextual_before) or
+                    (importance not in (active, core) and
+                     self.access_count[i] >= promote_count and recency >= active_before)):
+                rows.append(i)
+        return rows
+
+    # ========== Aggregates ==========
+
+    def earliest(self, field: str = "timestamp") -> Optional[datetime]:
+        """Earliest time in a time column, None if the column has no times."""
+        column = getattr(self, field)
+        if np is not None:
+            if not len(column) or np.isnan(column).all():
+                return None
+            return to_datetime(float(np.nanmin(column)))
+        times = [t for t in column if not math.isnan(t)]
+        return to_datetime(min(times)) if times else None
+
+    def counts(self, field: str, **filters) -> Dict[str, int]:
+        """Row count per value of status, importance or type among rows matching mask(**filters)."""
+        column = getattr(self, field)
+        size = len(ENUM_FIELDS[field])
+        if np is not None:
+            if filters:
+                column = column[self.mask(**filters)]
+            totals = np.bincount(column[column >= 0].astype(np.int64), minlength=size).tolist()
+        else:
+            rows = self.rows(self.mask(**filters)) if filters else range(len(column))
+            totals = [0] * size
+            for i in rows:
+                if column[i] >= 0:
+                    totals[column[i]] += 1
+        return {value: totals[code] for code, value in enumerate(ENUM_FIELDS[field]) if totals[code]}
+
+    def statistics(self) -> Dict[str, Any]:
+        """Counts by status and importance, total accesses and the time range."""
+        earliest = self.earliest()
+        if np is not None:
+            total_access = int(self.access_count.sum())
+            valid = self.timestamp[~np.isnan(self.timestamp)]
+            latest = to_datetime(float(valid.max())) if len(valid) else None
+        else:
+            total_access = sum(self.access_count)
+            times = [t for t in self.timestamp if not math.isnan(t)]
+            latest = to_datetime(max(times)) if times else None
+        return {
+            "total": len(self.ids),
+            "by_status": self.counts("status"),
+            "by_importance": self.counts("importance"),
+            "total_access": total_access,
+            "earliest": earliest.isoformat() if earliest else None,
+            "latest": latest.isoformat() if latest else None,
+        }
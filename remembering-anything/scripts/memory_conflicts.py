@@ -0,0 +1,84 @@
+"""
+Persisted conflict reports for single-value fact categories.
+
+Some fact categories (location, occupation, ...) should hold one active
+fact at a time; a second active fact in such a category is a conflict.
+MemoryManager re-checks only the categories touched by each fact write and
+keeps the resulting reports in conflicts.json, so detect_conflicts() is a
+read of that file instead of a scan of every fact.
+
+File format:
+    {
+        "single_value_categories": ["location", ...],
+        "conflicts": {"conflict_<hash>": {ConflictReport}, ...}
+    }
+
+A conflict id is derived from its category, so it stays the same for as
+long as the conflict exists.
+"""
+
+import json
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from memory_schema import ConflictReport
+from memory_lock import temp_path
+
+CONFLICTS_FILE = "conflicts.json"
+
+DEFAULT_SINGLE_VALUE_CATEGORIES = ("location", "occupation", "current_city", "current_company")
+
+
+def conflict_id(category: str) -> str:
+    """Stable conflict id of a single-value category."""
+    digest = hashlib.blake2b(category.encode("utf-8"), digest_size=6).hexdigest()
+    return f"conflict_{digest}"
+
+
+def build_conflict(category: str, facts: List[Dict]) -> Optional[ConflictReport]:
+    """
+    Build the conflict report of one category.
+
+    Args:
+        category: Single-value category
+        facts: Active facts of the category, in insertion order
+
+    Returns:
+        Conflict report, or None if the category has at most one active fact
+    """
+    if len(facts) <= 1:
+        return None
+
+    return {
+        "conflict_id": conflict_id(category),
+        "memory_ids": [f["id"] for f in facts],
+        "conflict_type": "contradiction",
+        "description": f"Multiple active facts in '{category}' category",
+        "suggested_resolution": "Keep the most recent or highest confidence entry",
+        "confidence": 0.9,
+    }
+
+
+def load_conflicts(path: Path) -> Optional[Dict[str, Any]]:
+    """Load the conflict state (None if missing or unreadable)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if not isinstance(state.get("single_value_categories"), list) or \
+            not isinstance(state.get("conflicts"), dict):
+        return None
+    return state
+
+
+def save_conflicts(path: Path, state: Dict[str, Any]):
+    """Atomically write the conflict state."""
+    path = Path(path)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
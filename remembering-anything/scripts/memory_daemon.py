@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Resident memory daemon (opt-in).
+
+Every activate.py, memory_staging.py and memory_cli.py call normally
+starts an interpreter, imports the memory modules, detects the project and
+parses the stores again. The daemon keeps one MemoryManager (stores,
+indexes, conflict state) and the imported modules in memory and runs the
+scripts' commands for them over a UNIX-domain socket in the memory
+directory (.daemon.sock).
+
+The scripts are thin clients: forward() sends the command line and
+working directory, prints the captured stdout/stderr and exits with the
+command's exit code. If no daemon is listening (or MEMORY_NO_DAEMON is
+set), the script runs the command itself as before. Direct calls and the
+daemon can be mixed: both go through the store locks (see memory_lock).
+
+Protocol: one JSON object per line in each direction.
+    {"op": "run", "script": "memory_cli", "argv": ["stats"], "cwd": "/path"}
+        -> {"ok": true, "stdout": "...", "stderr": "...", "exit": 0}
+    {"op": "ping"} -> {"ok": true, "pid": 123, "uptime": 1.5, "requests": 7}
+    {"op": "stop"} -> {"ok": true}
+    Failures -> {"ok": false, "error": "..."}
+
+Usage:
+    python memory_daemon.py start [--detach]
+    python memory_daemon.py status
+    python memory_daemon.py stop
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import traceback
+from pathlib import Path
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Any, Dict, List, Optional
+
+SCRIPT_DIR = Path(__file__).parent
+SKILL_DIR = SCRIPT_DIR.parent
+MEMORY_DIR = SKILL_DIR / "user-data" / "memory"
+SOCKET_FILE = MEMORY_DIR / ".daemon.sock"
+LOG_FILE = MEMORY_DIR / ".daemon.log"
+
+# Set to skip the daemon and always run commands directly
+NO_DAEMON_ENV = "MEMORY_NO_DAEMON"
+
+CONNECT_TIMEOUT = 1.0
+# A client that sends nothing for this long is dropped (the daemon serves one at a time)
+IDLE_TIMEOUT = 10.0
+START_TIMEOUT = 10.0
+
+# Scripts whose commands the daemon runs
+SCRIPTS = ("activate", "memory_cli", "memory_staging")
+
+
+# ========== Client ==========
+
+def _connect(socket_file: Path) -> Optional[socket.socket]:
+    if not hasattr(socket, "AF_UNIX") or not socket_file.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(str(socket_file))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(message: Dict[str, Any], socket_file: Path = SOCKET_FILE) -> Optional[Dict[str, Any]]:
+    """
+    Send one request to the daemon.
+
+    Returns:
+        The response, or None if no daemon accepted the request (it was
+        not run)
+
+    Raises:
+        ConnectionError: If the daemon took the request but closed the
+            connection without answering
+    """
+    sock = _connect(socket_file)
+    if sock is None:
+        return None
+    with sock, sock.makefile("rb") as reader:
+        try:
+            sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        except OSError:
+            return None
+        # Commands such as commit may take a while
+        sock.settimeout(None)
+        line = reader.readline()
+    if not line:
+        raise ConnectionError("memory daemon closed the connection")
+    return json.loads(line)
+
+
+def forward(script: str, argv: List[str]) -> Optional[int]:
+    """
+    Run a script command in the daemon, relaying its output.
+
+    Args:
+        script: Name of the script (see SCRIPTS)
+        argv: Its command line arguments
+
+    Returns:
+        The command's exit code, or None if no daemon is running (the
+        caller then runs the command itself)
+    """
+    if os.environ.get(NO_DAEMON_ENV):
+        return None
+    try:
+        response = request({"op": "run", "script": script, "argv": argv, "cwd": os.getcwd()})
+    except (ConnectionError, ValueError) as e:
+        print(f"[!] {e}", file=sys.stderr)
+        return 1
+    if response is None:
+        return None
+    if not response.get("ok"):
+        print(f"[!] memory daemon: {response.get('error')}", file=sys.stderr)
+        return 1
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit"]
+
+
+# ========== Daemon ==========
+
+class MemoryDaemon:
+    """Serve script commands one at a time with a resident MemoryManager."""
+
+    def __init__(self, socket_file: Path = SOCKET_FILE):
+        self.socket_file = Path(socket_file)
+        self.started = time.time()
+        self.requests = 0
+        self.stopping = False
+        self._mm = None
+
+    @property
+    def mm(self):
+        """The resident MemoryManager (created on first use)."""
+        if self._mm is None:
+            from memory_manager import MemoryManager
+            self._mm = MemoryManager()
+        return self._mm
+
+    def reset(self):
+        """Drop the resident MemoryManager (after a migration changed the layout)."""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def warm_up(self):
+        """Import the scripts and load the stores before the first request."""
+        for script in SCRIPTS:
+            __import__(script)
+        from memory_storage import MEMORY_TYPES
+        for memory_type in MEMORY_TYPES:
+            self.mm.storage.load(memory_type)
+
+    def dispatch(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle one request."""
+        self.requests += 1
+        op = message.get("op")
+        if op == "run":
+            return self.run(message.get("script"), message.get("argv") or [], message.get("cwd"))
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "uptime": round(time.time() - self.started, 3),
+                    "requests": self.requests}
+        if op == "stop":
+            self.stopping = True
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+    def run(self, script: str, argv: List[str], cwd: Optional[str]) -> Dict[str, Any]:
+        """Run a script's main() as if started with argv in cwd, capturing its output."""
+        if script not in SCRIPTS:
+            return {"ok": False, "error": f"unknown script: {script}"}
+
+        module = __import__(script)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        exit_code = 0
+        previous_dir, previous_argv = os.getcwd(), sys.argv
+        try:
+            # Project detection and relative paths follow the client's directory
+            if cwd:
+                os.chdir(cwd)
+            sys.argv = [f"{script}.py"] + list(argv)
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                if script == "activate":
+                    module.main(self.mm)
+                else:
+                    module.main(list(argv), self.mm)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                stderr.write(f"{e.code}\n")
+                exit_code = 1
+        except Exception:
+            stderr.write(traceback.format_exc())
+            exit_code = 1
+        finally:
+            os.chdir(previous_dir)
+            sys.argv = previous_argv
+
+        if script == "memory_cli" and argv[:1] == ["migrate"]:
+            self.reset()
+        return {"ok": True, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit": exit_code}
+
+    def serve(self):
+        """Listen on the socket until a stop request, SIGTERM or Ctrl-C."""
+        import signal
+        import socketserver
+
+        if request({"op": "ping"}, self.socket_file) is not None:
+            raise RuntimeError(f"a memory daemon is already listening on {self.socket_file}")
+        self.socket_file.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_file.exists():
+            # Left behind by a daemon that did not shut down cleanly
+            self.socket_file.unlink()
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            timeout = IDLE_TIMEOUT
+
+            def handle(self):
+                try:
+                    for line in self.rfile:
+                        if not line.endswith(b"\n"):
+                            break  # Cut off: the client gave up, do not run half a request
+                        try:
+                            response = daemon.dispatch(json.loads(line))
+                        except ValueError as e:
+                            response = {"ok": False, "error": f"invalid request: {e}"}
+                        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                        if daemon.stopping:
+                            break
+                except OSError:
+                    pass  # Idle timeout or client gone
+
+        # SIGTERM stops like Ctrl-C (KeyboardInterrupt is not caught by run())
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.warm_up()
+        # Created owner-only (0600): a chmod after bind() would leave it open to others for a moment
+        old_umask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(str(self.socket_file), Handler)
+        finally:
+            os.umask(old_umask)
+        with server:
+            try:
+                while not self.stopping:
+                    server.handle_request()
+            finally:
+                self.socket_file.unlink(missing_ok=True)
+                self.reset()
+
+
+def start_detached(socket_file: Path = SOCKET_FILE) -> Optional[Dict[str, Any]]:
+    """Start a daemon in the background and wait until it answers; returns its ping."""
+    import subprocess
+
+    socket_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(LOG_FILE, "ab") as log:
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "start"],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         cwd=str(SCRIPT_DIR), start_new_session=True)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        status = request({"op": "ping"}, socket_file)
+        if status is not None:
+            return status
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resident memory daemon')
+    parser.add_argument('command', choices=['start', 'stop', 'status'])
+    parser.add_argument('--detach', action='store_true', help='start: run in the background')
+    args = parser.parse_args()
+
+    if args.command == 'start':
+        if args.detach:
+            status = start_detached()
+            if status is None:
+                print(f"[!] Daemon did not start, see {LOG_FILE}")
+                sys.exit(1)
+            print(f"[v] Memory daemon running (pid {status['pid']}) on {SOCKET_FILE}")
+            return
+        try:
+            MemoryDaemon().serve()
+        except RuntimeError as e:
+            print(f"[!] {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == 'stop':
+        if request({"op": "stop"}) is None:
+            print("[-] No memory daemon running")
+            return
+        # The socket is removed once the daemon has left its loop
+        deadline = time.time() + START_TIMEOUT
+        while SOCKET_FILE.exists() and time.time() < deadline:
+            time.sleep(0.05)
+        print("[v] Memory daemon stopped")
+
+    elif args.command == 'status':
+        status = request({"op": "ping"})
+        if status is None:
+            print("[-] No memory daemon running")
+            sys.exit(1)
+        print(f"[v] Memory daemon pid {status['pid']}, up {status['uptime']:.0f}s, "
+              f"{status['requests']} requests, socket {SOCKET_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Fork server for the memory scripts (opt-in).
+
+Most of a short command such as `memory_staging.py add` is spent starting
+the interpreter and importing the memory modules. The fork server imports
+memory_manager, memory_staging, quick_load, project_detector and the script
+entry points once, reads the memory files once (so they sit in the OS page
+cache) and waits on a UNIX-domain socket in the memory directory
+(.forkserver.sock). For each command sent by memory_launch.py it forks a
+child that starts with everything loaded. The child takes over the
+launcher's stdin/stdout/stderr (passed as file descriptors), argv, working
+directory and environment, runs the script's main() and reports the exit
+code; output goes straight to the launcher's terminal or pipe.
+
+Unlike memory_daemon nothing is shared between commands: each one runs in
+its own process and reads the stores itself, exactly like a direct call,
+and commands run in parallel. Restart the server after updating the
+scripts.
+
+Protocol (memory_launch.py -> server): NUL-separated fields, ended by
+shutting down the write side; the three descriptors travel as SCM_RIGHTS
+with the first bytes.
+    run, script, cwd, stdio encoding, stdio errors, argc, argv..., KEY=VALUE...
+        -> "<child pid>\\n<exit code>\\n"
+    ping -> "<pid> <uptime> <commands served>\\n"
+    stop -> "ok\\n"
+
+Usage:
+    python memory_forkserver.py start [--detach]
+    python memory_forkserver.py status
+    python memory_forkserver.py stop
+"""
+
+import gc
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import traceback
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT_DIR = Path(__file__).parent
+SKILL_DIR = SCRIPT_DIR.parent
+MEMORY_DIR = SKILL_DIR / "user-data" / "memory"
+SOCKET_FILE = MEMORY_DIR / ".forkserver.sock"
+LOG_FILE = MEMORY_DIR / ".forkserver.log"
+
+sys.path.insert(0, str(SCRIPT_DIR))
+
+# Imported before forking, so children start with them loaded
+PRELOAD = ("memory_manager", "memory_staging", "quick_load", "project_detector", "activate", "memory_cli")
+# Scripts the launcher can run (memory_launch.SCRIPTS)
+SCRIPTS = ("activate", "memory_cli", "memory_staging")
+
+CONNECT_TIMEOUT = 1.0
+# A launcher that does not finish sending its request within this time is dropped
+IDLE_TIMEOUT = 10.0
+START_TIMEOUT = 10.0
+# accept() wakes up this often to reap finished children
+REAP_INTERVAL = 1.0
+STDIO_FDS = 3
+
+
+def warm_page_cache(memory_dir: Path) -> int:
+    """Read every file in the memory directory once; returns the bytes read."""
+    total = 0
+    for path in memory_dir.rglob("*"):
+        try:
+            if not path.is_file():
+                continue
+            with open(path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    total += len(chunk)
+        except OSError:
+            continue
+    return total
+
+
+def parse_request(data: bytes) -> Dict[str, Any]:
+    """Decode a launcher request (see the module docstring)."""
+    fields = data.split(b"\0")
+    op = fields[0].decode("ascii", "replace")
+    if op != "run":
+        return {"op": op}
+    script, cwd, encoding, errors = (os.fsdecode(field) for field in fields[1:5])
+    argc = int(fields[5])
+    argv = [os.fsdecode(field) for field in fields[6:6 + argc]]
+    env = dict(os.fsdecode(field).split("=", 1) for field in fields[6 + argc:] if b"=" in field)
+    return {"op": op, "script": script, "cwd": cwd, "encoding": encoding, "errors": errors,
+            "argv": argv, "env": env}
+
+
+def run_script(script: str, argv: List[str]) -> int:
+    """Run a preloaded script's main() as `python <script>.py argv`; returns the exit code."""
+    sys.argv = [str(SCRIPT_DIR / f"{script}.py")] + argv
+    module = sys.modules[script]
+    try:
+        if script == "activate":
+            module.main()
+        else:
+            module.main(argv)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def run_child(conn: socket.socket, listener: socket.socket, fds: List[int], request: Dict[str, Any]):
+    """Body of a forked child: become the launcher's process and run its command. Never returns."""
+    exit_code = 1
+    try:
+        listener.close()
+        conn.sendall(f"{os.getpid()}\n".encode("ascii"))
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        # Received descriptors are >= 3 (the server's own stdio is open)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            os.close(fd)
+        encoding, errors = request["encoding"], request["errors"]
+        sys.stdin = open(0, "r", encoding=encoding, errors=errors, closefd=False)
+        # Line buffered on a terminal, like a fresh interpreter
+        sys.stdout = open(1, "w", buffering=1 if os.isatty(1) else -1, encoding=encoding, errors=errors,
+                          closefd=False)
+        sys.stderr = open(2, "w", buffering=1, encoding=encoding, errors="backslashreplace", closefd=False)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        exit_code = run_script(request["script"], request["argv"])
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except (OSError, ValueError):
+            pass
+        try:
+            conn.sendall(f"{exit_code}\n".encode("ascii"))
+        except OSError:
+            pass
+        os._exit(exit_code & 0xFF)
+
+
+class ForkServer:
+    """Fork a preloaded child per launcher request."""
+
+    def __init__(self, socket_file: Path = SOCKET_FILE):
+        self.socket_file = Path(socket_file)
+        self.started = time.time()
+        self.served = 0
+        self.children = set()
+
+    def preload(self) -> int:
+        """Import PRELOAD and warm the page cache; returns the bytes read."""
+        for name in PRELOAD:
+            __import__(name)
+        warmed = warm_page_cache(self.socket_file.parent)
+        # Keep the preloaded objects out of the children's collections (fewer copied pages)
+        gc.collect()
+        gc.freeze()
+        return warmed
+
+    def reap(self):
+        """Collect finished children."""
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            self.children.discard(pid)
+
+    def receive(self, conn: socket.socket) -> Tuple[bytes, List[int]]:
+        """Read a whole request and the descriptors sent with it."""
+        data, fds, _, _ = socket.recv_fds(conn, 65536, STDIO_FDS)
+        chunks = [data]
+        while data:
+            data = conn.recv(65536)
+            chunks.append(data)
+        return b"".join(chunks), list(fds)
+
+    def handle(self, conn: socket.socket, listener: socket.socket) -> bool:
+        """Serve one connection; returns False on a stop request."""
+        fds: List[int] = []
+        try:
+            data, fds = self.receive(conn)
+            request = parse_request(data)
+            op = request["op"]
+            if op == "ping":
+                conn.sendall(f"{os.getpid()} {time.time() - self.started:.3f} {self.served}\n".encode("ascii"))
+            elif op == "stop":
+                conn.sendall(b"ok\n")
+                return False
+            elif op == "run" and request["script"] in SCRIPTS and len(fds) == STDIO_FDS:
+                self.served += 1
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    run_child(conn, listener, fds, request)
+                self.children.add(pid)
+        except (OSError, ValueError, IndexError) as e:
+            print(f"[!] Dropped request: {e}", file=sys.stderr)
+        finally:
+            for fd in fds:
+                os.close(fd)
+        return True
+
+    def serve(self):
+        """Listen on the socket until a stop request, SIGTERM or Ctrl-C."""
+        if control("ping", self.socket_file) is not None:
+            raise RuntimeError(f"a memory fork server is already listening on {self.socket_file}")
+        self.socket_file.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_file.exists():
+            # Left behind by a server that did not shut down cleanly
+            self.socket_file.unlink()
+
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        warmed = self.preload()
+        print(f"[v] Preloaded {len(PRELOAD)} modules, read {warmed / 1024:.0f} KB of memory files", flush=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            # Created owner-only (0600): a chmod after bind() would leave it open to others for a moment
+            old_umask = os.umask(0o177)
+            try:
+                listener.bind(str(self.socket_file))
+            finally:
+                os.umask(old_umask)
+            listener.listen()
+            listener.settimeout(REAP_INTERVAL)
+            try:
+                while True:
+                    self.reap()
+                    try:
+                        conn, _ = listener.accept()
+                    except socket.timeout:
+                        continue
+                    with conn:
+                        conn.settimeout(IDLE_TIMEOUT)
+                        if not self.handle(conn, listener):
+                            break
+            finally:
+                self.socket_file.unlink(missing_ok=True)
+
+
+def control(op: str, socket_file: Path = SOCKET_FILE) -> Optional[str]:
+    """Send ping or stop; returns the reply line, or None if no server answered."""
+    if not hasattr(socket, "AF_UNIX") or not socket_file.exists():
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(str(socket_file))
+            sock.sendall(op.encode("ascii"))
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile("rb") as reader:
+                reply = reader.readline()
+        except OSError:
+            return None
+    return reply.decode("ascii").strip() or None
+
+
+def start_detached(socket_file: Path = SOCKET_FILE) -> Optional[str]:
+    """Start a server in the background and wait until it answers; returns its ping."""
+    import subprocess
+
+    socket_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(LOG_FILE, "ab") as log:
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "start"],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         cwd=str(SCRIPT_DIR), start_new_session=True)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        status = control("ping", socket_file)
+        if status is not None:
+            return status
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fork server for the memory scripts')
+    parser.add_argument('command', choices=['start', 'stop', 'status'])
+    parser.add_argument('--detach', action='store_true', help='start: run in the background')
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("[!] The fork server needs os.fork (not available on this platform)")
+        sys.exit(1)
+
+    if args.command == 'start':
+        if args.detach:
+            status = start_detached()
+            if status is None:
+                print(f"[!] Fork server did not start, see {LOG_FILE}")
+                sys.exit(1)
+            print(f"[v] Memory fork server running (pid {status.split()[0]}) on {SOCKET_FILE}")
+            return
+        try:
+            ForkServer().serve()
+        except RuntimeError as e:
+            print(f"[!] {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == 'stop':
+        if control("stop") is None:
+            print("[-] No memory fork server running")
+            return
+        deadline = time.time() + START_TIMEOUT
+        while SOCKET_FILE.exists() and time.time() < deadline:
+            time.sleep(0.05)
+        print("[v] Memory fork server stopped")
+
+    elif args.command == 'status':
+        status = control("ping")
+        if status is None:
+            print("[-] No memory fork server running")
+            sys.exit(1)
+        pid, uptime, served = status.split()
+        print(f"[v] Memory fork server pid {pid}, up {float(uptime):.0f}s, "
+              f"{served} commands, socket {SOCKET_FILE}")
+
+
+if __name__ == "__main__":
+    main()
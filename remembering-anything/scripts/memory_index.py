@@ -0,0 +1,911 @@
+"""
+Secondary indexes for the JSON memory stores.
+
+Each store (facts.json, ...) has an IndexSet that is kept in sync with every
+journal operation applied by JsonStorage. Indexes are created on first use:
+the ones that are costly to build (n-grams, duplicate keys, MinHash
+buckets) are persisted next to the snapshot, one file each
+(facts.index.ngram.json, ...), and only read when an operation needs them;
+the others are built from the loaded store. facts.index.json lists the
+persisted indexes and the snapshot signature they were built from; they
+are reused only if the snapshot is unchanged, and the changes the journal
+made since are applied on top, just like to the store itself.
+
+The active core records of each store are also written to a small view file
+(facts.core.json) on every write, so the core layer can be loaded without
+reading the full store.
+"""
+
+import json
+import os
+import bisect
+import hashlib
+from pathlib import Path
+from functools import lru_cache
+from typing import Optional, List, Dict, Set, Iterable, Tuple, Any
+
+import memory_journal
+from memory_shards import TimelineKey, timestamp_key
+from memory_vectors import VectorIndex
+from memory_journal import OP_UPDATE, OP_DEPRECATE
+from memory_schema import record_epoch
+from memory_lock import temp_path
+
+# Bump when an index definition changes so stale files are rebuilt
+INDEX_VERSION = 12
+INDEX_SUFFIX = ".index.json"
+CORE_VIEW_SUFFIX = ".core.json"
+
+# Accesses needed before auto_maintain_importance promotes a memory to active
+PROMOTE_ACCESS_COUNT = 3
+
+
+def index_path(store_path: Path, name: Optional[str] = None) -> Path:
+    """
+    Get an index file path for a store file: the list of persisted indexes
+    (facts.json -> facts.index.json) or one index (facts.index.ngram.json).
+    """
+    store_path = Path(store_path)
+    if name is None:
+        return store_path.with_name(store_path.stem + INDEX_SUFFIX)
+    return store_path.with_name(f"{store_path.stem}.index.{name}.json")
+
+
+def core_view_path(store_path: Path) -> Path:
+    """Get the core view path for a store file (facts.json -> facts.core.json)."""
+    store_path = Path(store_path)
+    return store_path.with_name(store_path.stem + CORE_VIEW_SUFFIX)
+
+
+def matches_query(memory: Dict, query_lower: str) -> bool:
+    """Substring match on content and tags (the search_memories semantics)."""
+    return (query_lower in memory["content"].lower() or
+            any(query_lower in tag.lower() for tag in memory.get("tags", [])))
+
+
+class MemoryIndex:
+    """Base class for an index over the records of one store."""
+
+    name = ""
+    # Record fields the index depends on; updates touching none are skipped
+    fields: Tuple[str, ...] = ()
+    # Saved in its own file (to_dict/load) instead of built from the store on first use
+    persisted = False
+
+    def attach(self, owner: "IndexSet"):
+        """Called with the IndexSet holding the index (for its insertion order)."""
+
+    def build(self, records: Iterable[Dict]):
+        """Index the records of a store (an empty index)."""
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Dict):
+        raise NotImplementedError
+
+    def remove(self, record: Dict):
+        raise NotImplementedError
+
+    def to_dict(self) -> Any:
+        raise NotImplementedError
+
+    def load(self, data: Any):
+        raise NotImplementedError
+
+
+class NgramIndex(MemoryIndex):
+    """
+    Inverted index from character n-grams to active memory ids.
+
+    Content and each tag are lowercased and split into character bigrams;
+    non-ASCII characters (CJK) are also indexed as unigrams so one-character
+    Chinese queries are answered from the index. Every substring of a text
+    has all its bigrams in the text, so intersecting posting lists yields a
+    superset of the substring matches, which the caller then verifies.
+
+    Postings keep the number of times the gram occurs in the record, and
+    the index keeps each record's gram count, so the grams double as the
+    terms of BM25 ranking (see memory_rank).
+    """
+
+    name = "ngram"
+    fields = ("status", "content", "tags")
+    persisted = True
+
+    def __init__(self):
+        # gram -> {id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # id -> number of grams (document length)
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    @staticmethod
+    def text_terms(text: str) -> List[str]:
+        """Grams of one lowercased text, with repetitions."""
+        terms = [text[i:i + 2] for i in range(len(text) - 1)]
+        terms.extend(ch for ch in text if not ch.isascii())
+        return terms
+
+    @staticmethod
+    def text_grams(text: str) -> Set[str]:
+        """Grams of one lowercased text."""
+        return set(NgramIndex.text_terms(text))
+
+    def record_terms(self, record: Dict) -> Dict[str, int]:
+        """Term frequencies of a record's content and tags (empty unless active)."""
+        if record.get("status") != "active":
+            return {}
+        counts: Dict[str, int] = {}
+        for text in [record["content"]] + list(record.get("tags") or []):
+            for term in self.text_terms(text.lower()):
+                counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def add(self, record: Dict):
+        memory_id = record["id"]
+        counts = self.record_terms(record)
+        if not counts:
+            return
+        for gram, count in counts.items():
+            self.postings.setdefault(gram, {})[memory_id] = count
+        length = sum(counts.values())
+        self.lengths[memory_id] = length
+        self.total_length += length
+
+    def remove(self, record: Dict):
+        memory_id = record["id"]
+        for gram in self.record_terms(record):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.pop(memory_id, None)
+                if not ids:
+                    del self.postings[gram]
+        self.total_length -= self.lengths.pop(memory_id, 0)
+
+    def candidates(self, query_lower: str) -> Optional[Set[str]]:
+        """
+        Get ids that may contain query_lower.
+
+        Returns:
+            Candidate id set, or None if the query cannot be answered from
+            the index (empty or single ASCII character) and needs a scan
+        """
+        if len(query_lower) >= 2:
+            grams = {query_lower[i:i + 2] for i in range(len(query_lower) - 1)}
+        elif query_lower and not query_lower.isascii():
+            grams = {query_lower}
+        else:
+            return None
+
+        posting_lists = sorted((self.postings.get(g, {}) for g in grams), key=len)
+        result = set(posting_lists[0])
+        for ids in posting_lists[1:]:
+            if not result:
+                break
+            result = result & ids.keys()
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"postings": self.postings, "lengths": self.lengths}
+
+    def load(self, data: Dict[str, Any]):
+        self.postings = data["postings"]
+        self.lengths = data["lengths"]
+        self.total_length = sum(self.lengths.values())
+
+
+def content_key(content: str, category: str) -> str:
+    """
+    Hash of (category, normalized content), the duplicate-detection key.
+
+    Content is normalized the same way as memory_storage.normalize_content.
+    """
+    raw = f"{category}\x1f{content.strip().lower()}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class DuplicateIndex(MemoryIndex):
+    """Map from content_key() of active records to their ids."""
+
+    name = "dedup"
+    fields = ("status", "content", "category")
+    persisted = True
+
+    def __init__(self):
+        self.keys: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def record_key(record: Dict) -> Optional[str]:
+        if record.get("status") != "active":
+            return None
+        return content_key(record["content"], record.get("category"))
+
+    def add(self, record: Dict):
+        key = self.record_key(record)
+        if key is not None:
+            self.keys.setdefault(key, set()).add(record["id"])
+
+    def remove(self, record: Dict):
+        key = self.record_key(record)
+        ids = self.keys.get(key) if key is not None else None
+        if ids is not None:
+            ids.discard(record["id"])
+            if not ids:
+                del self.keys[key]
+
+    def lookup(self, content: str, category: str) -> Set[str]:
+        """Get ids of active records whose key matches (verify before use)."""
+        return self.keys.get(content_key(content, category), set())
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {key: sorted(ids) for key, ids in self.keys.items()}
+
+    def load(self, data: Dict[str, List[str]]):
+        self.keys = {key: set(ids) for key, ids in data.items()}
+
+
+# content_similarity at which a new memory is reported as a near duplicate
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+
+
+def similarity_shingles(content: str) -> Set[str]:
+    """
+    Shingles compared by content_similarity().
+
+    Content is lowercased and stripped of whitespace and punctuation, then
+    split like NgramIndex.text_grams (bigrams plus CJK unigrams), so a
+    reworded repeat such as "住在北京" / "现在住在北京" keeps most of its
+    shingles. Text of a single character is its own shingle.
+    """
+    text = "".join(ch for ch in content.lower() if ch.isalnum())
+    if len(text) < 2:
+        return {text} if text else set()
+    return NgramIndex.text_grams(text)
+
+
+def shingle_similarity(shingles_a: Set[str], shingles_b: Set[str]) -> float:
+    """Jaccard similarity of two shingle sets (0.0 if either is empty)."""
+    if not shingles_a or not shingles_b:
+        return 0.0
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+def content_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the shingles of two contents (0.0 - 1.0)."""
+    return shingle_similarity(similarity_shingles(a), similarity_shingles(b))
+
+
+_MASK64 = (1 << 64) - 1
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash64(text: str) -> int:
+    """Stable 64-bit hash (the built-in hash() of str changes between processes)."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class NearDuplicateIndex(MemoryIndex):
+    """
+    MinHash LSH buckets of active records, per category.
+
+    The MinHash signature uses one-permutation hashing: every shingle is
+    hashed once, the hash picks one of NUM_HASHES bins and the bin keeps its
+    smallest value; empty bins borrow the next filled bin (rotation
+    densification), so short texts still get a full signature. Two records
+    agree on a bin with probability about equal to their Jaccard
+    similarity.
+
+    The signature is cut into BANDS bands of ROWS values and each band is
+    hashed, together with the category, into a bucket. Records sharing a
+    bucket are candidates, which the caller verifies with
+    content_similarity(). With 8 bands of 3 rows a pair at similarity 0.7
+    shares a bucket 97% of the time, one at 0.3 about 19%, so a lookup
+    reads a few buckets instead of the whole category.
+    """
+
+    name = "near"
+    fields = ("status", "content", "category")
+    persisted = True
+
+    NUM_HASHES = 24
+    BANDS = 8
+    ROWS = NUM_HASHES // BANDS
+
+    # Odd 64-bit multipliers mixing the band number and its ROWS values into a bucket key
+    _BAND_MIX = 0x9E3779B97F4A7C15
+    _ROW_MIX = (0xBF58476D1CE4E5B9, 0x94D049BB133111EB, 0xD6E8FEB86659FD93)
+
+    def __init__(self):
+        self.buckets: Dict[int, Set[str]] = {}
+
+    @classmethod
+    def signature(cls, shingles: Iterable[str]) -> List[int]:
+        """One-permutation MinHash signature of a shingle set (all zeros if it is empty)."""
+        bins: List[Optional[int]] = [None] * cls.NUM_HASHES
+        for shingle in shingles:
+            value, slot = divmod(_hash64(shingle), cls.NUM_HASHES)
+            if bins[slot] is None or value < bins[slot]:
+                bins[slot] = value
+
+        signature = [0] * cls.NUM_HASHES
+        borrowed, distance = None, 0
+        # Walk backwards twice round so every empty bin sees the next filled one
+        for i in range(2 * cls.NUM_HASHES - 1, -1, -1):
+            slot = i % cls.NUM_HASHES
+            if bins[slot] is not None:
+                borrowed, distance = bins[slot], 0
+            else:
+                distance += 1
+            if i < cls.NUM_HASHES and borrowed is not None:
+                signature[slot] = bins[slot] if bins[slot] is not None else borrowed + (distance << 58)
+        return signature
+
+    @classmethod
+    def bucket_keys(cls, content: str, category: str) -> List[int]:
+        """Bucket of each band for a content in a category (empty for blank content)."""
+        shingles = similarity_shingles(content)
+        if not shingles:
+            return []
+        signature = cls.signature(shingles)
+        base = _hash64(str(category))
+        keys = []
+        for band in range(cls.BANDS):
+            key = base + band * cls._BAND_MIX
+            for row, value in enumerate(signature[band * cls.ROWS:(band + 1) * cls.ROWS]):
+                key += value * cls._ROW_MIX[row]
+            keys.append(key & _MASK64)
+        return keys
+
+    @classmethod
+    def record_keys(cls, record: Dict) -> List[int]:
+        if record.get("status") != "active":
+            return []
+        return cls.bucket_keys(record["content"], record.get("category"))
+
+    def add(self, record: Dict):
+        for key in self.record_keys(record):
+            self.buckets.setdefault(key, set()).add(record["id"])
+
+    def remove(self, record: Dict):
+        for key in self.record_keys(record):
+            ids = self.buckets.get(key)
+            if ids is not None:
+                ids.discard(record["id"])
+                if not ids:
+                    del self.buckets[key]
+
+    def candidates(self, content: str, category: str) -> Set[str]:
+        """Get ids of active records that may be similar to content (verify before use)."""
+        result: Set[str] = set()
+        for key in self.bucket_keys(content, category):
+            result |= self.buckets.get(key, set())
+        return result
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {str(key): sorted(ids) for key, ids in self.buckets.items()}
+
+    def load(self, data: Dict[str, List[str]]):
+        self.buckets = {int(key): set(ids) for key, ids in data.items()}
+
+
+def record_tags(record: Dict) -> List[str]:
+    """Distinct tags and context tags of a record (matched case-sensitively)."""
+    return list(dict.fromkeys((record.get("context_tags") or []) + (record.get("tags") or [])))
+
+
+class TagIndex(MemoryIndex):
+    """Inverted index from tags and context tags to active memory ids."""
+
+    name = "tags"
+    fields = ("status", "tags", "context_tags")
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}
+
+    def add(self, record: Dict):
+        if record.get("status") != "active":
+            return
+        for tag in record_tags(record):
+            self.postings.setdefault(tag, set()).add(record["id"])
+
+    def remove(self, record: Dict):
+        if record.get("status") != "active":
+            return
+        for tag in record_tags(record):
+            ids = self.postings.get(tag)
+            if ids is not None:
+                ids.discard(record["id"])
+                if not ids:
+                    del self.postings[tag]
+
+    def match_counts(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Get the number of distinct query tags each active memory carries."""
+        counts: Dict[str, int] = {}
+        for tag in dict.fromkeys(tags):
+            for memory_id in self.postings.get(tag, ()):
+                counts[memory_id] = counts.get(memory_id, 0) + 1
+        return counts
+
+
+class LayerIndex(MemoryIndex):
+    """Map from (status, importance) to the ids of all records in that layer."""
+
+    name = "layer"
+    fields = ("status", "importance")
+
+    def __init__(self):
+        self.layers: Dict[Tuple[str, Optional[str]], Set[str]] = {}
+
+    @staticmethod
+    def record_key(record: Dict) -> Tuple[str, Optional[str]]:
+        return (record.get("status"), record.get("importance"))
+
+    def add(self, record: Dict):
+        self.layers.setdefault(self.record_key(record), set()).add(record["id"])
+
+    def remove(self, record: Dict):
+        key = self.record_key(record)
+        ids = self.layers.get(key)
+        if ids is not None:
+            ids.discard(record["id"])
+            if not ids:
+                del self.layers[key]
+
+    def lookup(self, status: Optional[str] = None, importance: Optional[str] = None) -> Set[str]:
+        """Get ids with the given status and importance (None matches any)."""
+        result: Set[str] = set()
+        for (layer_status, layer_importance), ids in self.layers.items():
+            if status is not None and layer_status != status:
+                continue
+            if importance is not None and layer_importance != importance:
+                continue
+            result |= ids
+        return result
+
+
+class CategoryIndex(MemoryIndex):
+    """Map from category to the ids of all records in it."""
+
+    name = "category"
+    fields = ("category",)
+
+    def __init__(self):
+        self.categories: Dict[str, Set[str]] = {}
+
+    def add(self, record: Dict):
+        self.categories.setdefault(record.get("category"), set()).add(record["id"])
+
+    def remove(self, record: Dict):
+        category = record.get("category")
+        ids = self.categories.get(category)
+        if ids is not None:
+            ids.discard(record["id"])
+            if not ids:
+                del self.categories[category]
+
+    def lookup(self, category: str) -> Set[str]:
+        return self.categories.get(category, set())
+
+
+class ScheduleIndex(MemoryIndex):
+    """
+    Active records ordered by the time their importance may next change.
+
+    Each queue is a sorted list of (epoch, id), where epoch is the record's
+    last access (or creation) time in epoch microseconds, read from its
+    precomputed epoch fields:
+
+    - "active": importance active, demoted once epoch is old enough
+    - "contextual": importance contextual, archived once epoch is old enough
+    - "promotable": importance neither active nor core with enough
+      accesses, promoted while epoch is recent
+
+    A maintenance run only reads the due end of each queue, so its cost
+    follows the number of transitions rather than the store size.
+    """
+
+    name = "schedule"
+    fields = ("status", "importance", "last_accessed", "timestamp", "access_count",
+              "last_accessed_epoch", "ts_epoch")
+
+    # Cutoffs are widened by this many microseconds; callers re-check the exact rule
+    SLACK = 1000
+
+    def __init__(self):
+        self.queues: Dict[str, List[Tuple[int, str]]] = {
+            "active": [], "contextual": [], "promotable": [],
+        }
+
+    @staticmethod
+    def record_time(record: Dict) -> Optional[int]:
+        if record.get("last_accessed"):
+            return record_epoch(record, "last_accessed")
+        return record_epoch(record, "timestamp")
+
+    @staticmethod
+    def record_queues(record: Dict) -> List[str]:
+        if record.get("status") != "active":
+            return []
+        importance = record.get("importance")
+        queues = []
+        if importance in ("active", "contextual"):
+            queues.append(importance)
+        if (importance not in ("active", "core") and
+                (record.get("access_count", 0) or 0) >= PROMOTE_ACCESS_COUNT):
+            queues.append("promotable")
+        return queues
+
+    def build(self, records: Iterable[Dict]):
+        for record in records:
+            epoch = self.record_time(record)
+            if epoch is not None:
+                for name in self.record_queues(record):
+                    self.queues[name].append((epoch, record["id"]))
+        for queue in self.queues.values():
+            queue.sort()
+
+    def add(self, record: Dict):
+        epoch = self.record_time(record)
+        if epoch is None:
+            return
+        for name in self.record_queues(record):
+            bisect.insort(self.queues[name], (epoch, record["id"]))
+
+    def remove(self, record: Dict):
+        epoch = self.record_time(record)
+        if epoch is None:
+            return
+        entry = (epoch, record["id"])
+        for name in self.record_queues(record):
+            queue = self.queues[name]
+            i = bisect.bisect_left(queue, entry)
+            if i < len(queue) and queue[i] == entry:
+                del queue[i]
+
+    def due(self, active_before: int, contextual_before: int) -> Set[str]:
+        """
+        Get ids whose importance may change.
+
+        Args:
+            active_before: Epoch microseconds before which active memories
+                are demoted and after which promotable ones are promoted
+            contextual_before: Epoch microseconds before which contextual
+                memories are archived
+        """
+        active = self.queues["active"]
+        contextual = self.queues["contextual"]
+        promotable = self.queues["promotable"]
+
+        ids = {i for _, i in active[:bisect.bisect_left(active, (active_before + self.SLACK,))]}
+        ids.update(i for _, i in contextual[:bisect.bisect_left(contextual, (contextual_before + self.SLACK,))])
+        ids.update(i for _, i in promotable[bisect.bisect_left(promotable, (active_before - self.SLACK,)):])
+        return ids
+
+
+class TimeIndex(MemoryIndex):
+    """
+    Active records ordered by creation time, overall and per category.
+
+    Each list holds (timestamp_key, -seq, id) in ascending order, so read
+    backwards it is the newest-first order of memory_shards.newest (equal
+    timestamps keep insertion order, records without an ISO timestamp come
+    last). A page is a slice found by bisecting on the time bounds and the
+    cursor, O(log n + page).
+    """
+
+    name = "time"
+    fields = ("status", "timestamp", "category")
+
+    # Sorts after every undated entry ("", -seq, id) and before every dated one
+    _AFTER_UNDATED = ("", float("inf"))
+
+    def __init__(self):
+        self.all: List[Tuple[str, int, str]] = []
+        self.categories: Dict[Optional[str], List[Tuple[str, int, str]]] = {}
+        self.owner: Optional["IndexSet"] = None
+
+    def attach(self, owner: "IndexSet"):
+        self.owner = owner
+
+    def entry(self, record: Dict) -> Optional[Tuple[str, int, str]]:
+        if record.get("status") != "active":
+            return None
+        return (timestamp_key(record), -self.owner.seq[record["id"]], record["id"])
+
+    def build(self, records: Iterable[Dict]):
+        for record in records:
+            entry = self.entry(record)
+            if entry is not None:
+                self.categories.setdefault(record.get("category"), []).append(entry)
+        for entries in self.categories.values():
+            entries.sort()
+        self.all = sorted(entry for entries in self.categories.values() for entry in entries)
+
+    def add(self, record: Dict):
+        entry = self.entry(record)
+        if entry is None:
+            return
+        bisect.insort(self.all, entry)
+        bisect.insort(self.categories.setdefault(record.get("category"), []), entry)
+
+    def remove(self, record: Dict):
+        entry = self.entry(record)
+        if entry is None:
+            return
+        category = record.get("category")
+        for entries in (self.all, self.categories.get(category, [])):
+            i = bisect.bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+        if category in self.categories and not self.categories[category]:
+            del self.categories[category]
+
+    def page(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: Optional[TimelineKey] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[TimelineKey]:
+        """
+        Get the timeline keys of active records, newest first.
+
+        Args:
+            category: Only this category (all if None)
+            limit: Maximum number of keys (all if None)
+            after: Only keys after this one in newest-first order (a cursor)
+            since, until: ISO bounds [since, until); bounded queries skip
+                records without an ISO timestamp
+        """
+        entries = self.all if category is None else self.categories.get(category, [])
+        lo, hi = 0, len(entries)
+        if since is not None or until is not None:
+            lo = bisect.bisect_right(entries, self._AFTER_UNDATED)
+        if since is not None:
+            lo = max(lo, bisect.bisect_left(entries, (since,)))
+        if until is not None:
+            hi = bisect.bisect_left(entries, (until,))
+        if after is not None:
+            timestamp, seq, memory_id = after
+            seq = self.owner.seq.get(memory_id, seq)
+            hi = min(hi, bisect.bisect_left(entries, (timestamp, -seq)))
+        start = lo if limit is None else max(lo, hi - max(limit, 0))
+        return [(timestamp, -neg_seq, memory_id)
+                for timestamp, neg_seq, memory_id in reversed(entries[start:hi])]
+
+
+def default_indexes() -> List[MemoryIndex]:
+    """Create the indexes maintained for every store."""
+    return [
+        NgramIndex(), DuplicateIndex(), NearDuplicateIndex(), TagIndex(),
+        LayerIndex(), CategoryIndex(), ScheduleIndex(), TimeIndex(), VectorIndex(),
+    ]
+
+
+class IndexSet:
+    """
+    All indexes of one store plus the insertion order of its records.
+
+    An index is created the first time it is used (indexes["ngram"]): a
+    persisted index is read from its file if the set came from
+    load_index_file(), any other is built from the store dict. Operations
+    applied before that cost nothing for it; while persisted indexes are
+    still unread, the first change of each record keeps the record's state
+    as of the snapshot, so the index file can be brought up to date.
+    """
+
+    def __init__(self, indexes: Optional[List[MemoryIndex]] = None):
+        # Indexes in use, and those not created yet
+        self.indexes: Dict[str, MemoryIndex] = {}
+        self.pending: Dict[str, MemoryIndex] = {
+            index.name: index for index in (indexes or default_indexes())
+        }
+        # The store dict the indexes cover
+        self.data: Dict[str, Dict] = {}
+        # Insertion order of records, used to return results in store order
+        self.seq: Dict[str, int] = {}
+        self.next_seq = 0
+        # Bumped on every change, so views derived from the store can tell they are stale
+        self.generation = 0
+        # (store path, snapshot signature) the persisted indexes are read from
+        self.source: Optional[Tuple[Path, Tuple[int, int]]] = None
+        # id -> record as of that snapshot (None if it did not exist), for every changed record
+        self.changed: Dict[str, Optional[Dict]] = {}
+
+    def __getitem__(self, name: str) -> MemoryIndex:
+        index = self.indexes.get(name)
+        if index is None:
+            index = self._create(name)
+        return index
+
+    def _create(self, name: str) -> MemoryIndex:
+        """Read or build an index that is not in use yet."""
+        index = self.pending.pop(name)
+        index.attach(self)
+        saved = load_index_part(*self.source, name) if self.source and index.persisted else None
+        if saved is not None:
+            try:
+                index.load(saved)
+            except (KeyError, TypeError, ValueError):
+                index, saved = type(index)(), None
+                index.attach(self)
+        if saved is None:
+            index.build(self.data.values())
+        else:
+            for memory_id, old in self.changed.items():
+                if old is not None:
+                    index.remove(old)
+                new = self.data.get(memory_id)
+                if new is not None:
+                    index.add(new)
+
+        self.indexes[name] = index
+        if not any(pending.persisted for pending in self.pending.values()):
+            self.source = None
+            self.changed = {}
+        return index
+
+    def build(self, data: Dict[str, Dict]):
+        """Index every record of a store dict."""
+        self.generation += 1
+        self.data = data
+        for memory_id in data:
+            self._assign_seq(memory_id)
+        for index in self.indexes.values():
+            index.build(data.values())
+
+    def _assign_seq(self, memory_id: str):
+        if memory_id not in self.seq:
+            self.seq[memory_id] = self.next_seq
+            self.next_seq += 1
+
+    def apply_op(self, data: Dict[str, Dict], op: Dict):
+        """Apply a journal operation to the store dict, updating every index in use."""
+        memory_id = op.get("id")
+        kind = op.get("op")
+        self.generation += 1
+        self.data = data
+
+        old = data.get(memory_id)
+        if self.source is not None and memory_id not in self.changed:
+            # Updates change the record in place
+            self.changed[memory_id] = dict(old) if old is not None else None
+
+        if kind in (OP_UPDATE, OP_DEPRECATE):
+            changed = set(op.get("fields", {}))
+            affected = [i for i in self.indexes.values() if changed.intersection(i.fields)]
+        else:
+            affected = list(self.indexes.values())
+
+        if old is not None:
+            for index in affected:
+                index.remove(old)
+
+        memory_journal.apply_op(data, op)
+
+        new = data.get(memory_id)
+        if new is not None:
+            self._assign_seq(memory_id)
+            for index in affected:
+                index.add(new)
+        else:
+            self.seq.pop(memory_id, None)
+
+    def ordered(self, ids: Iterable[str]) -> List[str]:
+        """Sort ids by store insertion order."""
+        return sorted(ids, key=lambda memory_id: self.seq.get(memory_id, 0))
+
+
+def persisted_index_names() -> List[str]:
+    """Names of the indexes saved next to every store."""
+    return [index.name for index in default_indexes() if index.persisted]
+
+
+def index_files(store_path: Path) -> List[Path]:
+    """Every index file of a store."""
+    return [index_path(store_path)] + [index_path(store_path, name) for name in persisted_index_names()]
+
+
+def load_index_file(store_path: Path, data: Dict[str, Dict],
+                    snapshot_signature: Optional[Tuple[int, int]]) -> Optional[IndexSet]:
+    """
+    Get the indexes of a snapshot dict whose persisted indexes are saved.
+
+    Only the small list file is read here; each persisted index is read
+    when it is first used (data may have the journal replayed by then).
+
+    Returns:
+        IndexSet, or None if the list is missing, outdated or was written
+        for another snapshot
+    """
+    if snapshot_signature is None:
+        return None
+    try:
+        with open(index_path(store_path), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if (saved.get("version") != INDEX_VERSION or saved.get("snapshot") != list(snapshot_signature) or
+            saved.get("indexes") != persisted_index_names()):
+        return None
+
+    indexes = IndexSet()
+    indexes.build(data)
+    indexes.source = (Path(store_path), tuple(snapshot_signature))
+    return indexes
+
+
+def load_index_part(store_path: Path, snapshot_signature: Tuple[int, int], name: str) -> Any:
+    """
+    Read one persisted index.
+
+    Returns:
+        The index's to_dict() data, or None if the file is missing or was
+        written for another snapshot (another process compacted the store)
+    """
+    try:
+        with open(index_path(store_path, name), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if saved.get("version") != INDEX_VERSION or saved.get("snapshot") != list(snapshot_signature):
+        return None
+    return saved.get("index")
+
+
+def _write_json_atomic(path: Path, payload: Dict[str, Any]):
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def save_index_file(store_path: Path, indexes: IndexSet, snapshot_signature: Tuple[int, int]):
+    """
+    Atomically persist indexes built from the snapshot with the given signature.
+
+    Persisted indexes that are not in use yet are read first; the list file
+    is written last, so it never points at index files of another snapshot.
+    """
+    names = persisted_index_names()
+    for name in names:
+        payload = {"version": INDEX_VERSION, "snapshot": list(snapshot_signature), "index": indexes[name].to_dict()}
+        _write_json_atomic(index_path(store_path, name), payload)
+    _write_json_atomic(index_path(store_path),
+                       {"version": INDEX_VERSION, "snapshot": list(snapshot_signature), "indexes": names})
+
+
+def _signature_to_json(signature: Any) -> Any:
+    """Store signatures are nested tuples; JSON round-trips them as lists."""
+    return json.loads(json.dumps(signature))
+
+
+def load_core_view(store_path: Path, store_signature: Any) -> Optional[List[Dict]]:
+    """
+    Load the active core records of a store from its core view.
+
+    Returns:
+        Records in store order, or None if the view is missing or was
+        written for a different state of the store
+    """
+    try:
+        with open(core_view_path(store_path), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if saved.get("store") != _signature_to_json(store_signature):
+        return None
+    return saved.get("memories")
+
+
+def save_core_view(store_path: Path, records: List[Dict], store_signature: Any):
+    """Atomically write the core view for the given store state."""
+    path = core_view_path(store_path)
+    tmp_path = temp_path(path)
+    payload = {"store": _signature_to_json(store_signature), "memories": records}
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
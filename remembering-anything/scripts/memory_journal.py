@@ -0,0 +1,358 @@
+"""
+Append-only operation journal for memory stores.
+
+Each store file (facts.json, preferences.json, experiences.json) may have a
+JSON Lines journal next to it (facts.journal.jsonl, ...). Every mutation
+appends one line, so the write cost does not depend on the store size.
+Readers load the last snapshot and replay the journal on top of it;
+compaction folds the journal into a new snapshot.
+
+Journal line format:
+    {"op": "add", "id": "mem_...", "record": {...}}
+    {"op": "update", "id": "mem_...", "fields": {...}}
+    {"op": "deprecate", "id": "mem_...", "fields": {"status": "deprecated", ...}}
+    {"op": "delete", "id": "mem_..."}
+
+All operations are idempotent, so replaying a journal that was already
+folded into the snapshot (e.g. after a crash during compaction) is safe.
+
+Snapshots are pretty-printed JSON objects (facts.json) or JSON Lines with
+an offset index (facts.jsonl, see memory_jsonl); the format is chosen by
+the store path's suffix. For JSONL stores, iter_store() and read_record()
+overlay the journal without loading the whole snapshot.
+
+Access tracking (access_count / last_accessed) is written behind to a
+separate access log (facts.access.jsonl) holding update operations in the
+same format. It is replayed after the journal and folded into the journal
+in bulk, so recalling memories does not touch the journal or metadata.
+
+Operations built with make_op() carry the epoch fields of the timestamps
+they set (ts_epoch, last_accessed_epoch, ... see memory_schema), so every
+mutation keeps them in step with the ISO strings.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+
+import memory_jsonl
+from memory_schema import with_epochs
+from memory_lock import temp_path
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+ACCESS_SUFFIX = ".access.jsonl"
+
+# Fold the journal into the snapshot once it grows past this size
+DEFAULT_COMPACT_BYTES = 256 * 1024
+
+# Fold the access log into the journal once it grows past this size or its
+# oldest update is older than this many seconds
+DEFAULT_ACCESS_FLUSH_BYTES = 32 * 1024
+DEFAULT_ACCESS_FLUSH_SECONDS = 15 * 60
+
+OP_ADD = "add"
+OP_UPDATE = "update"
+OP_DEPRECATE = "deprecate"
+OP_DELETE = "delete"
+
+
+def journal_path(store_path: Path) -> Path:
+    """Get the journal path for a store file (facts.json -> facts.journal.jsonl)."""
+    store_path = Path(store_path)
+    return store_path.with_name(store_path.stem + JOURNAL_SUFFIX)
+
+
+def access_log_path(store_path: Path) -> Path:
+    """Get the access log path for a store file (facts.json -> facts.access.jsonl)."""
+    store_path = Path(store_path)
+    return store_path.with_name(store_path.stem + ACCESS_SUFFIX)
+
+
+def make_op(
+    op: str,
+    memory_id: str,
+    record: Optional[Dict] = None,
+    fields: Optional[Dict[str, Any]] = None,
+) -> Dict:
+    """Build a journal operation; timestamps set by it also get their epoch fields."""
+    entry: Dict[str, Any] = {"op": op, "id": memory_id}
+    if record is not None:
+        entry["record"] = with_epochs(record)
+    if fields is not None:
+        entry["fields"] = with_epochs(fields)
+    return entry
+
+
+def _append_lines(path: Path, ops: List[Dict]):
+    if not ops:
+        return
+    lines = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def append_ops(store_path: Path, ops: List[Dict]):
+    """Append operations to the store's journal in a single write."""
+    _append_lines(journal_path(store_path), ops)
+
+
+def append_access(store_path: Path, ops: List[Dict]):
+    """Append access updates to the store's access log in a single write."""
+    _append_lines(access_log_path(store_path), ops)
+
+
+def read_ops(store_path: Path) -> List[Dict]:
+    """
+    Read all journal operations.
+
+    A torn last line (process killed mid-append) is skipped.
+    """
+    return _read_lines(journal_path(store_path))
+
+
+def read_ops_from(store_path: Path, offset: int) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Read the journal operations appended after a byte offset.
+
+    Only complete lines are consumed, so a line still being written is
+    read on the next call.
+
+    Returns:
+        (ops, offset after the last complete line); the offset is None if
+        the journal is shorter than offset (it was compacted meanwhile)
+    """
+    try:
+        with open(journal_path(store_path), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < offset:
+                return [], None
+            f.seek(offset)
+            raw = f.read()
+    except FileNotFoundError:
+        return [], (0 if offset == 0 else None)
+
+    end = raw.rfind(b"\n") + 1
+    ops = []
+    for line in raw[:end].decode("utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            ops.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return ops, offset + end
+
+
+def read_access(store_path: Path) -> List[Dict]:
+    """Read all pending access updates (torn lines are skipped)."""
+    return _read_lines(access_log_path(store_path))
+
+
+def _read_lines(path: Path) -> List[Dict]:
+    ops = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ops.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return ops
+
+
+def apply_op(data: Dict[str, Dict], op: Dict):
+    """Apply a single journal operation to a store dict in place."""
+    kind = op.get("op")
+    memory_id = op.get("id")
+
+    if kind == OP_ADD:
+        data[memory_id] = op["record"]
+    elif kind in (OP_UPDATE, OP_DEPRECATE):
+        if memory_id in data:
+            data[memory_id].update(op.get("fields", {}))
+    elif kind == OP_DELETE:
+        data.pop(memory_id, None)
+
+
+def replay(data: Dict[str, Dict], ops: List[Dict]) -> Dict[str, Dict]:
+    """Apply journal operations on top of a snapshot dict."""
+    for op in ops:
+        apply_op(data, op)
+    return data
+
+
+def load_snapshot(store_path: Path) -> Dict[str, Dict]:
+    """Load the snapshot file only (without the journal)."""
+    if memory_jsonl.is_jsonl(store_path):
+        return memory_jsonl.load_snapshot(store_path)
+    try:
+        with open(store_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_store(store_path: Path) -> Dict[str, Dict]:
+    """
+    Load a store as seen by MemoryManager: snapshot plus journal.
+
+    Scripts that read facts.json/preferences.json/experiences.json directly
+    should use this instead of json.load so they see unfolded writes.
+    """
+    data = replay(load_snapshot(store_path), read_ops(store_path))
+    return replay(data, read_access(store_path))
+
+
+def ops_by_id(store_path: Path) -> Dict[str, List[Tuple[int, Dict]]]:
+    """Journal then access log operations grouped by id, with their position."""
+    grouped: Dict[str, List[Tuple[int, Dict]]] = {}
+    for position, op in enumerate(read_ops(store_path) + read_access(store_path)):
+        grouped.setdefault(op.get("id"), []).append((position, op))
+    return grouped
+
+
+def replay_record(record: Optional[Dict], ops: List[Tuple[int, Dict]]) -> Tuple[Optional[Dict], Optional[int]]:
+    """
+    Apply one id's operations to its snapshot record (None if absent).
+
+    Returns the final record and, if the id was (re-)inserted by an add,
+    the position of that add: a dict moves such keys to the end.
+    """
+    inserted_at = None
+    for position, op in ops:
+        kind = op.get("op")
+        if kind == OP_ADD:
+            if record is None:
+                inserted_at = position
+            record = op["record"]
+        elif kind in (OP_UPDATE, OP_DEPRECATE):
+            if record is not None:
+                record.update(op.get("fields", {}))
+        elif kind == OP_DELETE:
+            record = None
+            inserted_at = None
+    return record, inserted_at
+
+
+def iter_store(store_path: Path) -> Iterator[Dict]:
+    """
+    Stream a store's records (snapshot plus journal) in load_store() order.
+
+    JSONL snapshots are read line by line, so only the journal and the
+    records still to be yielded are held in memory. JSON snapshots have to
+    be parsed whole and are simply iterated.
+    """
+    if not memory_jsonl.is_jsonl(store_path):
+        yield from load_store(store_path).values()
+        return
+
+    pending = ops_by_id(store_path)
+    moved: List[Tuple[int, Dict]] = []
+    for record in memory_jsonl.iter_snapshot(store_path):
+        ops = pending.pop(record["id"], None)
+        if ops is None:
+            yield record
+            continue
+        record, inserted_at = replay_record(record, ops)
+        if record is None:
+            continue
+        if inserted_at is None:
+            yield record
+        else:
+            moved.append((inserted_at, record))
+
+    # Ids added by the journal, in the order they were inserted
+    for ops in pending.values():
+        record, inserted_at = replay_record(None, ops)
+        if record is not None:
+            moved.append((inserted_at, record))
+    moved.sort(key=lambda item: item[0])
+    for _, record in moved:
+        yield record
+
+
+def read_record(store_path: Path, memory_id: str) -> Optional[Dict]:
+    """
+    Read one record as load_store() would see it.
+
+    For JSONL snapshots only that record's line is decoded; the journal and
+    access log are read to apply its pending operations.
+    """
+    if not memory_jsonl.is_jsonl(store_path):
+        return load_store(store_path).get(memory_id)
+
+    ops = ops_by_id(store_path).get(memory_id, [])
+    record, _ = replay_record(memory_jsonl.read_record(store_path, memory_id), ops)
+    return record
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def journal_size(store_path: Path) -> int:
+    """Get the journal size in bytes (0 if there is no journal)."""
+    return _file_size(journal_path(store_path))
+
+
+def access_log_size(store_path: Path) -> int:
+    """Get the access log size in bytes (0 if there is none)."""
+    return _file_size(access_log_path(store_path))
+
+
+def access_log_started(store_path: Path) -> Optional[str]:
+    """Get the last_accessed timestamp of the oldest pending access update."""
+    try:
+        with open(access_log_path(store_path), "r", encoding="utf-8") as f:
+            first = json.loads(f.readline())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return first.get("fields", {}).get("last_accessed")
+
+
+def drop_access_log(store_path: Path):
+    """Remove the access log once its updates were written elsewhere."""
+    try:
+        access_log_path(store_path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def write_snapshot(store_path: Path, data: Dict[str, Dict]):
+    """Atomically write a snapshot (temp file + rename)."""
+    if memory_jsonl.is_jsonl(store_path):
+        memory_jsonl.write_snapshot(store_path, data)
+        return
+    store_path = Path(store_path)
+    tmp_path = temp_path(store_path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, store_path)
+
+
+def compact(store_path: Path, data: Optional[Dict[str, Dict]] = None):
+    """
+    Fold the journal and access log into a new snapshot and remove both.
+
+    Args:
+        store_path: Store snapshot path
+        data: Current store contents; loaded (snapshot + journal) if None
+    """
+    if data is None:
+        data = load_store(store_path)
+    write_snapshot(store_path, data)
+    try:
+        journal_path(store_path).unlink()
+    except FileNotFoundError:
+        pass
+    drop_access_log(store_path)
@@ -0,0 +1,170 @@
+"""
+JSON Lines snapshot format for memory stores.
+
+Instead of one pretty-printed JSON object (facts.json), a store may be kept
+as one record per line (facts.jsonl) plus a sidecar index
+(facts.offsets.json) mapping each id to the byte offset and length of its
+line:
+
+    {
+        "version": 1,
+        "snapshot": [mtime_ns, size],
+        "offsets": {"mem_...": [offset, length], ...}
+    }
+
+A single record is then read with one seek, and whole-store scans can
+stream records instead of building the id -> record dict. The sidecar is
+stamped with the snapshot's signature and rebuilt from the lines whenever
+it does not match.
+
+Only the snapshot format changes: the journal, access log, index and core
+view files are shared with the JSON format (they are named after the
+store's stem), and memory_journal picks the reader/writer by file suffix.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from memory_lock import temp_path
+
+JSONL_SUFFIX = ".jsonl"
+OFFSETS_SUFFIX = ".offsets.json"
+OFFSETS_VERSION = 1
+
+# Offset indexes already read: store path -> (snapshot signature, offsets)
+_offsets_cache: Dict[Path, Tuple[Tuple[int, int], Dict[str, Tuple[int, int]]]] = {}
+
+
+def is_jsonl(store_path: Path) -> bool:
+    """Whether a store snapshot uses the JSON Lines format."""
+    return Path(store_path).suffix == JSONL_SUFFIX
+
+
+def offsets_path(store_path: Path) -> Path:
+    """Get the offset index path for a store file (facts.jsonl -> facts.offsets.json)."""
+    store_path = Path(store_path)
+    return store_path.with_name(store_path.stem + OFFSETS_SUFFIX)
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _decode(line: bytes) -> Optional[Dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def write_snapshot(store_path: Path, data: Dict[str, Dict]):
+    """Atomically write a JSONL snapshot and its offset index."""
+    store_path = Path(store_path)
+    tmp_path = temp_path(store_path)
+    offsets: Dict[str, Tuple[int, int]] = {}
+    position = 0
+    with open(tmp_path, "wb") as f:
+        for memory_id, record in data.items():
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            offsets[memory_id] = (position, len(line))
+            position += len(line)
+    os.replace(tmp_path, store_path)
+    _save_offsets(store_path, offsets)
+
+
+def _save_offsets(store_path: Path, offsets: Dict[str, Tuple[int, int]]):
+    path = offsets_path(store_path)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": OFFSETS_VERSION,
+            "snapshot": list(_signature(store_path) or ()),
+            "offsets": offsets,
+        }, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def iter_lines(store_path: Path) -> Iterator[Tuple[int, int, Dict]]:
+    """Yield (offset, length, record) for every line of a JSONL snapshot."""
+    position = 0
+    try:
+        with open(store_path, "rb") as f:
+            for line in f:
+                record = _decode(line)
+                if record is not None:
+                    yield position, len(line), record
+                position += len(line)
+    except FileNotFoundError:
+        return
+
+
+def iter_snapshot(store_path: Path) -> Iterator[Dict]:
+    """Stream the records of a JSONL snapshot in store order."""
+    for _, _, record in iter_lines(store_path):
+        yield record
+
+
+def load_snapshot(store_path: Path) -> Dict[str, Dict]:
+    """Load a JSONL snapshot as an id -> record dict."""
+    return {record["id"]: record for record in iter_snapshot(store_path)}
+
+
+def load_offsets(store_path: Path) -> Dict[str, Tuple[int, int]]:
+    """
+    Get the id -> (offset, length) index of a snapshot.
+
+    The sidecar is used if it was written for the current snapshot;
+    otherwise the index is rebuilt from the lines and saved again.
+    """
+    store_path = Path(store_path)
+    signature = _signature(store_path)
+    if signature is None:
+        return {}
+
+    cached = _offsets_cache.get(store_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    offsets = None
+    try:
+        with open(offsets_path(store_path), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("version") == OFFSETS_VERSION and tuple(saved.get("snapshot", ())) == signature:
+            offsets = saved["offsets"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    if offsets is None:
+        offsets = {record["id"]: (offset, length) for offset, length, record in iter_lines(store_path)}
+        if _signature(store_path) != signature:
+            return offsets
+        _save_offsets(store_path, offsets)
+
+    _offsets_cache[store_path] = (signature, offsets)
+    return offsets
+
+
+def read_record(store_path: Path, memory_id: str) -> Optional[Dict]:
+    """Read one record of a snapshot with a single seek (None if absent)."""
+    entry = load_offsets(store_path).get(memory_id)
+    if entry is None:
+        return None
+
+    offset, length = entry
+    try:
+        with open(store_path, "rb") as f:
+            f.seek(offset)
+            record = _decode(f.read(length))
+    except FileNotFoundError:
+        return None
+    return record if record is not None and record.get("id") == memory_id else None
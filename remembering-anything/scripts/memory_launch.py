@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Launcher for the memory fork server (opt-in).
+
+    python scripts/memory_launch.py memory_staging add --type fact --content "..."
+
+does the same as `python scripts/memory_staging.py add ...`. When
+memory_forkserver is running, the command runs in a child forked from it
+with the memory modules already imported: argv, the working directory,
+the environment and stdin/stdout/stderr (as file descriptors) are handed
+over, output appears directly and the exit code is the command's. Ctrl-C
+is passed on to the child. Without a fork server the script is run
+directly.
+
+Kept tiny on purpose: it imports nothing beyond os, sys and _socket
+(`import socket` alone costs about as much as starting the interpreter).
+Request format: see memory_forkserver.
+"""
+
+import os
+import sys
+import _socket
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_FILE = os.path.join(os.path.dirname(SCRIPT_DIR), "user-data", "memory", ".forkserver.sock")
+# memory_forkserver.SCRIPTS
+SCRIPTS = ("activate", "memory_cli", "memory_staging")
+STDIO_FDS = (0, 1, 2)
+
+
+def _connect():
+    if not hasattr(_socket, "AF_UNIX") or not os.path.exists(SOCKET_FILE):
+        return None
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET_FILE)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _request(sock, script, argv):
+    """Send the request; returns the raw reply, or None if it could not be sent."""
+    fields = [b"run"] + [os.fsencode(value) for value in (
+        script, os.getcwd(), sys.stdout.encoding, sys.stdout.errors, str(len(argv)), *argv)]
+    fields += [key + b"=" + value for key, value in os.environb.items()]
+    payload = b"\0".join(fields)
+    fds = b"".join(fd.to_bytes(4, sys.byteorder) for fd in STDIO_FDS)
+    try:
+        sent = sock.sendmsg([payload], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+        sock.sendall(payload[sent:])
+        sock.shutdown(_socket.SHUT_WR)
+    except OSError:
+        return None
+
+    # "<child pid>\n<exit code>\n"
+    reply = b""
+    while True:
+        try:
+            chunk = sock.recv(64)
+        except KeyboardInterrupt:
+            if b"\n" not in reply:
+                raise
+            import signal
+            os.kill(int(reply.split(b"\n")[0]), signal.SIGINT)
+            continue
+        if not chunk:
+            break
+        reply += chunk
+    return reply
+
+
+def launch(script, argv):
+    """Run the command in the fork server; returns its exit code, or None if no server took it."""
+    sock = _connect()
+    if sock is None:
+        return None
+    try:
+        reply = _request(sock, script, argv)
+    finally:
+        sock.close()
+    if reply is None:
+        return None
+
+    lines = reply.split(b"\n")
+    if len(lines) < 3:
+        sys.stderr.write("[!] memory fork server: the command did not finish\n")
+        return 1
+    return int(lines[1])
+
+
+def run_directly(script, argv):
+    """Run the script in a fresh interpreter (replacing this process where possible)."""
+    args = [sys.executable, os.path.join(SCRIPT_DIR, script + ".py")] + argv
+    if os.name == "nt":
+        import subprocess
+        return subprocess.call(args)
+    os.execv(sys.executable, args)
+
+
+def main():
+    script = sys.argv[1].removesuffix(".py") if len(sys.argv) > 1 else None
+    if script not in SCRIPTS:
+        sys.stderr.write(f"usage: memory_launch.py {{{','.join(SCRIPTS)}}} [args ...]\n")
+        return 2
+    argv = sys.argv[2:]
+    exit_code = launch(script, argv)
+    if exit_code is None:
+        return run_directly(script, argv)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
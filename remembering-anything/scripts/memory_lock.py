@@ -0,0 +1,158 @@
+"""
+Cross-process locking for memory files.
+
+Several sessions may read and write the same memory directory at once.
+Every shared file (a store, the staging area, a project file, the shard
+manifest) gets a lock file next to it (facts.json -> facts.lock) that is
+locked with fcntl.flock: any number of readers hold it shared, a writer
+holds it exclusive.
+
+The lock file also holds the file's generation counter, a little-endian
+uint64 at offset 0 that every writer increments while it holds the
+exclusive lock. Writers are optimistic: they read (remembering the
+generation), compute their change without holding a lock, then take the
+exclusive lock and compare generations. If another process wrote in
+between, the writer re-reads and applies its own change again on top of
+the new contents instead of overwriting them.
+
+Without fcntl (Windows) the locks are no-ops; the generation counter is
+still kept, so a single process behaves the same.
+
+Temporary files of atomic writes are named per process and thread
+(temp_path), so concurrent writers never share one.
+"""
+
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - exercised on Windows
+    fcntl = None
+
+LOCK_SUFFIX = ".lock"
+
+_GENERATION = struct.Struct("<Q")
+
+SHARED = "shared"
+EXCLUSIVE = "exclusive"
+
+
+def lock_path(path: Path) -> Path:
+    """Lock file of a file (facts.json / facts.jsonl -> facts.lock)."""
+    path = Path(path)
+    return path.with_name(path.stem + LOCK_SUFFIX)
+
+
+def temp_path(path: Path) -> Path:
+    """Temporary sibling for an atomic write, unique per process and thread."""
+    path = Path(path)
+    return path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+
+def _flock(fd: int, mode: str):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if mode == EXCLUSIVE else fcntl.LOCK_SH)
+
+
+class StoreLock:
+    """
+    Reader/writer lock and generation counter of one file.
+
+    Holds nest: a shared request inside an exclusive hold is covered by
+    it, and an exclusive request inside a shared hold upgrades the lock
+    until it ends. The lock file is only open while the lock is held.
+    An instance must not be shared between threads.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: The lock file (see lock_path)
+        """
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+        self._modes: List[str] = []
+
+    @property
+    def held(self) -> Optional[str]:
+        """Mode currently held (SHARED, EXCLUSIVE or None)."""
+        return self._modes[-1] if self._modes else None
+
+    @contextmanager
+    def shared(self) -> Iterator["StoreLock"]:
+        """Hold the lock shared (or keep the stronger lock already held)."""
+        with self._hold(SHARED):
+            yield self
+
+    @contextmanager
+    def exclusive(self) -> Iterator["StoreLock"]:
+        """Hold the lock exclusive."""
+        with self._hold(EXCLUSIVE):
+            yield self
+
+    @contextmanager
+    def _hold(self, mode: str) -> Iterator[None]:
+        previous = self.held
+        if previous == EXCLUSIVE or previous == mode:
+            self._modes.append(previous)
+            try:
+                yield
+            finally:
+                self._modes.pop()
+            return
+
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _flock(self._fd, mode)
+        except BaseException:
+            self._release(previous)
+            raise
+        self._modes.append(mode)
+        try:
+            yield
+        finally:
+            self._modes.pop()
+            self._release(previous)
+
+    def _release(self, previous: Optional[str]):
+        if previous is None:
+            # Closing the only descriptor drops the flock
+            os.close(self._fd)
+            self._fd = None
+        else:
+            _flock(self._fd, previous)
+
+    def generation(self) -> int:
+        """Current generation (0 for a file that was never written under the lock)."""
+        if self._fd is not None:
+            return self._read_generation(self._fd)
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            return self._read_generation(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _read_generation(fd: int) -> int:
+        os.lseek(fd, 0, os.SEEK_SET)
+        raw = os.read(fd, _GENERATION.size)
+        return _GENERATION.unpack(raw)[0] if len(raw) == _GENERATION.size else 0
+
+    def bump(self) -> int:
+        """Increment the generation after a write; requires the exclusive lock."""
+        if self.held != EXCLUSIVE:
+            raise RuntimeError(f"{self.path.name} is not locked exclusive")
+        generation = self._read_generation(self._fd) + 1
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _GENERATION.pack(generation))
+        return generation
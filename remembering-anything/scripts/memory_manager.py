@@ -6,8 +6,10 @@ Handles structured memory operations: add, update, delete, query, and conflict d
 
 import json
 import os
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
 from memory_schema import (
@@ -19,18 +21,58 @@ from memory_schema import (
     create_memory_id,
     get_current_timestamp,
     validate_memory,
+    to_epoch_micros,
+    record_epoch,
+    copy_record,
+)
+import memory_journal
+from memory_journal import OP_ADD, OP_UPDATE, OP_DEPRECATE, OP_DELETE, make_op
+from memory_storage import MEMORY_TYPES, MemoryStorage, create_storage
+from memory_lock import StoreLock, lock_path
+from memory_index import PROMOTE_ACCESS_COUNT, DEFAULT_SIMILARITY_THRESHOLD
+from memory_conflicts import (
+    CONFLICTS_FILE, DEFAULT_SINGLE_VALUE_CATEGORIES,
+    conflict_id, build_conflict, load_conflicts, save_conflicts,
 )
 
 
 class MemoryManager:
-    """Manage structured memories with versioning and conflict detection."""
+    """
+    Manage structured memories with versioning and conflict detection.
+
+    Memories returned by the query methods are copies of the storage's
+    cached records, so callers may change them without touching the store.
+    """
 
-    def __init__(self, memory_dir: Optional[str] = None):
+    def __init__(
+        self,
+        memory_dir: Optional[str] = None,
+        journal: bool = True,
+        journal_threshold: int = memory_journal.DEFAULT_COMPACT_BYTES,
+        backend: Optional[str] = None,
+        single_value_categories: Optional[List[str]] = None,
+        similarity_threshold: Optional[float] = DEFAULT_SIMILARITY_THRESHOLD,
+        merge_similar: bool = False,
+    ):
         """
         Initialize memory manager.
 
         Args:
             memory_dir: Path to memory directory. If None, uses global path.
+            journal: Record mutations in an append-only journal instead of
+                rewriting the whole store file on every change (JSON backend)
+            journal_threshold: Journal size in bytes that triggers compaction
+            backend: Storage backend ("json" or "sqlite"). If None, uses the
+                "backend" setting in metadata.json (default "json").
+            single_value_categories: Fact categories that may hold only one
+                active fact. If None, uses the list saved in conflicts.json
+                (default location, occupation, current_city, current_company).
+            similarity_threshold: Similarity (0.0-1.0, see find_similar) at
+                which add_* reports an existing memory of the same category
+                as a near duplicate in last_similar. None disables the check.
+            merge_similar: Instead of adding a near duplicate, merge its tags
+                and context tags into the most similar existing memory and
+                return that memory's ID
         """
         if memory_dir is None:
             # scripts -> remembering-anything
@@ -40,44 +82,68 @@ class MemoryManager:
         self.memory_dir = Path(memory_dir)
         self.memory_dir.mkdir(parents=True, exist_ok=True)
 
-        self.facts_file = self.memory_dir / "facts.json"
-        self.preferences_file = self.memory_dir / "preferences.json"
-        self.experiences_file = self.memory_dir / "experiences.json"
-        self.metadata_file = self.memory_dir / "metadata.json"
-
-        self._ensure_files()
-
-    def _ensure_files(self):
-        """Ensure all memory files exist."""
-        for file_path in [self.facts_file, self.preferences_file, self.experiences_file]:
-            if not file_path.exists():
-                self._save_json(file_path, {})
-
-        if not self.metadata_file.exists():
-            self._save_json(self.metadata_file, {
-                "created": get_current_timestamp(),
-                "last_updated": get_current_timestamp(),
-                "version": "1.0"
-            })
-
-    def _load_json(self, file_path: Path) -> Dict:
-        """Load JSON file."""
+        self.storage: MemoryStorage = create_storage(
+            self.memory_dir, backend, journal=journal, journal_threshold=journal_threshold
+        )
+
+        # Conflict reports are kept up to date on every fact write
+        self.conflicts_file = self.memory_dir / CONFLICTS_FILE
+        self._conflicts_lock = StoreLock(lock_path(self.conflicts_file))
+        self._single_value_categories = (
+            list(single_value_categories) if single_value_categories is not None else None
+        )
+        self._touched_categories: set = set()
+        self._batch_depth = 0
+
+        self.similarity_threshold = similarity_threshold
+        self.merge_similar = merge_similar
+        # Near duplicates found by the last add_* call (see find_similar)
+        self.last_similar: List[Dict[str, Any]] = []
+        # Cursor of the page after the last get_active_* call (None if it was the last page)
+        self.next_cursor: Optional[str] = None
+
+    @contextmanager
+    def batch(self):
+        """
+        Group mutations into a single unit of work.
+
+        With the JSON backend every save inside the block is buffered in
+        memory; on exit each dirty store file is written once and metadata
+        is updated once. With SQLite the block is one transaction. If the
+        block raises, buffered changes are discarded. Batches may be nested;
+        only the outermost one writes.
+
+        Yields:
+            Stats dict filled in on exit: saves (buffered save calls), writes
+            (files actually written) and files (names of written files)
+
+        Example:
+            with mm.batch() as stats:
+                for item in items:
+                    mm.add_fact(...)
+            print(stats["saves"], stats["writes"])
+        """
+        self._batch_depth += 1
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def _save_json(self, file_path: Path, data: Dict):
-        """Save JSON file."""
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-
-        # Update metadata
-        metadata = self._load_json(self.metadata_file)
-        metadata["last_updated"] = get_current_timestamp()
-        if file_path != self.metadata_file:
-            self._save_json(self.metadata_file, metadata)
+            with self.storage.batch() as stats:
+                yield stats
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._touched_categories.clear()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self._refresh_conflicts()
+
+    @property
+    def last_batch_stats(self) -> Optional[Dict[str, Any]]:
+        """Stats of the most recently completed batch."""
+        return getattr(self.storage, "last_batch_stats", None)
+
+    def close(self):
+        """Release storage resources (database connections)."""
+        self.storage.close()
 
     # ========== Add Operations ==========
 
@@ -107,17 +173,20 @@ class MemoryManager:
             context_tags: Context trigger tags (e.g., ["coding", "work"])
 
         Returns:
-            Memory ID (or existing memory ID if duplicate found)
+            Memory ID (or existing memory ID if duplicate found, or near
+            duplicate merged)
         """
-        facts = self._load_json(self.facts_file)
-
         # Check for duplicate content
-        for existing_id, existing_fact in facts.items():
-            if (existing_fact["status"] == "active" and
-                existing_fact["content"].strip().lower() == content.strip().lower() and
-                existing_fact["category"] == category):
-                # Found duplicate, return existing ID
-                return existing_id
+        self.last_similar = []
+        existing_id = self.storage.find_duplicate("fact", content, category)
+        if existing_id:
+            # Found duplicate, return existing ID
+            return existing_id
+
+        # Report reworded repeats, or merge into the closest one
+        merged_id = self._check_similar("fact", content, category, tags, context_tags)
+        if merged_id:
+            return merged_id
 
         memory_id = create_memory_id()
         timestamp = get_current_timestamp()
@@ -141,8 +210,8 @@ class MemoryManager:
             "attachments": attachments,
         }
 
-        facts[memory_id] = fact
-        self._save_json(self.facts_file, facts)
+        self.storage.apply("fact", [make_op(OP_ADD, memory_id, record=fact)])
+        self._touch_categories(category)
 
         # Deprecate old fact if specified
         if supersedes:
@@ -176,17 +245,20 @@ class MemoryManager:
             context_tags: Context trigger tags (e.g., ["coding", "work"])
 
         Returns:
-            Memory ID (or existing memory ID if duplicate found)
+            Memory ID (or existing memory ID if duplicate found, or near
+            duplicate merged)
         """
-        preferences = self._load_json(self.preferences_file)
-
         # Check for duplicate content
-        for existing_id, existing_pref in preferences.items():
-            if (existing_pref["status"] == "active" and
-                existing_pref["content"].strip().lower() == content.strip().lower() and
-                existing_pref["category"] == category):
-                # Found duplicate, return existing ID
-                return existing_id
+        self.last_similar = []
+        existing_id = self.storage.find_duplicate("preference", content, category)
+        if existing_id:
+            # Found duplicate, return existing ID
+            return existing_id
+
+        # Report reworded repeats, or merge into the closest one
+        merged_id = self._check_similar("preference", content, category, tags, context_tags)
+        if merged_id:
+            return merged_id
 
         memory_id = create_memory_id()
         timestamp = get_current_timestamp()
@@ -210,8 +282,7 @@ class MemoryManager:
             "attachments": attachments,
         }
 
-        preferences[memory_id] = preference
-        self._save_json(self.preferences_file, preferences)
+        self.storage.apply("preference", [make_op(OP_ADD, memory_id, record=preference)])
 
         return memory_id
 
@@ -243,17 +314,20 @@ class MemoryManager:
             context_tags: Context trigger tags (e.g., ["coding", "work"])
 
         Returns:
-            Memory ID (or existing memory ID if duplicate found)
+            Memory ID (or existing memory ID if duplicate found, or near
+            duplicate merged)
         """
-        experiences = self._load_json(self.experiences_file)
-
         # Check for duplicate content
-        for existing_id, existing_exp in experiences.items():
-            if (existing_exp["status"] == "active" and
-                existing_exp["content"].strip().lower() == content.strip().lower() and
-                existing_exp["category"] == category):
-                # Found duplicate, return existing ID
-                return existing_id
+        self.last_similar = []
+        existing_id = self.storage.find_duplicate("experience", content, category)
+        if existing_id:
+            # Found duplicate, return existing ID
+            return existing_id
+
+        # Report reworded repeats, or merge into the closest one
+        merged_id = self._check_similar("experience", content, category, tags, context_tags)
+        if merged_id:
+            return merged_id
 
         memory_id = create_memory_id()
         timestamp = get_current_timestamp()
@@ -278,151 +352,321 @@ class MemoryManager:
             "attachments": attachments,
         }
 
-        experiences[memory_id] = experience
-        self._save_json(self.experiences_file, experiences)
+        self.storage.apply("experience", [make_op(OP_ADD, memory_id, record=experience)])
 
         return memory_id
 
+    def _check_similar(
+        self,
+        memory_type: str,
+        content: str,
+        category: str,
+        tags: Optional[List[str]],
+        context_tags: Optional[List[str]],
+    ) -> Optional[str]:
+        """
+        Record near duplicates of a new memory in last_similar.
+
+        Returns:
+            ID of the memory the new one was merged into (merge_similar),
+            or None if it should be added
+        """
+        if self.similarity_threshold is None:
+            return None
+
+        self.last_similar = self.find_similar(memory_type, content, category, self.similarity_threshold)
+        if not self.last_similar or not self.merge_similar:
+            return None
+
+        target_id = self.last_similar[0]["id"]
+        ops = self._merge_tag_ops(memory_type, target_id, tags, context_tags)
+        if ops:
+            # Rebuilt from the newer record if another session changed its tags meanwhile
+            rebuild = partial(self._merge_tag_ops, memory_type, target_id, tags, context_tags)
+            self.storage.apply(memory_type, ops, rebuild)
+        return target_id
+
+    def _merge_tag_ops(
+        self,
+        memory_type: str,
+        memory_id: str,
+        tags: Optional[List[str]],
+        context_tags: Optional[List[str]],
+    ) -> List[Dict]:
+        """Ops adding tags to a stored memory (none if it already has them)."""
+        target = self.storage.get(memory_type, memory_id)
+        if target is None:
+            return []
+        changed = {
+            "tags": list(dict.fromkeys((target.get("tags") or []) + (tags or []))),
+            "context_tags": list(dict.fromkeys((target.get("context_tags") or []) + (context_tags or []))),
+        }
+        changed = {key: value for key, value in changed.items() if value != (target.get(key) or [])}
+        if not changed:
+            return []
+        changed["last_updated"] = get_current_timestamp()
+        return [make_op(OP_UPDATE, memory_id, fields=changed)]
+
     # ========== Query Operations ==========
 
     def get_memory(self, memory_id: str, memory_type: str) -> Optional[Dict]:
         """Get a specific memory by ID."""
-        file_map = {
-            "fact": self.facts_file,
-            "preference": self.preferences_file,
-            "experience": self.experiences_file,
-        }
+        if memory_type not in MEMORY_TYPES:
+            return None
 
-        if memory_type not in file_map:
+        memory = self.storage.get(memory_type, memory_id)
+        return copy_record(memory) if memory is not None else None
+
+    def find_duplicate(self, memory_type: str, content: str, category: str) -> Optional[str]:
+        """
+        Get the id of an active memory that add_* would treat as a duplicate.
+
+        Args:
+            memory_type: fact, preference or experience
+            content: Memory content (compared stripped and lowercased)
+            category: Memory category
+
+        Returns:
+            Existing memory ID, or None if adding would create a new memory
+        """
+        if memory_type not in MEMORY_TYPES:
             return None
 
-        memories = self._load_json(file_map[memory_type])
-        return memories.get(memory_id)
+        return self.storage.find_duplicate(memory_type, content, category)
 
-    def get_active_facts(self, category: Optional[str] = None) -> List[FactMemory]:
-        """Get all active facts, optionally filtered by category."""
-        facts = self._load_json(self.facts_file)
-        active = [f for f in facts.values() if f["status"] == "active"]
+    def find_similar(
+        self,
+        memory_type: str,
+        content: str,
+        category: str,
+        threshold: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Find active memories of a category whose content is close to content.
 
-        if category:
-            active = [f for f in active if f["category"] == category]
+        Similarity is the Jaccard similarity of character shingles after
+        dropping case, whitespace and punctuation ("住在北京" vs
+        "现在住在北京" scores 0.7). The JSON backend only verifies the
+        memories sharing a MinHash LSH bucket with content, so lookups do
+        not scan the category.
 
-        # Sort by timestamp (newest first)
-        active.sort(key=lambda x: x["timestamp"], reverse=True)
-        return active
+        Args:
+            memory_type: fact, preference or experience
+            content: Memory content
+            category: Memory category
+            threshold: Minimum similarity (default similarity_threshold,
+                or DEFAULT_SIMILARITY_THRESHOLD if that is None)
 
-    def get_active_preferences(self, category: Optional[str] = None) -> List[PreferenceMemory]:
-        """Get all active preferences, optionally filtered by category."""
-        prefs = self._load_json(self.preferences_file)
-        active = [p for p in prefs.values() if p["status"] == "active"]
+        Returns:
+            List of {"id", "content", "similarity"}, most similar first
+        """
+        if memory_type not in MEMORY_TYPES:
+            return []
+        if threshold is None:
+            threshold = (self.similarity_threshold if self.similarity_threshold is not None
+                         else DEFAULT_SIMILARITY_THRESHOLD)
 
-        if category:
-            active = [p for p in active if p["category"] == category]
+        results = []
+        for memory_id, similarity in self.storage.find_similar(memory_type, content, category, threshold):
+            memory = self.storage.get(memory_type, memory_id)
+            results.append({"id": memory_id, "content": memory["content"], "similarity": round(similarity, 3)})
+        return results
 
-        active.sort(key=lambda x: x["timestamp"], reverse=True)
-        return active
+    def _active_page(
+        self,
+        memory_type: str,
+        category: Optional[str],
+        limit: Optional[int],
+        cursor: Optional[str],
+        since: Optional[str],
+        until: Optional[str],
+    ) -> List[Dict]:
+        records, self.next_cursor = self.storage.page(
+            memory_type, limit, cursor, since, until, category=category or None)
+        return [copy_record(memory) for memory in records]
+
+    def get_active_facts(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[FactMemory]:
+        """
+        Get active facts, newest first by timestamp, optionally filtered by category.
+
+        Args:
+            category: Only this category
+            limit: Page size (all if None); the cursor of the next page is
+                left in next_cursor (None after the last page)
+            cursor: next_cursor of the previous page
+            since: Only facts created at or after this ISO time
+            until: Only facts created before this ISO time
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        return self._active_page("fact", category, limit, cursor, since, until)
 
-    def get_active_experiences(self, category: Optional[str] = None) -> List[ExperienceMemory]:
-        """Get all active experiences, optionally filtered by category."""
-        exps = self._load_json(self.experiences_file)
-        active = [e for e in exps.values() if e["status"] == "active"]
+    def get_active_preferences(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[PreferenceMemory]:
+        """Get active preferences, newest first; paging as in get_active_facts()."""
+        return self._active_page("preference", category, limit, cursor, since, until)
+
+    def get_active_experiences(
+        self,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[ExperienceMemory]:
+        """Get active experiences, newest first; paging as in get_active_facts()."""
+        return self._active_page("experience", category, limit, cursor, since, until)
+
+    def get_recent_memories(
+        self,
+        memory_type: str,
+        limit: Optional[int] = 10,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Get the newest active memories of a type.
 
-        if category:
-            active = [e for e in active if e["category"] == category]
+        With month-sharded stores only the shards that can hold a result
+        are read.
 
-        active.sort(key=lambda x: x["timestamp"], reverse=True)
-        return active
+        Args:
+            memory_type: fact, preference or experience
+            limit: Maximum number of memories (all if None)
+            since: Only memories created at or after this ISO time
+            until: Only memories created before this ISO time
 
-    def search_memories(self, query: str, memory_type: Optional[str] = None) -> List[Dict]:
+        Returns:
+            Memories, newest first
+        """
+        if memory_type not in MEMORY_TYPES:
+            return []
+
+        return [copy_record(memory) for memory in self.storage.recent(memory_type, limit, since, until)]
+
+    def search_memories(
+        self,
+        query: str,
+        memory_type: Optional[str] = None,
+        rank: Optional[str] = None,
+        top_k: Optional[int] = None,
+    ) -> List[Dict]:
         """
         Search memories by content.
 
         Args:
             query: Search query
             memory_type: Optional filter by type (fact, preference, experience)
+            rank: None for substring matches in store order, or "bm25" to
+                rank memories sharing character n-grams with the query
+                (content and tags) by BM25
+            top_k: Maximum number of results (all if None)
 
         Returns:
-            List of matching memories
+            List of matching memories; with rank="bm25", copies carrying a
+            "score" key, best first
         """
-        results = []
-        query_lower = query.lower()
-
-        file_map = {
-            "fact": self.facts_file,
-            "preference": self.preferences_file,
-            "experience": self.experiences_file,
-        }
+        types_to_search = [memory_type] if memory_type else list(MEMORY_TYPES)
+        if any(t not in MEMORY_TYPES for t in types_to_search):
+            raise KeyError(memory_type)
+
+        if rank == "bm25":
+            ranked = self.storage.search_ranked(query, types_to_search, top_k)
+            return [dict(copy_record(memory), score=round(score, 4)) for memory, score in ranked]
+        if rank is not None:
+            raise ValueError(f"Unknown rank mode: {rank}")
+
+        results = self.storage.search(query, types_to_search)
+        if top_k is not None:
+            results = results[:max(top_k, 0)]
+        return [copy_record(memory) for memory in results]
+
+    def semantic_search(self, query: str, k: int = 5, memory_type: Optional[str] = None) -> List[Dict]:
+        """
+        Find memories related to query without an embedding service.
 
-        types_to_search = [memory_type] if memory_type else list(file_map.keys())
+        Content is embedded as hashed character n-gram TF-IDF vectors (see
+        memory_vectors) and ranked by cosine similarity, so memories that
+        share rare characters or words with the query are found even when
+        they are worded differently ("我养的猫" finds "意外是一只黑猫").
+        The JSON backend keeps the vectors in an index updated on every
+        write; large stores are searched through a clustered (IVF) index.
 
-        for mem_type in types_to_search:
-            memories = self._load_json(file_map[mem_type])
-            for memory in memories.values():
-                if memory["status"] != "active":
-                    continue
+        Args:
+            query: Search text
+            k: Number of results
+            memory_type: Optional filter by type (fact, preference, experience)
 
-                # Search in content and tags
-                if (query_lower in memory["content"].lower() or
-                    any(query_lower in tag.lower() for tag in memory.get("tags", []))):
-                    results.append(memory)
+        Returns:
+            Copies of the memories with a "similarity" key, most similar first
+        """
+        types_to_search = [memory_type] if memory_type else list(MEMORY_TYPES)
+        if any(t not in MEMORY_TYPES for t in types_to_search):
+            raise KeyError(memory_type)
 
-        return results
+        return [dict(copy_record(memory), similarity=round(score, 4))
+                for memory, score in self.storage.semantic_search(query, types_to_search, k)]
 
     # ========== Update Operations ==========
 
     def update_fact(self, memory_id: str, **updates) -> bool:
         """Update a fact memory."""
-        facts = self._load_json(self.facts_file)
+        fact = self.storage.get("fact", memory_id)
 
-        if memory_id not in facts:
+        if fact is None:
             return False
 
-        fact = facts[memory_id]
+        changed = {}
         for key, value in updates.items():
             if key in fact and key not in ["id", "type", "timestamp"]:
-                fact[key] = value
+                changed[key] = value
 
-        fact["last_updated"] = get_current_timestamp()
-        self._save_json(self.facts_file, facts)
+        changed["last_updated"] = get_current_timestamp()
+        # The JSON storages update the cached record in place
+        old_category = fact["category"]
+        self.storage.apply("fact", [make_op(OP_UPDATE, memory_id, fields=changed)])
+        self._touch_categories(old_category, changed.get("category"))
         return True
 
     def deprecate_memory(self, memory_id: str, memory_type: str) -> bool:
         """Mark a memory as deprecated."""
-        file_map = {
-            "fact": self.facts_file,
-            "preference": self.preferences_file,
-            "experience": self.experiences_file,
-        }
-
-        if memory_type not in file_map:
+        if memory_type not in MEMORY_TYPES:
             return False
 
-        memories = self._load_json(file_map[memory_type])
-
-        if memory_id not in memories:
+        memory = self.storage.get(memory_type, memory_id)
+        if memory is None:
             return False
 
-        memories[memory_id]["status"] = "deprecated"
-        memories[memory_id]["last_updated"] = get_current_timestamp()
-        self._save_json(file_map[memory_type], memories)
+        changed = {"status": "deprecated", "last_updated": get_current_timestamp()}
+        self.storage.apply(memory_type, [make_op(OP_DEPRECATE, memory_id, fields=changed)])
+        if memory_type == "fact":
+            self._touch_categories(memory["category"])
         return True
 
     def delete_memory(self, memory_id: str, memory_type: str) -> bool:
         """Permanently delete a memory."""
-        file_map = {
-            "fact": self.facts_file,
-            "preference": self.preferences_file,
-            "experience": self.experiences_file,
-        }
-
-        if memory_type not in file_map:
+        if memory_type not in MEMORY_TYPES:
             return False
 
-        memories = self._load_json(file_map[memory_type])
-
-        if memory_id in memories:
-            del memories[memory_id]
-            self._save_json(file_map[memory_type], memories)
+        memory = self.storage.get(memory_type, memory_id)
+        if memory is not None:
+            self.storage.apply(memory_type, [make_op(OP_DELETE, memory_id)])
+            if memory_type == "fact":
+                self._touch_categories(memory["category"])
             return True
 
         return False
@@ -433,40 +677,91 @@ class MemoryManager:
         """
         Detect conflicting memories.
 
+        Conflicts are maintained on every fact write, so this only reads the
+        saved reports. A conflict keeps its conflict_id while it exists.
+
         Returns:
             List of conflict reports
         """
-        conflicts = []
-
-        # Check for contradictory facts in same category
-        facts = self._load_json(self.facts_file)
-        active_facts = [f for f in facts.values() if f["status"] == "active"]
-
-        # Group by category
-        by_category: Dict[str, List[FactMemory]] = {}
-        for fact in active_facts:
-            cat = fact["category"]
-            if cat not in by_category:
-                by_category[cat] = []
-            by_category[cat].append(fact)
-
-        # Detect conflicts within categories that typically have single values
-        single_value_categories = ["location", "occupation", "current_city", "current_company"]
-
-        for category in single_value_categories:
-            if category in by_category and len(by_category[category]) > 1:
-                # Multiple active facts in single-value category
-                facts_in_cat = by_category[category]
-                conflicts.append({
-                    "conflict_id": f"conflict_{create_memory_id()}",
-                    "memory_ids": [f["id"] for f in facts_in_cat],
-                    "conflict_type": "contradiction",
-                    "description": f"Multiple active facts in '{category}' category",
-                    "suggested_resolution": "Keep the most recent or highest confidence entry",
-                    "confidence": 0.9,
-                })
-
-        return conflicts
+        state = self._conflict_state()
+        return list(state["conflicts"].values())
+
+    @property
+    def single_value_categories(self) -> List[str]:
+        """Fact categories that may hold only one active fact."""
+        return list(self._conflict_state()["single_value_categories"])
+
+    def set_single_value_categories(self, categories: List[str]):
+        """
+        Change the single-value categories and recompute all conflicts.
+
+        The list is saved in conflicts.json and used by every MemoryManager
+        that does not pass single_value_categories explicitly.
+        """
+        self._single_value_categories = list(categories)
+        self._conflict_state()
+
+    def _conflict_state(self) -> Dict[str, Any]:
+        """Load the saved conflicts, rebuilding them if missing or configured differently."""
+        state = load_conflicts(self.conflicts_file)
+        wanted = self._single_value_categories
+        if state is None:
+            return self._rebuild_conflicts(
+                wanted if wanted is not None else list(DEFAULT_SINGLE_VALUE_CATEGORIES))
+        if wanted is not None and state["single_value_categories"] != wanted:
+            return self._rebuild_conflicts(wanted)
+        return state
+
+    def _rebuild_conflicts(self, categories: List[str]) -> Dict[str, Any]:
+        """Recompute the conflicts of every single-value category and save them."""
+        conflicts = {}
+        for category in categories:
+            report = build_conflict(category, self.storage.select("fact", category=category))
+            if report is not None:
+                conflicts[report["conflict_id"]] = report
+
+        state = {"single_value_categories": list(categories), "conflicts": conflicts}
+        with self._conflicts_lock.exclusive():
+            save_conflicts(self.conflicts_file, state)
+        return state
+
+    def _touch_categories(self, *categories: Optional[str]):
+        """Note fact categories changed by a write and re-check their conflicts."""
+        self._touched_categories.update(c for c in categories if c is not None)
+        if self._batch_depth == 0:
+            self._refresh_conflicts()
+
+    def _refresh_conflicts(self):
+        """Re-check the touched single-value categories, saving only on change."""
+        touched, self._touched_categories = self._touched_categories, set()
+        if not touched:
+            return
+
+        # Other sessions update other categories of the same file
+        with self._conflicts_lock.exclusive():
+            self._update_conflicts(touched)
+
+    def _update_conflicts(self, touched: set):
+        state = self._conflict_state()
+        changed = False
+        for category in state["single_value_categories"]:
+            if category not in touched:
+                continue
+            report = build_conflict(category, self.storage.select("fact", category=category))
+            key = conflict_id(category)
+            if report == state["conflicts"].get(key):
+                continue
+            if report is None:
+                del state["conflicts"][key]
+            else:
+                state["conflicts"][key] = report
+            changed = True
+
+        if changed:
+            # Keep reports in category order
+            order = {conflict_id(c): i for i, c in enumerate(state["single_value_categories"])}
+            state["conflicts"] = dict(sorted(state["conflicts"].items(), key=lambda kv: order[kv[0]]))
+            save_conflicts(self.conflicts_file, state)
 
     # ========== Layered Memory Operations ==========
 
@@ -478,18 +773,7 @@ class MemoryManager:
         Returns:
             Dict with keys: facts, preferences, experiences
         """
-        facts = self._load_json(self.facts_file)
-        prefs = self._load_json(self.preferences_file)
-        exps = self._load_json(self.experiences_file)
-
-        return {
-            "facts": [f for f in facts.values()
-                     if f["status"] == "active" and f.get("importance") == "core"],
-            "preferences": [p for p in prefs.values()
-                          if p["status"] == "active" and p.get("importance") == "core"],
-            "experiences": [e for e in exps.values()
-                          if e["status"] == "active" and e.get("importance") == "core"],
-        }
+        return self.get_memories_by_importance("core")
 
     def get_memories_by_importance(self, importance_level: str) -> Dict[str, List[Dict]]:
         """
@@ -501,17 +785,9 @@ class MemoryManager:
         Returns:
             Dict with keys: facts, preferences, experiences
         """
-        facts = self._load_json(self.facts_file)
-        prefs = self._load_json(self.preferences_file)
-        exps = self._load_json(self.experiences_file)
-
         return {
-            "facts": [f for f in facts.values()
-                     if f["status"] == "active" and f.get("importance") == importance_level],
-            "preferences": [p for p in prefs.values()
-                          if p["status"] == "active" and p.get("importance") == importance_level],
-            "experiences": [e for e in exps.values()
-                          if e["status"] == "active" and e.get("importance") == importance_level],
+            key: [copy_record(memory) for memory in self.storage.select(memory_type, importance=importance_level)]
+            for key, memory_type in (("facts", "fact"), ("preferences", "preference"), ("experiences", "experience"))
         }
 
     def query_by_context(self, context_tags: List[str], limit: int = 5) -> List[Dict]:
@@ -519,31 +795,17 @@ class MemoryManager:
         Query memories by context tags.
         Used for triggered recall based on conversation topics.
 
+        A memory matches if any of the tags is in its context_tags or tags.
+
         Args:
             context_tags: List of context tags to match (e.g., ["coding", "work"])
             limit: Maximum number of results to return
 
         Returns:
-            List of matching memories, sorted by relevance
+            Top matching memories: most matched tags first, then most
+            accessed, then most recently accessed
         """
-        results = []
-
-        # Search across all memory types
-        for file_path in [self.facts_file, self.preferences_file, self.experiences_file]:
-            memories = self._load_json(file_path)
-
-            for memory in memories.values():
-                if memory["status"] != "active":
-                    continue
-
-                # Check if any context_tag matches
-                mem_context_tags = memory.get("context_tags", [])
-                if any(tag in mem_context_tags for tag in context_tags):
-                    results.append(memory)
-
-        # Sort by access_count (most accessed first) and limit
-        results.sort(key=lambda x: x.get("access_count", 0), reverse=True)
-        return results[:limit]
+        return [copy_record(memory) for memory in self.storage.query_by_context(context_tags, limit)]
 
     def mark_accessed(self, memory_id: str, memory_type: str):
         """
@@ -553,101 +815,165 @@ class MemoryManager:
             memory_id: Memory ID
             memory_type: fact, preference, or experience
         """
-        file_map = {
-            "fact": self.facts_file,
-            "preference": self.preferences_file,
-            "experience": self.experiences_file,
-        }
+        self.mark_accessed_many([(memory_id, memory_type)])
 
-        if memory_type not in file_map:
-            return
+    def mark_accessed_many(self, accesses: List[Tuple[str, str]]) -> int:
+        """
+        Mark several memories as accessed at once.
 
-        memories = self._load_json(file_map[memory_type])
+        Access updates are written behind: with the JSON backend they go to a
+        small per-store access log that is folded into the store once it
+        passes a size or age threshold, or on flush_access(). Reads see
+        them immediately.
 
-        if memory_id in memories:
-            memories[memory_id]["access_count"] = memories[memory_id].get("access_count", 0) + 1
-            memories[memory_id]["last_accessed"] = get_current_timestamp()
-            self._save_json(file_map[memory_type], memories)
+        Args:
+            accesses: (memory_id, memory_type) pairs; a memory listed twice
+                is counted twice
 
-    def auto_maintain_importance(self, days_active: int = 7, days_contextual: int = 30):
+        Returns:
+            Number of accesses recorded (unknown ids are skipped)
+        """
+        counts: Dict[str, Dict[str, int]] = {}
+        for memory_id, memory_type in accesses:
+            if memory_type in MEMORY_TYPES:
+                per_type = counts.setdefault(memory_type, {})
+                per_type[memory_id] = per_type.get(memory_id, 0) + 1
+
+        recorded = 0
+        timestamp = get_current_timestamp()
+        for memory_type, per_type in counts.items():
+            ops = self._access_ops(memory_type, per_type, timestamp)
+            recorded += sum(per_type[op["id"]] for op in ops)
+            if ops:
+                # Counts are recomputed if another session wrote the store meanwhile
+                rebuild = partial(self._access_ops, memory_type, per_type, timestamp)
+                self.storage.record_access(memory_type, ops, rebuild)
+        return recorded
+
+    def _access_ops(self, memory_type: str, per_type: Dict[str, int], timestamp: str) -> List[Dict]:
+        """Access updates adding per_type[id] accesses to the stored counts."""
+        ops = []
+        for memory_id, times in per_type.items():
+            memory = self.storage.get(memory_type, memory_id)
+            if memory is None:
+                continue
+            changed = {
+                "access_count": (memory.get("access_count", 0) or 0) + times,
+                "last_accessed": timestamp,
+            }
+            ops.append(make_op(OP_UPDATE, memory_id, fields=changed))
+        return ops
+
+    def flush_access(self) -> Dict[str, int]:
+        """
+        Write pending access updates into the memory stores.
+
+        Returns:
+            Dict of store file name -> number of access updates written
+        """
+        return self.storage.flush_access()
+
+    def auto_maintain_importance(self, days_active: int = 7, days_contextual: int = 30) -> Dict[str, int]:
         """
         Automatically maintain memory importance levels based on access patterns.
 
+        Only memories due for a transition are read (see
+        MemoryStorage.transition_candidates), so a run costs time in
+        proportion to the number of transitions, not the store size.
+
         Args:
             days_active: Days threshold for active memories
             days_contextual: Days threshold for contextual memories
+
+        Returns:
+            Report: examined (records read), promoted, demoted, archived
         """
         from datetime import datetime, timedelta
 
         now = datetime.now()
         active_threshold = now - timedelta(days=days_active)
         contextual_threshold = now - timedelta(days=days_contextual)
+        # Rules compare precomputed epoch fields instead of parsing timestamps
+        active_epoch = to_epoch_micros(active_threshold)
+        contextual_epoch = to_epoch_micros(contextual_threshold)
+        report = {"examined": 0, "promoted": 0, "demoted": 0, "archived": 0}
 
-        for file_path in [self.facts_file, self.preferences_file, self.experiences_file]:
-            memories = self._load_json(file_path)
-            updated = False
+        for memory_type in MEMORY_TYPES:
+            ops = []
+            candidates = self.storage.transition_candidates(
+                memory_type, active_threshold, contextual_threshold)
+            report["examined"] += len(candidates)
 
-            for mem_id, memory in memories.items():
-                if memory["status"] != "active":
-                    continue
+            for memory in candidates:
+                mem_id = memory["id"]
 
                 # Skip core memories (never auto-demote)
                 if memory.get("importance") == "core":
                     continue
 
-                last_accessed = memory.get("last_accessed")
                 access_count = memory.get("access_count", 0)
 
                 # If never accessed, use timestamp
-                if not last_accessed:
-                    last_accessed = memory.get("timestamp")
-
-                if last_accessed:
-                    last_dt = datetime.fromisoformat(last_accessed)
+                if memory.get("last_accessed"):
+                    last_epoch = record_epoch(memory, "last_accessed")
+                else:
+                    last_epoch = record_epoch(memory, "timestamp")
 
+                if last_epoch is not None:
                     # Promote to active if accessed frequently within days_active
-                    if last_dt >= active_threshold and access_count >= 3:
+                    if last_epoch >= active_epoch and access_count >= PROMOTE_ACCESS_COUNT:
                         if memory.get("importance") != "active":
-                            memory["importance"] = "active"
-                            updated = True
+                            ops.append(make_op(OP_UPDATE, mem_id, fields={"importance": "active"}))
+                            report["promoted"] += 1
 
                     # Demote to contextual if not accessed within days_active
-                    elif last_dt < active_threshold and memory.get("importance") == "active":
-                        memory["importance"] = "contextual"
-                        updated = True
+                    elif last_epoch < active_epoch and memory.get("importance") == "active":
+                        ops.append(make_op(OP_UPDATE, mem_id, fields={"importance": "contextual"}))
+                        report["demoted"] += 1
 
                     # Archive if not accessed within days_contextual
-                    elif last_dt < contextual_threshold and memory.get("importance") == "contextual":
-                        memory["importance"] = "archived"
-                        updated = True
+                    elif last_epoch < contextual_epoch and memory.get("importance") == "contextual":
+                        ops.append(make_op(OP_UPDATE, mem_id, fields={"importance": "archived"}))
+                        report["archived"] += 1
 
-            if updated:
-                self._save_json(file_path, memories)
+            if ops:
+                self.storage.apply(memory_type, ops)
+
+        return report
 
     # ========== Utility Functions ==========
 
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Get read cache counters (hits, misses, cached files) and file writes."""
+        return self.storage.get_cache_stats()
+
+    def clear_cache(self):
+        """Drop cached store contents and reset the counters."""
+        self.storage.clear_cache()
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Fold pending journals into the main store (JSON backend).
+
+        Returns:
+            Dict of store file name -> number of journal ops folded
+        """
+        return self.storage.compact()
+
     def get_all_categories(self, memory_type: str) -> List[str]:
         """Get all unique categories for a memory type."""
-        file_map = {
-            "fact": self.facts_file,
-            "preference": self.preferences_file,
-            "experience": self.experiences_file,
-        }
-
-        if memory_type not in file_map:
+        if memory_type not in MEMORY_TYPES:
             return []
 
-        memories = self._load_json(file_map[memory_type])
-        categories = set(m["category"] for m in memories.values())
-        return sorted(list(categories))
+        return self.storage.categories(memory_type)
 
     def export_memories(self, output_file: str):
         """Export all memories to a single JSON file."""
         export_data = {
-            "facts": self._load_json(self.facts_file),
-            "preferences": self._load_json(self.preferences_file),
-            "experiences": self._load_json(self.experiences_file),
-            "metadata": self._load_json(self.metadata_file),
+            "facts": self.storage.load("fact"),
+            "preferences": self.storage.load("preference"),
+            "experiences": self.storage.load("experience"),
+            "metadata": self.storage.get_metadata(),
         }
 
         with open(output_file, "w", encoding="utf-8") as f:
@@ -655,17 +981,22 @@ class MemoryManager:
 
     def get_statistics(self) -> Dict[str, Any]:
         """Get statistics about stored memories."""
-        facts = self._load_json(self.facts_file)
-        prefs = self._load_json(self.preferences_file)
-        exps = self._load_json(self.experiences_file)
-
         return {
-            "total_facts": len(facts),
-            "active_facts": len([f for f in facts.values() if f["status"] == "active"]),
-            "total_preferences": len(prefs),
-            "active_preferences": len([p for p in prefs.values() if p["status"] == "active"]),
-            "total_experiences": len(exps),
-            "active_experiences": len([e for e in exps.values() if e["status"] == "active"]),
-            "fact_categories": len(set(f["category"] for f in facts.values())),
-            "last_updated": self._load_json(self.metadata_file).get("last_updated"),
+            "total_facts": self.storage.count("fact"),
+            "active_facts": self.storage.count("fact", "active"),
+            "total_preferences": self.storage.count("preference"),
+            "active_preferences": self.storage.count("preference", "active"),
+            "total_experiences": self.storage.count("experience"),
+            "active_experiences": self.storage.count("experience", "active"),
+            "fact_categories": len(self.storage.categories("fact")),
+            "active_by_importance": self._active_by_importance(),
+            "last_updated": self.storage.get_metadata().get("last_updated"),
         }
+
+    def _active_by_importance(self) -> Dict[str, int]:
+        """Count active memories of every type per importance level."""
+        totals: Dict[str, int] = {}
+        for memory_type in MEMORY_TYPES:
+            for level, count in self.storage.columns(memory_type).counts("importance", status="active").items():
+                totals[level] = totals.get(level, 0) + count
+        return totals
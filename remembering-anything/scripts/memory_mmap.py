@@ -0,0 +1,416 @@
+"""
+Memory-mapped binary snapshots for fast read-only store access.
+
+Every store snapshot (facts.json / facts.jsonl) gets a binary companion,
+facts.snapshot.bin, written whenever JsonStorage writes or first loads the
+snapshot. Read-only scripts (quick_load, activation) open it with mmap
+instead of parsing the whole JSON file, and records are decoded field by
+field only when accessed.
+
+File layout (little-endian):
+
+    preamble   magic, version, record count, snapshot (mtime_ns, size),
+               offsets of the record table, string heap and layout table
+    records    one fixed-width header per record: heap references of id,
+               content, category, source, tags, context_tags and the extra
+               fields; type/status/importance codes; presence flags; key
+               layout; timestamp, last_updated, last_accessed as epoch
+               microseconds; access_count; confidence. The epoch fields
+               (ts_epoch, ...) equal those slots, so they are not stored
+               but flagged as derived and rebuilt from them
+    heap       UTF-8 strings (repeated values stored once); tags as JSON
+               lists; fields without a header slot as one JSON object
+    layouts    JSON list of record key orders
+
+A value is kept in its header slot only if it round-trips exactly (known
+enum value, lossless ISO timestamp, ...); anything else goes to the extra
+JSON object, so decoded records always equal the JSON records.
+
+The binary file is stamped with the snapshot's signature and ignored once
+the snapshot changes. Like the core view, it does not include the journal
+or access log; open_store() overlays both.
+"""
+
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+import memory_journal
+from memory_schema import ENUM_FIELDS, ENUM_CODES, EPOCH_FIELDS, encode_timestamp, decode_timestamp
+from memory_lock import temp_path
+
+BINARY_SUFFIX = ".snapshot.bin"
+MAGIC = b"MEMSNAP\x00"
+BINARY_VERSION = 2
+
+# magic, version, count, snapshot mtime_ns, snapshot size, records / heap / layouts offsets
+_PREAMBLE = struct.Struct("<8sIIqqQQQ")
+
+# Header slots, in flag-bit order
+_REF_FIELDS = ("id", "content", "category", "source", "tags", "context_tags")
+_ENUM_SLOTS = ("type", "status", "importance")
+_TIME_SLOTS = ("timestamp", "last_updated", "last_accessed")
+HEADER_FIELDS = _REF_FIELDS + _ENUM_SLOTS + _TIME_SLOTS + ("access_count", "confidence")
+_LIST_FIELDS = ("tags", "context_tags")
+
+# 7 heap refs (the 6 fields + extra), 3 enum codes, pad, flags, layout,
+# 3 times, access_count, confidence
+_RECORD = struct.Struct("<14IBBBxHHqqqId")
+_EXTRA = 12
+_ENUM_AT = {field: 14 + i for i, field in enumerate(_ENUM_SLOTS)}
+_FLAGS = 17
+_LAYOUT = 18
+_TIME_AT = {field: 19 + i for i, field in enumerate(_TIME_SLOTS)}
+_ACCESS_COUNT = 22
+_CONFIDENCE = 23
+_BIT = {field: 1 << i for i, field in enumerate(HEADER_FIELDS)}
+# Flag of records whose epoch fields are the values of their time slots
+_DERIVED_EPOCHS = 1 << len(HEADER_FIELDS)
+# Epoch field -> time slot it is derived from
+_EPOCH_SLOTS = {epoch: field for field, epoch in EPOCH_FIELDS.items() if field in _TIME_AT}
+
+# Time slot value of None
+_NO_TIME = -(2 ** 63)
+
+
+def binary_path(store_path: Path) -> Path:
+    """Get the binary snapshot path for a store file (facts.json -> facts.snapshot.bin)."""
+    store_path = Path(store_path)
+    return store_path.with_name(store_path.stem + BINARY_SUFFIX)
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class _Heap:
+    """Append-only string heap that stores each distinct value once."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self._seen: Dict[bytes, Tuple[int, int]] = {}
+
+    def add(self, raw: bytes) -> Tuple[int, int]:
+        ref = self._seen.get(raw)
+        if ref is None:
+            ref = (len(self.data), len(raw))
+            self.data += raw
+            self._seen[raw] = ref
+        return ref
+
+
+def _encode_record(record: Dict[str, Any], heap: _Heap, layouts: Dict[Tuple[str, ...], int]) -> bytes:
+    refs = [0] * 14
+    codes = [0, 0, 0]
+    times = [_NO_TIME, _NO_TIME, _NO_TIME]
+    access_count = 0
+    confidence = 0.0
+    flags = 0
+    extra = {}
+
+    for key, value in record.items():
+        stored = False
+        if key in _LIST_FIELDS:
+            if isinstance(value, list) and all(isinstance(tag, str) for tag in value):
+                slot = _REF_FIELDS.index(key)
+                raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+                refs[2 * slot], refs[2 * slot + 1] = heap.add(raw)
+                stored = True
+        elif key in _REF_FIELDS:
+            if isinstance(value, str):
+                slot = _REF_FIELDS.index(key)
+                refs[2 * slot], refs[2 * slot + 1] = heap.add(value.encode("utf-8"))
+                stored = True
+        elif key in _ENUM_AT:
+            code = ENUM_CODES[key].get(value) if isinstance(value, str) else None
+            if code is not None:
+                codes[_ENUM_SLOTS.index(key)] = code
+                stored = True
+        elif key in _TIME_AT:
+            micros = _NO_TIME if value is None else encode_timestamp(value)
+            if micros is not None:
+                times[_TIME_SLOTS.index(key)] = micros
+                stored = True
+        elif key == "access_count":
+            if type(value) is int and 0 <= value < 2 ** 32:
+                access_count = value
+                stored = True
+        elif key == "confidence":
+            if type(value) is float:
+                confidence = value
+                stored = True
+
+        if stored:
+            flags |= _BIT[key]
+        else:
+            extra[key] = value
+
+    # Epoch fields equal to their time slot (None for a None time) need no storage
+    epochs = [key for key in extra if key in _EPOCH_SLOTS]
+    if epochs and all(
+        flags & _BIT[_EPOCH_SLOTS[key]] and
+        (extra[key] is None if times[_TIME_SLOTS.index(_EPOCH_SLOTS[key])] == _NO_TIME
+         else type(extra[key]) is int and extra[key] == times[_TIME_SLOTS.index(_EPOCH_SLOTS[key])])
+        for key in epochs
+    ):
+        flags |= _DERIVED_EPOCHS
+        for key in epochs:
+            del extra[key]
+
+    if extra:
+        raw = json.dumps(extra, ensure_ascii=False).encode("utf-8")
+        refs[_EXTRA], refs[_EXTRA + 1] = heap.add(raw)
+
+    keys = tuple(record)
+    layout = layouts.setdefault(keys, len(layouts))
+    return _RECORD.pack(*refs, *codes, flags, layout, *times, access_count, confidence)
+
+
+def write_binary(store_path: Path, data: Dict[str, Dict], signature: Optional[Tuple[int, int]]) -> bool:
+    """
+    Atomically write the binary snapshot of a store.
+
+    Args:
+        store_path: Store snapshot path
+        data: Snapshot contents (without the journal)
+        signature: (mtime_ns, size) of the snapshot file the data came from
+
+    Returns:
+        False if nothing was written (no snapshot, a record whose id is not
+        its key, or a store too large for the format)
+    """
+    if signature is None:
+        return False
+    if any(not isinstance(memory_id, str) or record.get("id") != memory_id
+           for memory_id, record in data.items()):
+        return False
+
+    heap = _Heap()
+    layouts: Dict[Tuple[str, ...], int] = {}
+    try:
+        records = b"".join(_encode_record(record, heap, layouts) for record in data.values())
+    except struct.error:
+        # More than 65535 key layouts or a heap beyond 4 GB
+        return False
+
+    layout_table = json.dumps([list(keys) for keys in layouts], ensure_ascii=False).encode("utf-8")
+    records_at = _PREAMBLE.size
+    heap_at = records_at + len(records)
+    layouts_at = heap_at + len(heap.data)
+
+    path = binary_path(store_path)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, BINARY_VERSION, len(data), signature[0], signature[1],
+                               records_at, heap_at, layouts_at))
+        f.write(records)
+        f.write(heap.data)
+        f.write(layout_table)
+    os.replace(tmp_path, path)
+    return True
+
+
+def binary_signature(store_path: Path) -> Optional[Tuple[int, int]]:
+    """Snapshot signature a binary snapshot was written for (None if missing or invalid)."""
+    try:
+        with open(binary_path(store_path), "rb") as f:
+            preamble = f.read(_PREAMBLE.size)
+        magic, version, _, mtime_ns, size, _, _, _ = _PREAMBLE.unpack(preamble)
+    except (FileNotFoundError, struct.error):
+        return None
+    if magic != MAGIC or version != BINARY_VERSION:
+        return None
+    return (mtime_ns, size)
+
+
+class BinarySnapshot:
+    """A memory-mapped binary snapshot file."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.count, mtime_ns, size,
+             self._records_at, self._heap_at, layouts_at) = _PREAMBLE.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != BINARY_VERSION:
+                raise ValueError(f"Not a binary snapshot: {path}")
+            self.signature = (mtime_ns, size)
+            self.layouts: List[Tuple[str, ...]] = [
+                tuple(keys) for keys in json.loads(self._mm[layouts_at:].decode("utf-8"))
+            ]
+        except Exception:
+            self._mm.close()
+            raise
+        self.layout_keys = [frozenset(keys) for keys in self.layouts]
+
+    def close(self):
+        self._mm.close()
+
+    def header(self, row: int) -> Tuple:
+        return _RECORD.unpack_from(self._mm, self._records_at + row * _RECORD.size)
+
+    def _text(self, offset: int, length: int) -> str:
+        start = self._heap_at + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def ids(self) -> List[str]:
+        """Record ids in snapshot order."""
+        ids = []
+        for row in range(self.count):
+            offset, length = struct.unpack_from("<II", self._mm, self._records_at + row * _RECORD.size)
+            ids.append(self._text(offset, length))
+        return ids
+
+    def field(self, header: Tuple, key: str) -> Any:
+        """Decode one header-stored field of a record."""
+        if key in _TIME_AT:
+            micros = header[_TIME_AT[key]]
+            return None if micros == _NO_TIME else decode_timestamp(micros)
+        if key in _ENUM_AT:
+            return ENUM_FIELDS[key][header[_ENUM_AT[key]]]
+        if key == "access_count":
+            return header[_ACCESS_COUNT]
+        if key == "confidence":
+            return header[_CONFIDENCE]
+        slot = _REF_FIELDS.index(key)
+        text = self._text(header[2 * slot], header[2 * slot + 1])
+        return json.loads(text) if key in _LIST_FIELDS else text
+
+    def extra(self, header: Tuple) -> Dict[str, Any]:
+        """Decode the fields of a record that have no header slot."""
+        length = header[_EXTRA + 1]
+        return json.loads(self._text(header[_EXTRA], length)) if length else {}
+
+    def record(self, row: int) -> "LazyRecord":
+        return LazyRecord(self, self.header(row))
+
+
+class LazyRecord(Mapping):
+    """Read-only record of a binary snapshot; fields are decoded on access."""
+
+    __slots__ = ("_snapshot", "_header", "_extra")
+
+    def __init__(self, snapshot: BinarySnapshot, header: Tuple):
+        self._snapshot = snapshot
+        self._header = header
+        self._extra: Optional[Dict[str, Any]] = None
+
+    def __getitem__(self, key: str) -> Any:
+        bit = _BIT.get(key)
+        if bit is not None and self._header[_FLAGS] & bit:
+            return self._snapshot.field(self._header, key)
+        if key not in self._snapshot.layout_keys[self._header[_LAYOUT]]:
+            raise KeyError(key)
+        if key in _EPOCH_SLOTS and self._header[_FLAGS] & _DERIVED_EPOCHS:
+            micros = self._header[_TIME_AT[_EPOCH_SLOTS[key]]]
+            return None if micros == _NO_TIME else micros
+        if self._extra is None:
+            self._extra = self._snapshot.extra(self._header)
+        return self._extra[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._snapshot.layout_keys[self._header[_LAYOUT]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._snapshot.layouts[self._header[_LAYOUT]])
+
+    def __len__(self) -> int:
+        return len(self._snapshot.layouts[self._header[_LAYOUT]])
+
+    def __repr__(self) -> str:
+        return f"LazyRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Decode every field into a plain dict."""
+        return {key: self[key] for key in self}
+
+
+class MmapStore(Mapping):
+    """
+    Read-only id -> record mapping of a store: binary snapshot plus journal.
+
+    Records untouched by the journal are LazyRecords; records with pending
+    operations are plain dicts. Iteration follows load_store() order.
+    """
+
+    def __init__(self, snapshot: BinarySnapshot, ops: Dict[str, List[Tuple[int, Dict]]]):
+        self.snapshot = snapshot
+        ids = snapshot.ids()
+        self._rows = {memory_id: row for row, memory_id in enumerate(ids)}
+        self._overrides: Dict[str, Optional[Dict]] = {}
+
+        moved = []
+        for memory_id, id_ops in ops.items():
+            row = self._rows.get(memory_id)
+            base = snapshot.record(row).to_dict() if row is not None else None
+            record, inserted_at = memory_journal.replay_record(base, id_ops)
+            self._overrides[memory_id] = record
+            if record is not None and inserted_at is not None:
+                moved.append((inserted_at, memory_id))
+
+        moved_ids = {memory_id for _, memory_id in moved}
+        self._order = [
+            memory_id for memory_id in ids
+            if memory_id not in moved_ids and self._overrides.get(memory_id, True) is not None
+        ]
+        self._order += [memory_id for _, memory_id in sorted(moved)]
+
+    def __getitem__(self, memory_id: str) -> Any:
+        if memory_id in self._overrides:
+            record = self._overrides[memory_id]
+            if record is None:
+                raise KeyError(memory_id)
+            return record
+        return self.snapshot.record(self._rows[memory_id])
+
+    def __contains__(self, memory_id: object) -> bool:
+        if memory_id in self._overrides:
+            return self._overrides[memory_id] is not None
+        return memory_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._order)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def close(self):
+        """Unmap the snapshot; records obtained earlier become unusable."""
+        self.snapshot.close()
+
+
+def open_store(store_path: Path) -> Optional[MmapStore]:
+    """
+    Open a store through its binary snapshot.
+
+    Returns:
+        MmapStore, or None if the binary snapshot is missing or was written
+        for another snapshot (callers then fall back to load_store)
+    """
+    store_path = Path(store_path)
+    signature = _signature(store_path)
+    if signature is None:
+        return None
+
+    try:
+        snapshot = BinarySnapshot(binary_path(store_path))
+    except (FileNotFoundError, ValueError, struct.error, OSError):
+        return None
+    if snapshot.signature != signature:
+        snapshot.close()
+        return None
+
+    ops = memory_journal.ops_by_id(store_path)
+    # A compaction between the checks would have folded ops we did not read
+    if _signature(store_path) != signature:
+        snapshot.close()
+        return None
+    return MmapStore(snapshot, ops)
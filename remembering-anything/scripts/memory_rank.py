@@ -0,0 +1,109 @@
+"""
+BM25 ranking over the n-gram index of the JSON stores.
+
+Terms are the grams of NgramIndex (character bigrams plus CJK unigrams of
+the lowercased content and tags), which needs no word segmentation for
+Chinese text. Term statistics come straight from the index: the document
+frequency of a term is the size of its posting list, a record's length is
+its gram count, and both are kept up to date on every write.
+
+A query is scored over one or more sources, each a store dict with its
+IndexSet. Statistics are summed over all sources, so stores of different
+types (or month shards) are ranked on one scale. Only records in the
+posting lists of the query terms are scored; with NumPy each term's
+contribution is added to the candidate scores as one array operation,
+otherwise the same sums are accumulated in plain Python. The top k are
+selected with a heap.
+
+Scores use the Lucene form of BM25: idf = ln(1 + (N - df + 0.5) / (df + 0.5))
+and tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length)).
+"""
+
+import math
+import heapq
+from typing import Optional, List, Dict, Tuple, Set
+
+from memory_index import IndexSet, NgramIndex
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+K1 = 1.2
+B = 0.75
+
+# (store dict, its indexes), in tie-break order
+Source = Tuple[Dict[str, Dict], IndexSet]
+
+
+def query_terms(query: str) -> Set[str]:
+    """Distinct terms of a query (empty for blank or single ASCII character queries)."""
+    return NgramIndex.text_grams(query.lower())
+
+
+def _source_scores(ngram: NgramIndex, weights: Dict[str, float], average_length: float) -> Dict[str, float]:
+    """BM25 score of every record of one source that holds a query term."""
+    postings = [(weights[term], ngram.postings[term]) for term in weights if term in ngram.postings]
+    if not postings:
+        return {}
+
+    if np is not None:
+        ids = list(dict.fromkeys(memory_id for _, posting in postings for memory_id in posting))
+        position = {memory_id: i for i, memory_id in enumerate(ids)}
+        lengths = np.fromiter((ngram.lengths[memory_id] for memory_id in ids), dtype=np.float64, count=len(ids))
+        norms = K1 * (1 - B + B * lengths / average_length)
+        scores = np.zeros(len(ids))
+        for weight, posting in postings:
+            rows = np.fromiter((position[memory_id] for memory_id in posting), dtype=np.int64, count=len(posting))
+            tf = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+            scores[rows] += weight * tf * (K1 + 1) / (tf + norms[rows])
+        return dict(zip(ids, scores.tolist()))
+
+    scores: Dict[str, float] = {}
+    norms: Dict[str, float] = {}
+    for weight, posting in postings:
+        for memory_id, tf in posting.items():
+            norm = norms.get(memory_id)
+            if norm is None:
+                norm = norms[memory_id] = K1 * (1 - B + B * ngram.lengths[memory_id] / average_length)
+            scores[memory_id] = scores.get(memory_id, 0.0) + weight * tf * (K1 + 1) / (tf + norm)
+    return scores
+
+
+def rank_bm25(query: str, sources: List[Source], top_k: Optional[int] = None) -> List[Tuple[Dict, float]]:
+    """
+    Rank the active records of the sources against a query.
+
+    Args:
+        query: Search text
+        sources: (store dict, IndexSet) pairs; ties keep source order,
+            then insertion order
+        top_k: Number of results (all records holding a query term if None)
+
+    Returns:
+        (record, score) pairs, best first
+    """
+    terms = query_terms(query)
+    ngrams = [indexes["ngram"] for _, indexes in sources]
+    n_docs = sum(len(ngram.lengths) for ngram in ngrams)
+    if not terms or not n_docs or (top_k is not None and top_k <= 0):
+        return []
+
+    average_length = sum(ngram.total_length for ngram in ngrams) / n_docs
+    weights = {}
+    for term in terms:
+        df = sum(len(ngram.postings.get(term, ())) for ngram in ngrams)
+        if df:
+            weights[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def scored():
+        for source_index, (data, indexes) in enumerate(sources):
+            for memory_id, score in _source_scores(indexes["ngram"], weights, average_length).items():
+                yield score, -source_index, -indexes.seq.get(memory_id, 0), memory_id, data
+
+    if top_k is None:
+        ranked = sorted(scored(), key=lambda entry: entry[:3], reverse=True)
+    else:
+        ranked = heapq.nlargest(top_k, scored(), key=lambda entry: entry[:3])
+    return [(data[memory_id], score) for score, _, _, memory_id, data in ranked]
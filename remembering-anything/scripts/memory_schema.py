@@ -4,8 +4,10 @@ Memory schema definitions for AI Partner Chat.
 Defines the data structures for facts, preferences, experiences, and conflicts.
 """
 
-from typing import TypedDict, Optional, List, Literal
-from datetime import datetime
+import sys
+from collections.abc import Mapping
+from typing import TypedDict, Optional, List, Literal, Dict, Any, Iterator, Tuple
+from datetime import datetime, timedelta
 import uuid
 
 
@@ -33,6 +35,11 @@ class BaseMemory(TypedDict):
     expires_at: Optional[str]  # Expiration timestamp (ISO format), for short-term memories
     is_work_in_progress: bool  # Whether this is an ongoing task/project
 
+    # Precomputed epoch microseconds of the timestamps above (see EPOCH_FIELDS)
+    ts_epoch: Optional[int]
+    last_updated_epoch: Optional[int]
+    last_accessed_epoch: Optional[int]
+
 
 class FactMemory(BaseMemory):
     """Memory representing a factual statement about the user."""
@@ -86,6 +93,85 @@ def get_current_timestamp() -> str:
     return datetime.now().isoformat()
 
 
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+MICROS_PER_DAY = 86400 * 1000000
+
+# ISO timestamp field -> field holding it as integer epoch microseconds
+EPOCH_FIELDS = {
+    "timestamp": "ts_epoch",
+    "last_updated": "last_updated_epoch",
+    "last_accessed": "last_accessed_epoch",
+}
+
+_MISSING = object()
+
+
+def to_epoch_micros(value: Any) -> Optional[int]:
+    """
+    Integer epoch microseconds of an ISO timestamp or datetime.
+
+    Naive times (what get_current_timestamp() writes) are local wall-clock
+    times and are counted as they read, without a time zone shift; aware
+    times are converted to local time first. None if missing or not ISO.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_micros(micros: int) -> datetime:
+    """Naive datetime of epoch microseconds from to_epoch_micros()."""
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def record_epoch(record: Mapping, field: str) -> Optional[int]:
+    """
+    Epoch microseconds of a record's timestamp field (see EPOCH_FIELDS).
+
+    Uses the precomputed value, parsing the ISO string only for records
+    written before the epoch fields existed.
+    """
+    epoch = record.get(EPOCH_FIELDS[field], _MISSING)
+    if epoch is _MISSING:
+        return to_epoch_micros(record.get(field))
+    return epoch
+
+
+def with_epochs(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a record or update fields with the epoch field of every timestamp field set."""
+    epochs = {EPOCH_FIELDS[field]: to_epoch_micros(value) for field, value in values.items() if field in EPOCH_FIELDS}
+    if not epochs:
+        return values
+    return {**values, **epochs}
+
+
+# Mutable JSON values (records are parsed JSON, so exact type checks suffice)
+_CONTAINERS = (dict, list)
+
+
+def _copy_value(value: Any) -> Any:
+    if value.__class__ is dict:
+        return {key: _copy_value(item) if item.__class__ in _CONTAINERS else item
+                for key, item in value.items()}
+    return [_copy_value(item) if item.__class__ in _CONTAINERS else item for item in value]
+
+
+def copy_record(record: Mapping) -> Dict[str, Any]:
+    """Copy of a record sharing no dicts or lists with it (for records handed out of a cache)."""
+    copy = dict(record)
+    for key in [key for key, value in copy.items() if value.__class__ in _CONTAINERS]:
+        copy[key] = _copy_value(copy[key])
+    return copy
+
+
 def validate_memory(memory: BaseMemory) -> bool:
     """
     Validate a memory entry.
@@ -113,3 +199,144 @@ def validate_memory(memory: BaseMemory) -> bool:
         return False
 
     return True
+
+
+# Compact in-memory representation
+
+# Enum-coded fields: value <-> index in the tuple
+ENUM_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "type": ("fact", "preference", "experience"),
+    "status": ("active", "deprecated", "conflicted"),
+    "importance": ("core", "active", "contextual", "archived"),
+    "strength": ("strong", "moderate", "weak"),
+}
+ENUM_CODES = {field: {v: i for i, v in enumerate(values)} for field, values in ENUM_FIELDS.items()}
+
+# Strings repeated across records, stored interned
+_INTERNED_FIELDS = ("category", "source")
+_TAG_FIELDS = ("tags", "context_tags")
+
+# ISO timestamps stored as integer microseconds since 1970-01-01 (naive)
+_TIME_FIELDS = ("timestamp", "last_updated", "last_accessed", "expires_at")
+
+_PLAIN_FIELDS = (
+    "id", "content", "confidence", "access_count", "supersedes",
+    "date", "outcome", "is_work_in_progress", "attachments",
+) + tuple(EPOCH_FIELDS.values())
+
+# Shared key-order tuples, one per distinct record layout
+_KEY_ORDERS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def encode_timestamp(value: Any) -> Optional[int]:
+    """Encode an ISO timestamp as epoch microseconds, or None if not lossless."""
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None or dt.isoformat() != value:
+        return None
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def decode_timestamp(micros: int) -> str:
+    """Decode epoch microseconds from encode_timestamp() back to the ISO string."""
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+class CompactMemory(Mapping):
+    """
+    Read-only, memory-efficient form of a memory record.
+
+    Behaves like the JSON dict (mapping access, iteration in the original
+    key order, equality with dicts) but keeps fields in __slots__: enums
+    as small ints, timestamps as epoch microseconds and category, source
+    and tag strings interned. Values that cannot be encoded losslessly
+    (unknown enum values, non-ISO timestamps, extra keys) are kept as-is,
+    so to_dict() always returns the original record.
+    """
+
+    __slots__ = (
+        ("_keys", "_extra")
+        + tuple(ENUM_FIELDS) + _INTERNED_FIELDS + _TAG_FIELDS + _TIME_FIELDS + _PLAIN_FIELDS
+    )
+
+    def __init__(self, record: Dict[str, Any]):
+        keys = tuple(record)
+        self._keys = _KEY_ORDERS.setdefault(keys, keys)
+        extra = {}
+
+        for key, value in record.items():
+            if key in ENUM_CODES:
+                code = ENUM_CODES[key].get(value) if isinstance(value, str) else None
+                if code is None:
+                    extra[key] = value
+                else:
+                    setattr(self, key, code)
+            elif key in _INTERNED_FIELDS:
+                if isinstance(value, str):
+                    setattr(self, key, sys.intern(value))
+                else:
+                    extra[key] = value
+            elif key in _TAG_FIELDS:
+                if isinstance(value, list) and all(isinstance(tag, str) for tag in value):
+                    setattr(self, key, tuple(sys.intern(tag) for tag in value))
+                else:
+                    extra[key] = value
+            elif key in _TIME_FIELDS:
+                micros = encode_timestamp(value)
+                if value is None:
+                    setattr(self, key, None)
+                elif micros is None:
+                    extra[key] = value
+                else:
+                    setattr(self, key, micros)
+            elif key in _PLAIN_FIELDS:
+                setattr(self, key, value)
+            else:
+                extra[key] = value
+
+        self._extra = extra or None
+
+    def __getitem__(self, key: str) -> Any:
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if key not in self._keys:
+            raise KeyError(key)
+
+        value = getattr(self, key)
+        if key in ENUM_FIELDS:
+            return ENUM_FIELDS[key][value]
+        if key in _TAG_FIELDS:
+            return list(value)
+        if key in _TIME_FIELDS:
+            return None if value is None else decode_timestamp(value)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"CompactMemory({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert back to the JSON dict form."""
+        return {key: self[key] for key in self._keys}
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "CompactMemory":
+        """Build from the JSON dict form."""
+        return cls(record)
+
+
+def compact_records(data: Dict[str, Dict]) -> Dict[str, CompactMemory]:
+    """Convert an id -> record store dict to compact records."""
+    return {sys.intern(memory_id): CompactMemory(record) for memory_id, record in data.items()}
@@ -0,0 +1,196 @@
+"""
+Month-sharded layout for the JSON backend.
+
+A sharded memory directory splits each store by the month of its records'
+timestamp. Every shard directory is an ordinary JSON store set with its
+own journals, indexes, core views and binary snapshots:
+
+    memory/
+    ├── metadata.json            # shared by all shards
+    ├── shards.json              # manifest
+    └── shards/
+        ├── 2026-09/facts.json, experiences.json, ...
+        └── 2026-10/...
+
+Manifest format:
+    {
+        "version": 1,
+        "field": "timestamp",
+        "shards": {"fact": ["2026-09", "2026-10"], "preference": [...], "experience": [...]}
+    }
+
+A shard key is the "YYYY-MM" prefix of an ISO timestamp; records without
+one go to the "0000-00" shard, which sorts before every month. Month keys
+sort like the timestamps they prefix, so "newest N" and time-bounded
+queries only open the shards whose month can hold a match. The manifest
+changes only when a store gets its first record in a new month.
+"""
+
+import json
+import os
+import re
+import base64
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple, Union
+
+from memory_lock import temp_path
+
+MANIFEST_FILE = "shards.json"
+SHARDS_DIR = "shards"
+MANIFEST_VERSION = 1
+
+# Shard of records without an ISO timestamp (sorts before every month)
+UNDATED = "0000-00"
+
+_MONTH = re.compile(r"\d{4}-\d{2}")
+
+Bound = Union[datetime, str, None]
+
+# Position of a record in a newest-first timeline: (timestamp_key, insertion seq, id).
+# The id lets a store re-resolve the seq, which is only stable within a process.
+TimelineKey = Tuple[str, int, str]
+
+
+def shard_key(timestamp: Any) -> str:
+    """Shard key ("YYYY-MM") of a record timestamp, UNDATED if it is not ISO."""
+    if isinstance(timestamp, str) and _MONTH.match(timestamp):
+        return timestamp[:7]
+    return UNDATED
+
+
+def timestamp_key(record: Mapping) -> str:
+    """Sort key of a record by creation time; records without an ISO timestamp sort first."""
+    timestamp = record.get("timestamp")
+    return timestamp if shard_key(timestamp) != UNDATED else ""
+
+
+def to_bound(value: Bound) -> Optional[str]:
+    """ISO string of a time bound (timestamps compare as text, like the stores sort them)."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def keys_between(keys: Iterable[str], since: Bound = None, until: Bound = None) -> List[str]:
+    """
+    Shard keys whose month can hold a timestamp in [since, until), ascending.
+
+    Undated records never match a bound, so the UNDATED shard is only kept
+    for unbounded queries.
+    """
+    since, until = to_bound(since), to_bound(until)
+    selected = []
+    for key in sorted(keys):
+        if since is None and until is None:
+            selected.append(key)
+        elif key != UNDATED and (since is None or key >= since[:7]) and (until is None or key <= until[:7]):
+            selected.append(key)
+    return selected
+
+
+def newest(records: Iterable[Mapping], limit: Optional[int] = None,
+           since: Bound = None, until: Bound = None) -> List:
+    """
+    Records with a timestamp in [since, until), newest first, at most limit.
+
+    Equal timestamps keep the given order. Without bounds, records that
+    have no ISO timestamp are included and sort last.
+    """
+    since, until = to_bound(since), to_bound(until)
+    if since is not None or until is not None:
+        records = [
+            r for r in records
+            if timestamp_key(r) and (since is None or timestamp_key(r) >= since)
+            and (until is None or timestamp_key(r) < until)
+        ]
+    ordered = sorted(records, key=timestamp_key, reverse=True)
+    return ordered if limit is None else ordered[:max(limit, 0)]
+
+
+def is_older(key: TimelineKey, cursor: TimelineKey) -> bool:
+    """Whether key comes after cursor in newest-first order (equal timestamps by seq)."""
+    return key[0] < cursor[0] or (key[0] == cursor[0] and key[1] > cursor[1])
+
+
+def encode_cursor(key: TimelineKey) -> str:
+    """Opaque page cursor pointing after the record with the given timeline key."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> TimelineKey:
+    """
+    Timeline key of a cursor from encode_cursor().
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        timestamp, seq, memory_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not (isinstance(timestamp, str) and isinstance(seq, int) and isinstance(memory_id, str)):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return timestamp, seq, memory_id
+
+
+def manifest_path(memory_dir: Path) -> Path:
+    return Path(memory_dir) / MANIFEST_FILE
+
+
+def shard_dir(memory_dir: Path, key: str) -> Path:
+    """Directory of one shard (memory/shards/2026-10)."""
+    return Path(memory_dir) / SHARDS_DIR / key
+
+
+def is_sharded(memory_dir: Path) -> bool:
+    """Whether a memory directory uses the sharded layout."""
+    return manifest_path(memory_dir).exists()
+
+
+def new_manifest() -> Dict[str, Any]:
+    return {"version": MANIFEST_VERSION, "field": "timestamp", "shards": {}}
+
+
+def load_manifest(memory_dir: Path) -> Optional[Dict[str, Any]]:
+    """Load the shard manifest (None if the directory is not sharded or it is unreadable)."""
+    try:
+        with open(manifest_path(memory_dir), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if manifest.get("version") != MANIFEST_VERSION or not isinstance(manifest.get("shards"), dict):
+        return None
+    return manifest
+
+
+def save_manifest(memory_dir: Path, manifest: Dict[str, Any]):
+    """Atomically write the shard manifest."""
+    path = manifest_path(memory_dir)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ShardChain(Mapping):
+    """Read-only mapping over the stores of several shards, oldest shard first."""
+
+    def __init__(self, stores: List[Mapping]):
+        self.stores = stores
+
+    def __getitem__(self, memory_id: str) -> Any:
+        for store in reversed(self.stores):
+            if memory_id in store:
+                return store[memory_id]
+        raise KeyError(memory_id)
+
+    def __contains__(self, memory_id: object) -> bool:
+        return any(memory_id in store for store in self.stores)
+
+    def __iter__(self) -> Iterator[str]:
+        for store in self.stores:
+            yield from store
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self.stores)
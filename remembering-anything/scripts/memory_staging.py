@@ -22,16 +22,20 @@ Memory Staging Area - 记忆暂存区
     # 提交记忆（写入正式记忆文件）
     python memory_staging.py commit
 
+    # 提交时把近似重复（如"住在北京"/"现在住在北京"）合并进已有记忆
+    python memory_staging.py commit --merge-similar
+
     # 清空暂存区（不提交）
     python memory_staging.py clear
 """
 
 import json
+import os
 import sys
 import argparse
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 # 路径配置
 SCRIPT_DIR = Path(__file__).parent
@@ -44,6 +48,13 @@ PROJECTS_DIR = USER_DATA_DIR / "memory" / "projects"
 (USER_DATA_DIR / "memory").mkdir(parents=True, exist_ok=True)
 PROJECTS_DIR.mkdir(parents=True, exist_ok=True)
 
+sys.path.insert(0, str(SCRIPT_DIR))
+from memory_lock import StoreLock, lock_path, temp_path
+
+# 暂存区的跨进程读写锁（.staging.lock，同时保存暂存区的代数）
+# 整个进程共用一个实例，嵌套加锁才不会自己等自己
+_STAGING_LOCK = StoreLock(lock_path(STAGING_FILE))
+
 # 类型到类别的默认映射
 DEFAULT_CATEGORIES = {
     "fact": "general",
@@ -60,19 +71,30 @@ PROJECT_TYPES = ["task", "completed", "decision", "pitfall"]
 
 def load_staging() -> List[Dict]:
     """加载暂存区数据"""
-    if not STAGING_FILE.exists():
-        return []
-    try:
-        with open(STAGING_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    return _read_staging()[0]
+
+
+def _read_staging() -> Tuple[List[Dict], int]:
+    """在共享锁下读取暂存区，返回 (条目, 读取时的代数)"""
+    with _STAGING_LOCK.shared() as lock:
+        generation = lock.generation()
+        if not STAGING_FILE.exists():
+            return [], generation
+        try:
+            with open(STAGING_FILE, "r", encoding="utf-8") as f:
+                return json.load(f), generation
+        except (json.JSONDecodeError, FileNotFoundError):
+            return [], generation
 
 
 def save_staging(items: List[Dict]):
-    """保存暂存区数据"""
-    with open(STAGING_FILE, "w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+    """保存暂存区数据（独占锁下原子替换，并递增代数）"""
+    with _STAGING_LOCK.exclusive() as lock:
+        tmp_path = temp_path(STAGING_FILE)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, STAGING_FILE)
+        lock.bump()
 
 
 def get_current_project_id() -> Optional[str]:
@@ -117,14 +139,56 @@ def add_to_staging(
     if mem_type in PROJECT_TYPES and not project and auto_detect_project:
         project = get_current_project_id()
 
-    items = load_staging()
+    items, generation = _read_staging()
+    entry, added = _stage(items, mem_type, content, category, tags, project, priority)
+    if not added:
+        return entry
+
+    with _STAGING_LOCK.exclusive() as lock:
+        if lock.generation() != generation:
+            # 读取之后其他会话写过暂存区：在最新内容上重做本次新增，不覆盖对方的条目
+            items = _read_staging()[0]
+            entry, added = _stage(items, mem_type, content, category, tags, project, priority)
+            if not added:
+                return entry
+        save_staging(items + [entry])
+    return entry
 
+
+def _stage(
+    items: List[Dict],
+    mem_type: str,
+    content: str,
+    category: Optional[str],
+    tags: Optional[List[str]],
+    project: Optional[str],
+    priority: Optional[str],
+) -> Tuple[Dict, bool]:
+    """
+    生成要加入暂存区的条目
+
+    Returns:
+        (条目, 是否新增)；重复时返回已有条目和 False
+    """
     # 检查重复（同项目同类型同内容视为重复）
     for item in items:
         if (item["content"].strip().lower() == content.strip().lower() and
             item["type"] == mem_type and
             item.get("project") == project):
-            return item  # 已存在，直接返回
+            return item, False  # 已存在，直接返回
+
+    # 近似重复只提示，不拦截（提交时再决定是否合并）
+    sys.path.insert(0, str(SCRIPT_DIR))
+    from memory_index import content_similarity, DEFAULT_SIMILARITY_THRESHOLD
+
+    similar_to = None
+    best = 0.0
+    for item in items:
+        if item["type"] != mem_type or item.get("project") != project:
+            continue
+        similarity = content_similarity(item["content"], content)
+        if similarity >= DEFAULT_SIMILARITY_THRESHOLD and similarity > best:
+            similar_to, best = item["content"], similarity
 
     entry = {
         "type": mem_type,
@@ -140,10 +204,11 @@ def add_to_staging(
         entry["project"] = project
     if priority and mem_type == "task":
         entry["priority"] = priority
+    if similar_to is not None:
+        entry["similar_to"] = similar_to
+        entry["similarity"] = round(best, 3)
 
-    items.append(entry)
-    save_staging(items)
-    return entry
+    return entry, True
 
 
 def list_staging() -> List[Dict]:
@@ -169,6 +234,13 @@ def _commit_project_item(item: Dict) -> None:
     safe_project_name = project.replace("/", "__")
     project_file = PROJECTS_DIR / f"{safe_project_name}.json"
 
+    # 读-改-写整个项目文件，期间持有该文件的独占锁
+    with StoreLock(lock_path(project_file)).exclusive():
+        _update_project_file(project_file, project, mem_type, content, item)
+
+
+def _update_project_file(project_file: Path, project: str, mem_type: str, content: str, item: Dict) -> None:
+    """把一条项目记忆写入项目文件（调用方持有锁）"""
     # 加载现有数据或创建新结构
     if project_file.exists():
         with open(project_file, "r", encoding="utf-8") as f:
@@ -226,19 +298,28 @@ def _commit_project_item(item: Dict) -> None:
     else:
         raise ValueError(f"Unknown project memory type: {mem_type}")
 
-    # 保存
-    with open(project_file, "w", encoding="utf-8") as f:
+    # 保存（原子替换）
+    tmp_path = temp_path(project_file)
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, project_file)
 
 
-def commit_staging() -> Dict:
+def commit_staging(merge_similar: bool = False, mm=None) -> Dict:
     """
     提交暂存区的所有记忆到正式记忆文件
 
+    与已有记忆近似重复的全局记忆会记录在 similar 中；merge_similar 为
+    True 时不新增，而是把标签合并进最相似的已有记忆。
+
+    Args:
+        merge_similar: 是否合并近似重复
+        mm: 使用的 MemoryManager（常驻进程传入自己的实例，默认新建）
+
     Returns:
         提交结果统计
     """
-    items = load_staging()
+    items, generation = _read_staging()
     if not items:
         return {"committed": 0, "message": "暂存区为空"}
 
@@ -246,72 +327,130 @@ def commit_staging() -> Dict:
     sys.path.insert(0, str(SCRIPT_DIR))
     from memory_manager import MemoryManager
 
-    mm = MemoryManager()
+    if mm is None:
+        mm = MemoryManager(merge_similar=merge_similar)
+        return _commit_items(mm, items, generation, merge_similar)
+
+    previous, mm.merge_similar = mm.merge_similar, merge_similar
+    try:
+        return _commit_items(mm, items, generation, merge_similar)
+    finally:
+        mm.merge_similar = previous
 
+
+def _commit_items(mm, items: List[Dict], generation: int, merge_similar: bool) -> Dict:
+    """把读到的暂存条目写入记忆，再从暂存区移除"""
     results = {
         "committed": 0,
         "facts": 0,
         "preferences": 0,
         "experiences": 0,
         "project_items": 0,
+        "skipped": 0,
+        "merged": 0,
+        "similar": [],
         "errors": []
     }
 
+    # 先查重复索引：已存在的全局记忆无需写入，直接跳过
+    pending = []
     for item in items:
-        try:
-            mem_type = item["type"]
-            content = item["content"]
-            category = item.get("category", "general")
-            tags = item.get("tags", [])
-            source = item.get("source", "conversation")
-
-            # 项目记忆
-            if mem_type in PROJECT_TYPES:
-                if not item.get("project"):
-                    raise ValueError("项目记忆必须指定 project 参数")
-                _commit_project_item(item)
-                results["project_items"] += 1
-
-            # 全局记忆
-            elif mem_type == "fact":
-                mm.add_fact(
-                    content=content,
-                    category=category,
-                    source=source,
-                    tags=tags
-                )
-                results["facts"] += 1
-
-            elif mem_type == "preference":
-                mm.add_preference(
-                    content=content,
-                    category=category,
-                    source=source,
-                    tags=tags
-                )
-                results["preferences"] += 1
-
-            elif mem_type == "experience":
-                mm.add_experience(
-                    content=content,
-                    category=category,
-                    source=source,
-                    tags=tags
-                )
-                results["experiences"] += 1
-
-            results["committed"] += 1
-
-        except Exception as e:
-            results["errors"].append(f"[{item['type']}] {item['content']}: {str(e)}")
-
-    # 清空暂存区
-    clear_staging()
+        mem_type = item.get("type")
+        if (mem_type in GLOBAL_TYPES and
+            mm.find_duplicate(mem_type, item.get("content", ""), item.get("category", "general"))):
+            results["skipped"] += 1
+            continue
+        pending.append(item)
+
+    # 批量提交：每个记忆文件只写一次
+    with mm.batch() as write_stats:
+        for item in pending:
+            try:
+                mem_type = item["type"]
+                content = item["content"]
+                category = item.get("category", "general")
+                tags = item.get("tags", [])
+                source = item.get("source", "conversation")
+
+                # 项目记忆
+                if mem_type in PROJECT_TYPES:
+                    if not item.get("project"):
+                        raise ValueError("项目记忆必须指定 project 参数")
+                    _commit_project_item(item)
+                    results["project_items"] += 1
+
+                # 全局记忆
+                elif mem_type == "fact":
+                    mm.add_fact(
+                        content=content,
+                        category=category,
+                        source=source,
+                        tags=tags
+                    )
+                    results["facts"] += 1
+
+                elif mem_type == "preference":
+                    mm.add_preference(
+                        content=content,
+                        category=category,
+                        source=source,
+                        tags=tags
+                    )
+                    results["preferences"] += 1
+
+                elif mem_type == "experience":
+                    mm.add_experience(
+                        content=content,
+                        category=category,
+                        source=source,
+                        tags=tags
+                    )
+                    results["experiences"] += 1
+
+                if mem_type in GLOBAL_TYPES and mm.last_similar:
+                    closest = mm.last_similar[0]
+                    results["similar"].append({
+                        "type": mem_type,
+                        "content": content,
+                        "similar_to": closest["content"],
+                        "similarity": closest["similarity"],
+                    })
+                    if merge_similar:
+                        # 已合并进旧记忆，不算新增
+                        results[mem_type + "s"] -= 1
+                        results["merged"] += 1
+                        continue
+
+                results["committed"] += 1
+
+            except Exception as e:
+                results["errors"].append(f"[{item['type']}] {item['content']}: {str(e)}")
+
+    results["writes"] = write_stats["writes"]
+
+    # 会话结束：把积压的访问记录写回记忆文件
+    mm.flush_access()
+
+    # 清空暂存区：只移除本次读到的条目，提交期间其他会话新加的保留
+    with _STAGING_LOCK.exclusive() as lock:
+        if lock.generation() == generation:
+            clear_staging()
+        else:
+            committed = {json.dumps(item, sort_keys=True) for item in items}
+            save_staging([item for item in _read_staging()[0]
+                          if json.dumps(item, sort_keys=True) not in committed])
 
     return results
 
 
-def main():
+def main(argv: Optional[List[str]] = None, mm=None):
+    """
+    命令行入口
+
+    Args:
+        argv: 命令行参数（默认 sys.argv[1:]）
+        mm: commit 使用的 MemoryManager（常驻进程传入自己的实例）
+    """
     parser = argparse.ArgumentParser(
         description='Memory Staging Area - 记忆暂存区管理',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -373,8 +512,13 @@ def main():
         action='store_true',
         help='以 JSON 格式输出'
     )
+    parser.add_argument(
+        '--merge-similar',
+        action='store_true',
+        help='提交时把近似重复合并进已有记忆（仅 commit）'
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.command == 'add':
         if not args.type or not args.content:
@@ -416,6 +560,8 @@ def main():
                 print(f"[+] 已添加到暂存区: [{entry['type']}@{project_display}] {entry['content']}")
             else:
                 print(f"[+] 已添加到暂存区: [{entry['type']}] {entry['content']}")
+            if entry.get("similar_to"):
+                print(f"[~] 与暂存区中的「{entry['similar_to']}」相似 ({entry['similarity']:.2f})")
 
     elif args.command == 'list':
         items = list_staging()
@@ -447,12 +593,15 @@ def main():
                 print()
 
     elif args.command == 'commit':
-        result = commit_staging()
+        result = commit_staging(merge_similar=args.merge_similar, mm=mm)
 
         if args.json:
             print(json.dumps(result, ensure_ascii=False))
         else:
-            if result["committed"] == 0:
+            # 有错误时总是输出完整结果，失败的条目不能被简短提示掩盖
+            if result["committed"] == 0 and not result["errors"] and (result.get("skipped") or result.get("merged")):
+                print(f"暂存区的 {result['skipped'] + result['merged']} 条记忆均已存在，无需提交")
+            elif result["committed"] == 0 and not result["errors"]:
                 print("暂存区为空，无需提交")
             else:
                 print(f"\n[v] 已提交 {result['committed']} 条记忆:")
@@ -464,6 +613,15 @@ def main():
                     print(f"    - 经历: {result['experiences']} 条")
                 if result["project_items"]:
                     print(f"    - 项目记忆: {result['project_items']} 条")
+                if result.get("skipped"):
+                    print(f"    - 已存在跳过: {result['skipped']} 条")
+                if result.get("merged"):
+                    print(f"    - 近似重复已合并: {result['merged']} 条")
+
+                if result["similar"] and not result.get("merged"):
+                    print(f"\n[~] 与已有记忆相似 ({len(result['similar'])} 条，可用 --merge-similar 合并):")
+                    for item in result["similar"]:
+                        print(f"    - {item['content']} ≈ {item['similar_to']} ({item['similarity']:.2f})")
 
                 if result["errors"]:
                     print(f"\n[!] 错误 ({len(result['errors'])} 条):")
@@ -487,4 +645,9 @@ def main():
 
 
 if __name__ == "__main__":
+    # 有常驻进程（memory_daemon）时交给它执行
+    from memory_daemon import forward
+    exit_code = forward("memory_staging", sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
     main()
@@ -0,0 +1,2448 @@
+"""
+Storage backends for MemoryManager.
+
+A backend persists the three memory stores (fact, preference, experience)
+and answers the queries MemoryManager needs. Two backends are available:
+
+- JsonStorage: facts.json / preferences.json / experiences.json snapshots
+  with an append-only journal (default); the snapshots may also be kept as
+  JSON Lines with an offset index (store_format "jsonl")
+- ShardedStorage: the same stores split into one JsonStorage per month of
+  the records' timestamp (see memory_shards), used when shards.json exists
+- SqliteStorage: a single memory.db using stdlib sqlite3, with indexes on
+  status, category, importance and timestamp and tag join tables
+
+The backend is chosen by the "backend" key in metadata.json (written by
+migrate_json_to_sqlite) or explicitly via create_storage(backend=...), the
+JSON snapshot format by the "store_format" key (written by
+convert_store_format).
+"""
+
+import json
+import os
+import heapq
+import shutil
+import sqlite3
+from contextlib import contextmanager, ExitStack
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Callable
+
+from memory_schema import get_current_timestamp, compact_records, to_epoch_micros, EPOCH_FIELDS
+from memory_columns import ColumnarView
+import memory_journal
+import memory_jsonl
+import memory_mmap
+import memory_shards
+import memory_rank
+from memory_lock import StoreLock, lock_path, temp_path
+from memory_vectors import VectorIndex
+from memory_journal import OP_ADD, OP_UPDATE, OP_DEPRECATE, OP_DELETE, make_op
+from memory_index import (
+    IndexSet, NgramIndex, matches_query, record_tags, load_index_file, save_index_file,
+    load_core_view, save_core_view, index_files, core_view_path, PROMOTE_ACCESS_COUNT,
+    similarity_shingles, shingle_similarity,
+)
+
+MEMORY_TYPES = ("fact", "preference", "experience")
+
+STORE_FILES = {
+    "fact": "facts.json",
+    "preference": "preferences.json",
+    "experience": "experiences.json",
+}
+
+SQLITE_FILE = "memory.db"
+
+BACKENDS = ("json", "sqlite")
+
+# Snapshot formats of the JSON backend
+STORE_FORMATS = ("json", "jsonl")
+
+# Searches of a store answered by a scan before its n-gram index is read
+# (reading the postings costs about as much as ten scans)
+SEARCH_SCANS_BEFORE_INDEX = 10
+
+# Recomputes a change's ops from the current store, for writes that found
+# the store changed by another process since it was read
+Rebuild = Callable[[], List[Dict]]
+
+
+def store_file_name(memory_type: str, store_format: str = "json") -> str:
+    """Snapshot file name of a store in the given format (facts.json / facts.jsonl)."""
+    name = STORE_FILES[memory_type]
+    if store_format == "jsonl":
+        return Path(name).stem + memory_jsonl.JSONL_SUFFIX
+    return name
+
+
+def normalize_content(content: str) -> str:
+    """Normalize content for duplicate detection."""
+    return content.strip().lower()
+
+
+def merge_similar(results: List[List[Tuple[Dict, float]]], k: int) -> List[Tuple[Dict, float]]:
+    """Top k of several best-first (record, similarity) lists; ties keep list order."""
+    entries = ((score, -source, -position, memory)
+               for source, ranked in enumerate(results)
+               for position, (memory, score) in enumerate(ranked))
+    return [(memory, score) for score, _, _, memory in heapq.nlargest(k, entries, key=lambda e: e[:3])]
+
+
+def context_rank(memory: Dict, matched: int) -> Tuple[int, int, str]:
+    """
+    Ranking key of query_by_context (higher is better).
+
+    Number of matched tags first, then access_count, then recency
+    (last access, or creation if never accessed).
+    """
+    recency = memory.get("last_accessed") or memory.get("timestamp") or ""
+    return (matched, memory.get("access_count", 0) or 0, recency)
+
+
+class MemoryStorage:
+    """
+    Base class for storage backends.
+
+    Subclasses must implement load(), apply() and get_metadata(). The query
+    methods here scan load() and define the reference semantics that
+    indexed backends have to reproduce.
+    """
+
+    backend_name = ""
+
+    def load(self, memory_type: str) -> Dict[str, Dict]:
+        """Load all records of a type as an id -> record dict (insertion order)."""
+        raise NotImplementedError
+
+    def apply(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None):
+        """
+        Persist journal-style operations (see memory_journal) for a type.
+
+        Args:
+            memory_type: Store to write
+            ops: Operations computed from what the caller read
+            rebuild: Recomputes the ops if another process changed the
+                store since it was read (ops depending on read values,
+                such as counters); without it the same ops are applied
+                to the newer store
+        """
+        raise NotImplementedError
+
+    def get_metadata(self) -> Dict[str, Any]:
+        """Get store metadata (created, last_updated, version, ...)."""
+        raise NotImplementedError
+
+    @contextmanager
+    def batch(self) -> Iterator[Dict[str, Any]]:
+        """Group mutations into one unit of work (no-op by default)."""
+        yield {}
+
+    def compact(self) -> Dict[str, int]:
+        """Fold pending write logs into the main store (no-op by default)."""
+        return {}
+
+    def record_access(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None):
+        """
+        Persist access_count / last_accessed updates.
+
+        Backends may write these behind (see JsonStorage); reads must still
+        see them. By default they are applied like any other update.
+        """
+        self.apply(memory_type, ops, rebuild)
+
+    def flush_access(self) -> Dict[str, int]:
+        """Write pending access updates into the stores (no-op by default)."""
+        return {}
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Get I/O counters."""
+        return {}
+
+    def clear_cache(self):
+        """Drop cached data (no-op by default)."""
+
+    def close(self):
+        """Release backend resources."""
+
+    # ========== Query primitives ==========
+
+    def get(self, memory_type: str, memory_id: str) -> Optional[Dict]:
+        """Get a record by id."""
+        return self.load(memory_type).get(memory_id)
+
+    def find_duplicate(self, memory_type: str, content: str, category: str) -> Optional[str]:
+        """Get the id of an active record with the same normalized content and category."""
+        normalized = normalize_content(content)
+        for existing_id, existing in self.load(memory_type).items():
+            if (existing["status"] == "active" and
+                normalize_content(existing["content"]) == normalized and
+                existing["category"] == category):
+                return existing_id
+        return None
+
+    def find_similar(self, memory_type: str, content: str, category: str,
+                     threshold: float) -> List[Tuple[str, float]]:
+        """
+        Get active records of the category whose content is similar to content.
+
+        Similarity is memory_index.content_similarity (Jaccard over
+        shingles); exact duplicates score 1.0.
+
+        Returns:
+            (id, similarity) pairs with similarity >= threshold, most
+            similar first; ties keep insertion order
+        """
+        shingles = similarity_shingles(content)
+        matches = []
+        for memory in self.select(memory_type, "active", category):
+            similarity = shingle_similarity(shingles, similarity_shingles(memory["content"]))
+            if similarity >= threshold:
+                matches.append((memory["id"], similarity))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def select(
+        self,
+        memory_type: str,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+        importance: Optional[str] = None,
+    ) -> List[Dict]:
+        """Get records matching the given filters, in insertion order."""
+        results = []
+        for memory in self.load(memory_type).values():
+            if status is not None and memory["status"] != status:
+                continue
+            if category is not None and memory["category"] != category:
+                continue
+            if importance is not None and memory.get("importance") != importance:
+                continue
+            results.append(memory)
+        return results
+
+    def recent(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Get records newest first by timestamp (see memory_shards.newest).
+
+        Args:
+            memory_type: fact, preference or experience
+            limit: Maximum number of records (all if None)
+            since: Keep records created at or after this
+            until: Keep records created before this
+            status, category: Filters as in select()
+        """
+        return memory_shards.newest(self.select(memory_type, status, category), limit, since, until)
+
+    def timeline(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        after: Optional[memory_shards.TimelineKey] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[memory_shards.TimelineKey, Dict]]:
+        """
+        Get active records in recent() order together with their timeline keys.
+
+        Args:
+            memory_type: fact, preference or experience
+            limit: Maximum number of records (all if None)
+            after: Only records after this key (from a cursor)
+            since, until, category: As in recent()
+        """
+        records = list(self.load(memory_type).values())
+        positions = {memory["id"]: seq for seq, memory in enumerate(records)}
+        keyed = [((memory_shards.timestamp_key(memory), seq, memory["id"]), memory)
+                 for seq, memory in enumerate(records)
+                 if memory["status"] == "active" and (category is None or memory["category"] == category)]
+        since, until = memory_shards.to_bound(since), memory_shards.to_bound(until)
+        if since is not None or until is not None:
+            keyed = [(key, memory) for key, memory in keyed if key[0] and
+                     (since is None or key[0] >= since) and (until is None or key[0] < until)]
+        if after is not None:
+            after = (after[0], positions.get(after[2], after[1]), after[2])
+            keyed = [(key, memory) for key, memory in keyed if memory_shards.is_older(key, after)]
+        keyed.sort(key=lambda entry: entry[0][1])
+        keyed.sort(key=lambda entry: entry[0][0], reverse=True)
+        return keyed if limit is None else keyed[:max(limit, 0)]
+
+    def page(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        category: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get one page of active records, newest first.
+
+        Args:
+            memory_type: fact, preference or experience
+            limit: Page size (everything after the cursor if None)
+            cursor: next_cursor of the previous page (first page if None)
+            since, until, category: As in recent()
+
+        Returns:
+            (records, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        after = memory_shards.decode_cursor(cursor) if cursor else None
+        entries = self.timeline(memory_type, None if limit is None else max(limit, 0) + 1,
+                                after, since, until, category)
+        if limit is None or len(entries) <= limit:
+            return [memory for _, memory in entries], None
+        entries = entries[:max(limit, 0)]
+        next_cursor = memory_shards.encode_cursor(entries[-1][0]) if entries else cursor
+        return [memory for _, memory in entries], next_cursor
+
+    def search(self, query: str, memory_types: List[str]) -> List[Dict]:
+        """Get active records whose content or a tag contains query (case-insensitive)."""
+        results = []
+        query_lower = query.lower()
+        for memory_type in memory_types:
+            for memory in self.load(memory_type).values():
+                if memory["status"] != "active":
+                    continue
+
+                # Search in content and tags
+                if matches_query(memory, query_lower):
+                    results.append(memory)
+        return results
+
+    def search_ranked(self, query: str, memory_types: List[str],
+                      top_k: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """
+        Rank active records of the given types by BM25 (see memory_rank).
+
+        The default builds n-gram statistics from a scan of load().
+
+        Returns:
+            (record, score) pairs, best first; ties keep type then insertion order
+        """
+        sources = []
+        for memory_type in memory_types:
+            data = self.load(memory_type)
+            indexes = IndexSet([NgramIndex()])
+            indexes.build(data)
+            sources.append((data, indexes))
+        return memory_rank.rank_bm25(query, sources, top_k)
+
+    def semantic_search(self, query: str, memory_types: List[str], k: int) -> List[Tuple[Dict, float]]:
+        """
+        Get the k active records closest to query by hashed n-gram TF-IDF cosine.
+
+        The default builds a throwaway VectorIndex per type from load().
+
+        Returns:
+            (record, similarity) pairs, most similar first; ties keep type order
+        """
+        results = []
+        for memory_type in memory_types:
+            data = self.load(memory_type)
+            index = VectorIndex()
+            index.ensure(data)
+            results.append([(data[memory_id], score) for memory_id, score in index.search(query, k)])
+        return merge_similar(results, k)
+
+    def query_by_context(self, context_tags: List[str], limit: int) -> List[Dict]:
+        """
+        Get the top `limit` active records sharing a tag or context tag.
+
+        Ranked by context_rank(); ties keep type then insertion order.
+        """
+        if limit <= 0:
+            return []
+        wanted = set(context_tags)
+
+        def scored():
+            for memory_type in MEMORY_TYPES:
+                for memory in self.load(memory_type).values():
+                    if memory["status"] != "active":
+                        continue
+                    matched = len(wanted.intersection(record_tags(memory)))
+                    if matched:
+                        yield context_rank(memory, matched), memory
+
+        # nlargest is stable, so equal keys keep scan order
+        return [memory for _, memory in heapq.nlargest(limit, scored(), key=lambda x: x[0])]
+
+    def transition_candidates(
+        self,
+        memory_type: str,
+        active_before: datetime,
+        contextual_before: datetime,
+    ) -> List[Dict]:
+        """
+        Get active records whose importance may change, in insertion order.
+
+        A superset is fine: auto_maintain_importance re-checks its rules on
+        every candidate. The default evaluates the rules on columns().
+
+        Args:
+            memory_type: fact, preference or experience
+            active_before: Active memories last used before this are demoted;
+                frequently used ones after it are promoted
+            contextual_before: Contextual memories last used before this are archived
+        """
+        data = self.load(memory_type)
+        view = self.columns(memory_type)
+        rows = view.transition_rows(active_before, contextual_before, PROMOTE_ACCESS_COUNT)
+        return [data[view.ids[i]] for i in rows]
+
+    def columns(self, memory_type: str) -> ColumnarView:
+        """Columnar view of a store's metadata (built on every call by default)."""
+        return ColumnarView(self.load(memory_type))
+
+    def count(self, memory_type: str, status: Optional[str] = None) -> int:
+        """Count records, optionally only those with a given status."""
+        memories = self.load(memory_type)
+        if status is None:
+            return len(memories)
+        return len([m for m in memories.values() if m["status"] == status])
+
+    def categories(self, memory_type: str) -> List[str]:
+        """Get all unique categories of a type, sorted."""
+        return sorted(set(m["category"] for m in self.load(memory_type).values()))
+
+
+class JsonStorage(MemoryStorage):
+    """JSON snapshot files with an append-only journal, read cache and batching."""
+
+    backend_name = "json"
+
+    def __init__(
+        self,
+        memory_dir: Path,
+        journal: bool = True,
+        journal_threshold: int = memory_journal.DEFAULT_COMPACT_BYTES,
+        access_flush_bytes: int = memory_journal.DEFAULT_ACCESS_FLUSH_BYTES,
+        access_flush_seconds: int = memory_journal.DEFAULT_ACCESS_FLUSH_SECONDS,
+        store_format: Optional[str] = None,
+        metadata_file: Optional[Path] = None,
+    ):
+        """
+        Initialize JSON storage.
+
+        Args:
+            memory_dir: Memory directory
+            journal: Record mutations in an append-only journal instead of
+                rewriting the whole store file on every change
+            journal_threshold: Journal size in bytes that triggers compaction
+            access_flush_bytes: Access log size in bytes that triggers a flush
+            access_flush_seconds: Age in seconds of the oldest pending access
+                update that triggers a flush
+            store_format: Snapshot format, "json" or "jsonl"; read from
+                metadata.json if None
+            metadata_file: metadata.json to keep last_updated in
+                (memory_dir/metadata.json if None; shards share the root one)
+        """
+        self.memory_dir = Path(memory_dir)
+        self.memory_dir.mkdir(parents=True, exist_ok=True)
+
+        if store_format is None:
+            store_format = read_store_format(self.memory_dir)
+        if store_format not in STORE_FORMATS:
+            raise ValueError(f"Unknown store format: {store_format}")
+        self.store_format = store_format
+
+        self.files = {t: self.memory_dir / store_file_name(t, store_format) for t in STORE_FILES}
+        self.metadata_file = Path(metadata_file) if metadata_file else self.memory_dir / "metadata.json"
+        self._store_files = tuple(self.files.values())
+
+        self.use_journal = journal
+        self.journal_threshold = journal_threshold
+        self.access_flush_bytes = access_flush_bytes
+        self.access_flush_seconds = access_flush_seconds
+
+        # Parsed-file cache: path -> (signature, data)
+        self._cache: Dict[Path, Tuple[Any, Dict]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Cross-process locks of the store files, the generation each cached
+        # store is at and the generation each store was last read at by any
+        # path, streaming reads included (see memory_lock)
+        self._locks: Dict[Path, StoreLock] = {}
+        self._generations: Dict[Path, int] = {}
+        self._read_generations: Dict[Path, int] = {}
+        self.stale_writes = 0
+        # Journal bytes already applied to each cached store
+        self._journal_offsets: Dict[Path, int] = {}
+
+        # Secondary indexes of each store, kept in step with its cache entry
+        self._indexes: Dict[Path, IndexSet] = {}
+        # Columnar views: path -> (indexes, generation, view) it was built at
+        self._columns: Dict[Path, Tuple[IndexSet, int, ColumnarView]] = {}
+        # Searches of each store answered by a scan instead of the n-gram index
+        self._scans: Dict[Path, int] = {}
+
+        # Unit-of-work state for batch(): path -> data awaiting a write
+        self._batch_depth = 0
+        self._dirty: Dict[Path, Dict] = {}
+        self._pending_ops: Dict[Path, List[Dict]] = {}
+        self._pending_access: Dict[Path, List[Dict]] = {}
+        # Every buffered change as (is_access, rebuild), to redo it on a newer store
+        self._pending_builds: Dict[Path, List[Tuple[bool, Rebuild]]] = {}
+        self._flush_access_on_exit = False
+        self._batch_saves = 0
+        self.write_count = 0
+        self.last_batch_stats: Optional[Dict[str, Any]] = None
+
+        self._ensure_files()
+
+    def _ensure_files(self):
+        """Ensure all memory files exist."""
+        for file_path in self._store_files:
+            if not file_path.exists():
+                with self._lock(file_path).exclusive() as lock:
+                    if not file_path.exists():
+                        # Keep whatever an orphaned journal holds
+                        self._save_json(file_path, self._load_json(file_path))
+                        self._generations[file_path] = self._read_generations[file_path] = lock.bump()
+
+        if not self.metadata_file.exists():
+            self._save_json(self.metadata_file, {
+                "created": get_current_timestamp(),
+                "last_updated": get_current_timestamp(),
+                "version": "1.0"
+            })
+
+    @staticmethod
+    def _file_signature(file_path: Path) -> Optional[Tuple[int, int]]:
+        """Return (mtime_ns, size) of a file, or None if it does not exist."""
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _signature(self, file_path: Path) -> Optional[Tuple]:
+        """Cache validation key: store files also depend on their journal and access log."""
+        signature = self._file_signature(file_path)
+        if file_path not in self._store_files:
+            return signature
+
+        journal_signature = self._file_signature(memory_journal.journal_path(file_path))
+        access_signature = self._file_signature(memory_journal.access_log_path(file_path))
+        if signature is None and journal_signature is None and access_signature is None:
+            return None
+        return (signature, journal_signature, access_signature)
+
+    def _load_json(self, file_path: Path) -> Dict:
+        """
+        Load JSON file, reusing the parsed dict while the file is unchanged.
+
+        The cache entry is validated against the file's (mtime_ns, size), so a
+        write from another process forces a reload. Store files are returned
+        with their journal replayed; if another process only appended to the
+        journal or access log, just the new lines are applied (_catch_up).
+        """
+        if file_path in self._dirty:
+            return self._dirty[file_path]
+
+        signature = self._signature(file_path)
+        if signature is None:
+            self._cache.pop(file_path, None)
+            if file_path in self._store_files:
+                self._indexes[file_path] = IndexSet()
+            return {}
+
+        cached = self._cache.get(file_path)
+        if cached is not None and cached[0] == signature:
+            self.cache_hits += 1
+            if file_path in self._generations:
+                self._read_generations[file_path] = self._generations[file_path]
+            return cached[1]
+
+        self.cache_misses += 1
+        if file_path in self._store_files:
+            # Shared lock: no writer is halfway through a compaction
+            with self._reading(file_path):
+                signature = self._signature(file_path)
+                self._generations[file_path] = self._read_generations[file_path]
+                data = self._catch_up(file_path, cached, signature)
+                if data is None:
+                    data = self._load_store(file_path)
+        else:
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._cache.pop(file_path, None)
+                return {}
+
+        self._cache[file_path] = (signature, data)
+        return data
+
+    def _load_store(self, file_path: Path) -> Dict:
+        """Load snapshot and indexes, then replay the journal onto both."""
+        before = self._file_signature(file_path)
+        data = memory_journal.load_snapshot(file_path)
+        after = self._file_signature(file_path)
+
+        indexes = load_index_file(file_path, data, after) if before == after else None
+        if indexes is None:
+            indexes = IndexSet()
+            indexes.build(data)
+            if before == after and after is not None:
+                save_index_file(file_path, indexes, after)
+        if before == after and after is not None and memory_mmap.binary_signature(file_path) != after:
+            memory_mmap.write_binary(file_path, data, after)
+
+        ops, self._journal_offsets[file_path] = memory_journal.read_ops_from(file_path, 0)
+        for op in ops:
+            indexes.apply_op(data, op)
+        for op in memory_journal.read_access(file_path):
+            indexes.apply_op(data, op)
+
+        self._indexes[file_path] = indexes
+        return data
+
+    def _catch_up(self, file_path: Path, cached: Optional[Tuple[Any, Dict]], signature: Tuple) -> Optional[Dict]:
+        """
+        Bring a cached store up to date by applying the journal lines other
+        processes appended since it was loaded, then the access log.
+
+        Returns:
+            The updated store dict, or None if it has to be reloaded (a new
+            snapshot, a shorter journal, or changes of this instance that
+            are not written yet)
+        """
+        offset = self._journal_offsets.get(file_path)
+        if (cached is None or offset is None or cached[0][0] != signature[0] or
+                file_path in self._pending_access or file_path not in self._indexes):
+            return None
+        ops, end = memory_journal.read_ops_from(file_path, offset)
+        if end is None:
+            return None
+
+        data, indexes = cached[1], self._indexes[file_path]
+        for op in ops:
+            indexes.apply_op(data, op)
+        # Access updates carry absolute values, so replaying the whole log is safe
+        for op in memory_journal.read_access(file_path):
+            indexes.apply_op(data, op)
+        self._journal_offsets[file_path] = end
+        return data
+
+    def _write_json(self, file_path: Path, data: Dict):
+        """Write JSON file to disk and refresh its cache entry."""
+        self._cache.pop(file_path, None)
+        if file_path in self._store_files:
+            # A full snapshot supersedes the journal
+            memory_journal.compact(file_path, data)
+            self._journal_offsets[file_path] = 0
+            snapshot_signature = self._file_signature(file_path)
+            memory_mmap.write_binary(file_path, data, snapshot_signature)
+            if file_path in self._indexes:
+                save_index_file(file_path, self._indexes[file_path], snapshot_signature)
+        else:
+            tmp_path = temp_path(file_path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, file_path)
+        self.write_count += 1
+
+        signature = self._signature(file_path)
+        if signature is not None:
+            self._cache[file_path] = (signature, data)
+            self._save_core_view(file_path, data, signature)
+
+    def _append_journal(self, file_path: Path, data: Dict, ops: List[Dict]):
+        """Append ops to a store journal, compacting once it is large enough."""
+        self._cache.pop(file_path, None)
+        memory_journal.append_ops(file_path, ops)
+        self._journal_offsets[file_path] = memory_journal.journal_size(file_path)
+        self.write_count += 1
+
+        if memory_journal.journal_size(file_path) >= self.journal_threshold:
+            self._write_json(file_path, data)
+            return
+
+        signature = self._signature(file_path)
+        if signature is not None:
+            self._cache[file_path] = (signature, data)
+            self._save_core_view(file_path, data, signature)
+
+    def _save_core_view(self, file_path: Path, data: Dict, signature: Tuple):
+        """Rewrite the core view of a store after it was written."""
+        indexes = self._indexes.get(file_path)
+        if file_path not in self._store_files or indexes is None:
+            return
+        core_ids = indexes["layer"].lookup(status="active", importance="core")
+        # Stamped without the access log, which is overlaid when reading
+        save_core_view(file_path, [data[i] for i in indexes.ordered(core_ids)], signature[:2])
+
+    def _read_core_view(self, file_path: Path) -> Optional[List[Dict]]:
+        """Get active core records from the core view if the store is not loaded."""
+        if file_path in self._dirty or file_path in self._pending_access:
+            return None
+        signature = self._signature(file_path)
+        cached = self._cache.get(file_path)
+        if signature is None or (cached is not None and cached[0] == signature):
+            return None
+        records = load_core_view(file_path, signature[:2])
+        if records is None:
+            return None
+
+        by_id = {memory["id"]: memory for memory in records}
+        for op in memory_journal.read_access(file_path):
+            if op.get("id") in by_id:
+                by_id[op["id"]].update(op.get("fields", {}))
+        return records
+
+    def _append_access(self, file_path: Path, data: Dict, ops: List[Dict]):
+        """Append access updates to the access log, flushing it past the thresholds."""
+        self._cache.pop(file_path, None)
+        memory_journal.append_access(file_path, ops)
+        self.write_count += 1
+
+        if self._access_flush_due(file_path):
+            self._fold_access(file_path, data)
+            return
+
+        signature = self._signature(file_path)
+        if signature is not None:
+            self._cache[file_path] = (signature, data)
+
+    def _access_flush_due(self, file_path: Path) -> bool:
+        if memory_journal.access_log_size(file_path) >= self.access_flush_bytes:
+            return True
+        started = memory_journal.access_log_started(file_path)
+        if not started:
+            return False
+        try:
+            age = datetime.now() - datetime.fromisoformat(started)
+        except ValueError:
+            return True
+        return age.total_seconds() >= self.access_flush_seconds
+
+    def _fold_access(self, file_path: Path, data: Dict) -> int:
+        """Move the access log of a store into its journal (or snapshot)."""
+        ops = memory_journal.read_access(file_path)
+        if not ops:
+            return 0
+
+        if self.use_journal:
+            self._append_journal(file_path, data, ops)
+        else:
+            self._write_json(file_path, data)
+        memory_journal.drop_access_log(file_path)
+
+        self._cache.pop(file_path, None)
+        signature = self._signature(file_path)
+        if signature is not None:
+            self._cache[file_path] = (signature, data)
+        return len(ops)
+
+    def _touch_metadata(self):
+        """Update last_updated in metadata."""
+        metadata = self._load_json(self.metadata_file)
+        metadata["last_updated"] = get_current_timestamp()
+        self._write_json(self.metadata_file, metadata)
+
+    def _save_json(self, file_path: Path, data: Dict):
+        """Save JSON file (deferred until the batch ends inside batch())."""
+        if self._batch_depth:
+            self._dirty[file_path] = data
+            self._batch_saves += 1
+            return
+
+        self._write_json(file_path, data)
+
+        # Update metadata
+        if file_path != self.metadata_file:
+            self._touch_metadata()
+
+    def _commit(self, file_path: Path, data: Dict, ops: List[Dict], rebuild: Optional[Rebuild] = None):
+        """
+        Persist mutations that were already applied to a loaded store dict.
+
+        With the journal enabled only the ops are appended; otherwise the
+        whole store is rewritten. Either way the write goes through
+        _write_store, which redoes the mutation if the store is stale.
+
+        Args:
+            file_path: Store file the dict was loaded from
+            data: Store dict (as returned by _load_json) after the mutation
+            ops: Journal operations describing the mutation
+            rebuild: Recomputes the ops on a newer store (the same ops if None)
+        """
+        build = (False, rebuild or (lambda: ops))
+        if self._batch_depth:
+            self._dirty[file_path] = data
+            if self.use_journal:
+                self._pending_ops.setdefault(file_path, []).extend(ops)
+            self._pending_builds.setdefault(file_path, []).append(build)
+            self._batch_saves += 1
+            return
+
+        self._write_store(file_path, data, ops if self.use_journal else None, [], [build])
+        self._touch_metadata()
+
+    # ========== Cross-process writes ==========
+
+    def _lock(self, file_path: Path) -> StoreLock:
+        lock = self._locks.get(file_path)
+        if lock is None:
+            lock = self._locks[file_path] = StoreLock(lock_path(file_path))
+        return lock
+
+    @contextmanager
+    def _reading(self, file_path: Path) -> Iterator[None]:
+        """Hold a store's reader lock, noting the generation that is read."""
+        with self._lock(file_path).shared() as lock:
+            self._read_generations[file_path] = lock.generation()
+            yield
+
+    def read_generation(self, memory_type: str) -> Optional[int]:
+        """Generation a store was last read at by this instance (None if never)."""
+        return self._read_generations.get(self.files[memory_type])
+
+    def _stale(self, file_path: Path) -> bool:
+        """Whether another process wrote a store since this instance read it (lock held)."""
+        cached = self._cache.get(file_path)
+        if cached is None or cached[0] != self._signature(file_path):
+            return True
+        return self._lock(file_path).generation() != self._generations.get(file_path)
+
+    def _rebase(self, file_path: Path, builds: List[Tuple[bool, Rebuild]]) -> Tuple[Dict, List[Dict], List[Dict]]:
+        """
+        Reload a stale store and redo this instance's buffered changes on it.
+
+        Returns:
+            (store dict, journal ops, access ops) of the redone changes
+        """
+        if builds:
+            self.stale_writes += 1
+        self._cache.pop(file_path, None)
+        data = self._load_json(file_path)
+        indexes = self._indexes[file_path]
+        ops: List[Dict] = []
+        access: List[Dict] = []
+        for is_access, build in builds:
+            for op in build():
+                indexes.apply_op(data, op)
+                (access if is_access else ops).append(op)
+        return data, ops, access
+
+    def _prepare(self, file_path: Path, ops: List[Dict], rebuild: Optional[Rebuild],
+                 read_at: Optional[int] = None) -> Tuple[Dict, IndexSet, List[Dict]]:
+        """
+        Bring a store up to date before applying ops to it.
+
+        The ops were computed from what the caller read earlier, at read_at
+        (by default the generation of this instance's last read). If another
+        process wrote the store since, its changes are applied first (usually
+        just the journal lines it appended) and the ops are rebuilt on top.
+        Outside batch() the writer lock must be held.
+
+        Returns:
+            (store dict, indexes, ops to write)
+        """
+        seen = self._read_generations.get(file_path) if read_at is None else read_at
+        data = self._load_json(file_path) if self._batch_depth else self._current(file_path)
+        if seen is not None and self._read_generations.get(file_path) != seen:
+            self.stale_writes += 1
+            if rebuild is not None:
+                ops = rebuild()
+        return data, self._indexes[file_path], ops
+
+    def _current(self, file_path: Path) -> Dict:
+        """The store as it is on disk (lock held)."""
+        data = self._load_json(file_path)
+        if self._stale(file_path):
+            # Same file signature but a newer generation: reload to be sure
+            data = self._rebase(file_path, [])[0]
+        return data
+
+    def _write_store(self, file_path: Path, data: Dict, ops: Optional[List[Dict]], access: List[Dict],
+                     builds: List[Tuple[bool, Rebuild]]):
+        """
+        Write changes of a store under its exclusive lock.
+
+        ops are appended to the journal (None rewrites the snapshot from
+        data, which then also holds the access updates) and access to the
+        access log. If another process wrote the store after this instance
+        read it, the store is reloaded and builds are run again on it, so
+        only this instance's delta is written on top of the other writes.
+        """
+        with self._lock(file_path).exclusive() as lock:
+            if self._stale(file_path):
+                data, rebuilt, access = self._rebase(file_path, builds)
+                if ops is not None:
+                    ops = rebuilt
+            if ops is None:
+                self._write_json(file_path, data)
+            else:
+                if ops:
+                    self._append_journal(file_path, data, ops)
+                if access:
+                    self._append_access(file_path, data, access)
+            self._generations[file_path] = self._read_generations[file_path] = lock.bump()
+
+    @contextmanager
+    def batch(self) -> Iterator[Dict[str, Any]]:
+        """
+        Group mutations into a single unit of work.
+
+        Inside the block every save is buffered in memory; on exit each dirty
+        store file is written once and metadata is updated once. If the block
+        raises, buffered changes are discarded. Batches may be nested; only
+        the outermost one writes.
+
+        Yields:
+            Stats dict filled in on exit: saves (buffered save calls), writes
+            (files actually written) and files (names of written files)
+        """
+        stats: Dict[str, Any] = {}
+        if self._batch_depth == 0:
+            self._batch_saves = 0
+        self._batch_depth += 1
+        try:
+            yield stats
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._discard_batch()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            stats.update(self._flush_batch())
+            self.last_batch_stats = stats
+
+    def _flush_batch(self) -> Dict[str, Any]:
+        """Write every dirty file once, then metadata once."""
+        writes_before = self.write_count
+        dirty, self._dirty = self._dirty, {}
+        pending_ops, self._pending_ops = self._pending_ops, {}
+        pending_access, self._pending_access = self._pending_access, {}
+        pending_builds, self._pending_builds = self._pending_builds, {}
+        flush_access, self._flush_access_on_exit = self._flush_access_on_exit, False
+        metadata = dirty.pop(self.metadata_file, None)
+
+        access_files = []
+        for file_path in dict.fromkeys(list(dirty) + list(pending_access)):
+            if file_path in dirty:
+                # Not journaled: a full rewrite, which already contains the access updates
+                data, ops = dirty[file_path], pending_ops.get(file_path)
+            else:
+                data, ops = self._load_json(file_path), []
+            access = pending_access.get(file_path, []) if ops is not None else []
+            self._write_store(file_path, data, ops, access, pending_builds.get(file_path, []))
+            if access:
+                access_files.append(memory_journal.access_log_path(file_path).name)
+
+        if flush_access:
+            self.flush_access()
+
+        if dirty or metadata is not None:
+            if metadata is None:
+                metadata = self._load_json(self.metadata_file)
+            if dirty:
+                metadata["last_updated"] = get_current_timestamp()
+            self._write_json(self.metadata_file, metadata)
+
+        return {
+            "saves": self._batch_saves,
+            "writes": self.write_count - writes_before,
+            "files": [p.name for p in dirty] + access_files + (
+                [self.metadata_file.name] if dirty or metadata is not None else []
+            ),
+        }
+
+    def _discard_batch(self):
+        """Drop buffered changes, including the mutated dicts in the cache."""
+        for file_path in list(self._dirty) + list(self._pending_access):
+            self._cache.pop(file_path, None)
+            self._indexes.pop(file_path, None)
+        self._dirty = {}
+        self._pending_ops = {}
+        self._pending_access = {}
+        self._pending_builds = {}
+        self._flush_access_on_exit = False
+
+    def _streaming(self, memory_type: str) -> bool:
+        """
+        Whether reads should stream a JSONL store instead of loading it.
+
+        False when the loaded (and indexed) store is available or needed:
+        JSON snapshots, stores with buffered changes, and stores whose cache
+        entry is current.
+        """
+        file_path = self.files[memory_type]
+        if self.store_format != "jsonl" or file_path in self._dirty or file_path in self._pending_access:
+            return False
+        cached = self._cache.get(file_path)
+        return cached is None or cached[0] != self._signature(file_path)
+
+    # ========== MemoryStorage interface ==========
+
+    def load(self, memory_type: str) -> Dict[str, Dict]:
+        return self._load_json(self.files[memory_type])
+
+    def get(self, memory_type: str, memory_id: str) -> Optional[Dict]:
+        """Get a record; an unloaded JSONL store is read with one seek."""
+        if self._streaming(memory_type):
+            file_path = self.files[memory_type]
+            with self._reading(file_path):
+                return memory_journal.read_record(file_path, memory_id)
+        return self.load(memory_type).get(memory_id)
+
+    def load_indexes(self, memory_type: str) -> Tuple[Dict[str, Dict], IndexSet]:
+        """Load a store together with its up-to-date indexes."""
+        file_path = self.files[memory_type]
+        data = self._load_json(file_path)
+        return data, self._indexes[file_path]
+
+    def columns(self, memory_type: str) -> ColumnarView:
+        """Columnar view of a store, rebuilt only after the store changed."""
+        file_path = self.files[memory_type]
+        data, indexes = self.load_indexes(memory_type)
+        cached = self._columns.get(file_path)
+        if cached is not None and cached[0] is indexes and cached[1] == indexes.generation:
+            return cached[2]
+
+        view = ColumnarView(data)
+        self._columns[file_path] = (indexes, indexes.generation, view)
+        return view
+
+    def apply(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None,
+              read_at: Optional[int] = None):
+        """
+        Outside batch() the ops are applied under the store's writer lock.
+
+        read_at is the generation the caller read the store at, if reads
+        after that (such as a shard lookup) may have moved this instance
+        on; see _prepare.
+        """
+        file_path = self.files[memory_type]
+        with ExitStack() as stack:
+            if not self._batch_depth:
+                stack.enter_context(self._lock(file_path).exclusive())
+            data, indexes, ops = self._prepare(file_path, ops, rebuild, read_at)
+            for op in ops:
+                indexes.apply_op(data, op)
+            self._commit(file_path, data, ops, rebuild)
+
+    def record_access(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None,
+                      read_at: Optional[int] = None):
+        """
+        Write access updates behind to the store's access log.
+
+        The updates are applied to the loaded store at once, so reads see
+        them, but only a small append to <store>.access.jsonl is written;
+        the journal and metadata are left alone until the log is flushed.
+        """
+        file_path = self.files[memory_type]
+        if self._batch_depth:
+            data, indexes, ops = self._prepare(file_path, ops, rebuild, read_at)
+            for op in ops:
+                indexes.apply_op(data, op)
+            self._pending_access.setdefault(file_path, []).extend(ops)
+            self._pending_builds.setdefault(file_path, []).append((True, rebuild or (lambda: ops)))
+            self._batch_saves += 1
+            return
+
+        with self._lock(file_path).exclusive():
+            data, indexes, ops = self._prepare(file_path, ops, rebuild, read_at)
+            for op in ops:
+                indexes.apply_op(data, op)
+            self._write_store(file_path, data, [], ops, [(True, lambda: ops)])
+
+    def flush_access(self) -> Dict[str, int]:
+        """
+        Fold every access log into its store journal.
+
+        Inside batch() the flush runs when the batch ends.
+
+        Returns:
+            Dict of store file name -> number of access updates folded
+        """
+        if self._batch_depth:
+            self._flush_access_on_exit = True
+            return {}
+
+        flushed = {}
+        for file_path in self._store_files:
+            if memory_journal.access_log_size(file_path):
+                with self._lock(file_path).exclusive() as lock:
+                    flushed[file_path.name] = self._fold_access(file_path, self._current(file_path))
+                    self._generations[file_path] = self._read_generations[file_path] = lock.bump()
+        return flushed
+
+    def get_metadata(self) -> Dict[str, Any]:
+        return self._load_json(self.metadata_file)
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Fold every store journal and access log into a fresh snapshot.
+
+        Returns:
+            Dict of store file name -> number of journal and access ops folded
+        """
+        folded = {}
+        for file_path in self._store_files:
+            with self._lock(file_path).exclusive() as lock:
+                ops = memory_journal.read_ops(file_path) + memory_journal.read_access(file_path)
+                if ops:
+                    self._write_json(file_path, self._current(file_path))
+                    self._generations[file_path] = self._read_generations[file_path] = lock.bump()
+            folded[file_path.name] = len(ops)
+        return folded
+
+    def select(
+        self,
+        memory_type: str,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+        importance: Optional[str] = None,
+    ) -> List[Dict]:
+        """Select via the layer and category indexes; the core layer may come from the core view."""
+        if status == "active" and importance == "core":
+            records = self._read_core_view(self.files[memory_type])
+            if records is not None:
+                return [m for m in records if category is None or m["category"] == category]
+
+        if self._streaming(memory_type):
+            file_path = self.files[memory_type]
+            with self._reading(file_path):
+                return [m for m in memory_journal.iter_store(file_path)
+                        if (status is None or m["status"] == status) and
+                        (category is None or m["category"] == category) and
+                        (importance is None or m.get("importance") == importance)]
+
+        if status is None and importance is None and category is None:
+            return super().select(memory_type, status, category, importance)
+
+        data, indexes = self.load_indexes(memory_type)
+        if status == "active" and importance == "core" and not self._batch_depth:
+            # Materialize a missing or stale view so the next process can use it
+            file_path = self.files[memory_type]
+            cached = self._cache.get(file_path)
+            if cached is not None:
+                self._save_core_view(file_path, data, cached[0])
+
+        if category is not None:
+            ids = indexes["category"].lookup(category)
+            if status is not None or importance is not None:
+                ids = ids & indexes["layer"].lookup(status, importance)
+        else:
+            ids = indexes["layer"].lookup(status, importance)
+        return [data[memory_id] for memory_id in indexes.ordered(ids)]
+
+    def recent(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+    ) -> List[Dict]:
+        """Active records come from the time index (a slice, no sort)."""
+        if status != "active" or self._streaming(memory_type):
+            return super().recent(memory_type, limit, since, until, status, category)
+        return [memory for _, memory in self.timeline(memory_type, limit, None, since, until, category)]
+
+    def timeline(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        after: Optional[memory_shards.TimelineKey] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[memory_shards.TimelineKey, Dict]]:
+        """Bisect the time index; O(log n + page)."""
+        if self._streaming(memory_type):
+            return super().timeline(memory_type, limit, after, since, until, category)
+        data, indexes = self.load_indexes(memory_type)
+        keys = indexes["time"].page(category, limit, after,
+                                    memory_shards.to_bound(since), memory_shards.to_bound(until))
+        return [(key, data[key[2]]) for key in keys]
+
+    def transition_candidates(
+        self,
+        memory_type: str,
+        active_before: datetime,
+        contextual_before: datetime,
+    ) -> List[Dict]:
+        """Read only the due ends of the schedule index."""
+        data, indexes = self.load_indexes(memory_type)
+        due = indexes["schedule"].due(to_epoch_micros(active_before), to_epoch_micros(contextual_before))
+        return [data[memory_id] for memory_id in indexes.ordered(due)]
+
+    def count(self, memory_type: str, status: Optional[str] = None) -> int:
+        data, indexes = self.load_indexes(memory_type)
+        if status is None:
+            return len(data)
+        return len(indexes["layer"].lookup(status=status))
+
+    def find_duplicate(self, memory_type: str, content: str, category: str) -> Optional[str]:
+        """Look up the duplicate index instead of scanning the store."""
+        data, indexes = self.load_indexes(memory_type)
+        normalized = normalize_content(content)
+        for memory_id in indexes.ordered(indexes["dedup"].lookup(content, category)):
+            existing = data[memory_id]
+            if (existing["status"] == "active" and
+                normalize_content(existing["content"]) == normalized and
+                existing["category"] == category):
+                return memory_id
+        return None
+
+    def find_similar(self, memory_type: str, content: str, category: str,
+                     threshold: float) -> List[Tuple[str, float]]:
+        """Verify only the candidates sharing an LSH bucket with content."""
+        data, indexes = self.load_indexes(memory_type)
+        shingles = similarity_shingles(content)
+        matches = []
+        for memory_id in indexes.ordered(indexes["near"].candidates(content, category)):
+            existing = data[memory_id]
+            if existing["status"] != "active" or existing["category"] != category:
+                continue
+            similarity = shingle_similarity(shingles, similarity_shingles(existing["content"]))
+            if similarity >= threshold:
+                matches.append((memory_id, similarity))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def query_by_context(self, context_tags: List[str], limit: int) -> List[Dict]:
+        """Rank only the memories found in the tag posting lists."""
+        if limit <= 0:
+            return []
+
+        def scored():
+            for type_index, memory_type in enumerate(MEMORY_TYPES):
+                data, indexes = self.load_indexes(memory_type)
+                for memory_id, matched in indexes["tags"].match_counts(context_tags).items():
+                    memory = data[memory_id]
+                    # Ties go to the earlier type, then the earlier record
+                    order = (-type_index, -indexes.seq[memory_id])
+                    yield context_rank(memory, matched) + order, memory
+
+        return [memory for _, memory in heapq.nlargest(limit, scored(), key=lambda x: x[0])]
+
+    def search(self, query: str, memory_types: List[str]) -> List[Dict]:
+        """Search via the n-gram index, verifying candidates by substring match."""
+        results = []
+        query_lower = query.lower()
+        for memory_type in memory_types:
+            if self._streaming(memory_type):
+                file_path = self.files[memory_type]
+                with self._reading(file_path):
+                    results.extend(m for m in memory_journal.iter_store(file_path)
+                                   if m["status"] == "active" and matches_query(m, query_lower))
+                continue
+
+            data, indexes = self.load_indexes(memory_type)
+            file_path = self.files[memory_type]
+            if "ngram" not in indexes.indexes and self._scans.get(file_path, 0) < SEARCH_SCANS_BEFORE_INDEX:
+                # A few searches are cheaper as scans than reading the postings
+                self._scans[file_path] = self._scans.get(file_path, 0) + 1
+                candidates = None
+            else:
+                candidates = indexes["ngram"].candidates(query_lower)
+            if candidates is None:
+                results.extend(super().search(query, [memory_type]))
+                continue
+
+            for memory_id in indexes.ordered(candidates):
+                memory = data[memory_id]
+                if memory["status"] == "active" and matches_query(memory, query_lower):
+                    results.append(memory)
+        return results
+
+    def search_ranked(self, query: str, memory_types: List[str],
+                      top_k: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """Score with the statistics kept in the n-gram indexes."""
+        return memory_rank.rank_bm25(query, self.rank_sources(memory_types), top_k)
+
+    def semantic_search(self, query: str, memory_types: List[str], k: int) -> List[Tuple[Dict, float]]:
+        """Search the vector index of each store, building it on first use."""
+        results = []
+        for memory_type in memory_types:
+            data, indexes = self.load_indexes(memory_type)
+            index = indexes["vector"]
+            index.ensure(data)
+            results.append([(data[memory_id], score) for memory_id, score in index.search(query, k)])
+        return merge_similar(results, k)
+
+    def rank_sources(self, memory_types: List[str]) -> List[memory_rank.Source]:
+        """(store dict, indexes) of each type, for ranking across several storages."""
+        return [self.load_indexes(memory_type) for memory_type in memory_types]
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "entries": len(self._cache),
+            "writes": self.write_count,
+            "stale_writes": self.stale_writes,
+        }
+
+    def clear_cache(self):
+        """Drop all cached file contents and reset the counters."""
+        self._cache.clear()
+        self._indexes.clear()
+        self._columns.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class ShardedStorage(MemoryStorage):
+    """
+    JSON stores split by month of timestamp, one JsonStorage per shard.
+
+    Adds go to the shard of the record's timestamp and other writes to the
+    shard holding the id, so only that shard's files (and metadata.json)
+    are written. recent() opens shards newest first and stops once the
+    limit is reached; time bounds skip months outside the range. Other
+    queries visit every shard and keep shard order (oldest month first) as
+    insertion order.
+    """
+
+    backend_name = "json"
+
+    def __init__(self, memory_dir: Path, **options):
+        """
+        Initialize sharded storage.
+
+        Args:
+            memory_dir: Memory directory holding shards.json
+            **options: JsonStorage options for every shard (journal,
+                journal_threshold, access flush thresholds, store_format)
+        """
+        self.memory_dir = Path(memory_dir)
+        self.memory_dir.mkdir(parents=True, exist_ok=True)
+        self.metadata_file = self.memory_dir / "metadata.json"
+        self.manifest_file = memory_shards.manifest_path(self.memory_dir)
+
+        options.setdefault("store_format", read_store_format(self.memory_dir))
+        if options["store_format"] not in STORE_FORMATS:
+            raise ValueError(f"Unknown store format: {options['store_format']}")
+        self.options = options
+
+        self._manifest = memory_shards.new_manifest()
+        self._manifest_signature: Optional[Tuple[int, int]] = None
+        self._shards: Dict[str, JsonStorage] = {}
+
+        # Shard batches entered inside batch(): key -> stats dict of that shard
+        self._batch: Optional[ExitStack] = None
+        self._batch_stats: Dict[str, Dict[str, Any]] = {}
+        self.last_batch_stats: Optional[Dict[str, Any]] = None
+
+        if not self.manifest_file.exists():
+            memory_shards.save_manifest(self.memory_dir, self._manifest)
+
+    # ========== Shards ==========
+
+    def _keys(self, memory_type: str) -> List[str]:
+        """Shard keys of a store, oldest month first (re-read if another process changed them)."""
+        signature = JsonStorage._file_signature(self.manifest_file)
+        if signature != self._manifest_signature:
+            self._manifest = memory_shards.load_manifest(self.memory_dir) or memory_shards.new_manifest()
+            self._manifest_signature = signature
+        return self._manifest["shards"].get(memory_type, [])
+
+    def _all_keys(self) -> List[str]:
+        return sorted(set().union(*(self._keys(t) for t in MEMORY_TYPES)))
+
+    def _register(self, memory_type: str, key: str):
+        """Add a shard to the manifest when a store gets its first record in that month."""
+        if key in self._keys(memory_type):
+            return
+        with StoreLock(lock_path(self.manifest_file)).exclusive():
+            # Re-read under the lock so shards other processes added are kept
+            self._manifest_signature = None
+            keys = self._keys(memory_type)
+            if key not in keys:
+                self._manifest["shards"][memory_type] = sorted(keys + [key])
+                memory_shards.save_manifest(self.memory_dir, self._manifest)
+            self._manifest_signature = JsonStorage._file_signature(self.manifest_file)
+
+    def _shard(self, key: str) -> JsonStorage:
+        """Get the storage of a shard, joining the current batch if there is one."""
+        shard = self._shards.get(key)
+        if shard is None:
+            shard = JsonStorage(memory_shards.shard_dir(self.memory_dir, key),
+                                metadata_file=self.metadata_file, **self.options)
+            self._shards[key] = shard
+        if self._batch is not None and key not in self._batch_stats:
+            self._batch_stats[key] = self._batch.enter_context(shard.batch())
+        return shard
+
+    def _locate(self, memory_type: str, memory_id: str, opened_only: bool = False) -> Optional[str]:
+        """
+        Key of the shard holding an id, searching the newest shards first.
+
+        With opened_only, shards this instance has not opened yet are
+        skipped instead of being loaded.
+        """
+        for key in reversed(self._keys(memory_type)):
+            if opened_only and key not in self._shards:
+                continue
+            if self._shard(key).get(memory_type, memory_id) is not None:
+                return key
+        return None
+
+    def _route(self, memory_type: str, op: Dict) -> List[Tuple[str, Dict]]:
+        """
+        Split an operation into (shard key, op) pairs.
+
+        A record whose timestamp moves it to another month is deleted from
+        its old shard and added to the new one.
+
+        Adds go straight to the shard of their timestamp. A new id
+        (create_memory_id) is in no shard, and re-adding an existing id
+        means the record was read first, which opened its shard; so an add
+        only looks in the shards already open instead of loading them all.
+        """
+        memory_id = op.get("id")
+        if op.get("op") == OP_ADD:
+            key = memory_shards.shard_key(op["record"].get("timestamp"))
+            current = self._locate(memory_type, memory_id, opened_only=True)
+            if current is not None and current != key:
+                return [(current, make_op(OP_DELETE, memory_id)), (key, op)]
+            return [(key, op)]
+
+        current = self._locate(memory_type, memory_id)
+        if current is None:
+            return []
+        fields = op.get("fields", {})
+        if op.get("op") in (OP_UPDATE, OP_DEPRECATE) and "timestamp" in fields:
+            key = memory_shards.shard_key(fields["timestamp"])
+            if key != current:
+                record = dict(self._shard(current).get(memory_type, memory_id))
+                record.update(fields)
+                return [(current, make_op(OP_DELETE, memory_id)),
+                        (key, make_op(OP_ADD, memory_id, record=record))]
+        return [(current, op)]
+
+    # ========== MemoryStorage interface ==========
+
+    def load(self, memory_type: str) -> Dict[str, Dict]:
+        """Merge the shards of a store into a new dict (writes must go through apply())."""
+        data: Dict[str, Dict] = {}
+        for key in self._keys(memory_type):
+            data.update(self._shard(key).load(memory_type))
+        return data
+
+    def get(self, memory_type: str, memory_id: str) -> Optional[Dict]:
+        for key in reversed(self._keys(memory_type)):
+            record = self._shard(key).get(memory_type, memory_id)
+            if record is not None:
+                return record
+        return None
+
+    def _seen_generations(self, memory_type: str) -> Dict[str, Optional[int]]:
+        """Generation each open shard was last read at, taken before _locate reads on."""
+        return {key: shard.read_generation(memory_type) for key, shard in self._shards.items()}
+
+    @staticmethod
+    def _narrow(rebuild: Optional[Rebuild], ids: set) -> Optional[Rebuild]:
+        """Limit a store-wide rebuild to the ops of some ids (one shard's share)."""
+        if rebuild is None:
+            return None
+        return lambda: [op for op in rebuild() if op.get("id") in ids]
+
+    def apply(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None):
+        """Route each op to its shard; several ops are written as one batch."""
+        if len(ops) > 1 and self._batch is None:
+            with self.batch():
+                self.apply(memory_type, ops, rebuild)
+            return
+
+        seen = self._seen_generations(memory_type)
+        for op in ops:
+            for key, routed in self._route(memory_type, op):
+                self._register(memory_type, key)
+                # A move between shards is redone as the same delete/add
+                shard_rebuild = self._narrow(rebuild, {op.get("id")}) if routed is op else None
+                self._shard(key).apply(memory_type, [routed], shard_rebuild, seen.get(key))
+
+    def record_access(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None):
+        seen = self._seen_generations(memory_type)
+        by_shard: Dict[str, List[Dict]] = {}
+        for op in ops:
+            key = self._locate(memory_type, op.get("id"))
+            if key is not None:
+                by_shard.setdefault(key, []).append(op)
+        for key, shard_ops in by_shard.items():
+            ids = {op.get("id") for op in shard_ops}
+            self._shard(key).record_access(memory_type, shard_ops, self._narrow(rebuild, ids), seen.get(key))
+
+    def flush_access(self) -> Dict[str, int]:
+        flushed = {}
+        for key in self._all_keys():
+            for name, count in self._shard(key).flush_access().items():
+                flushed[f"{key}/{name}"] = count
+        return flushed
+
+    def compact(self) -> Dict[str, int]:
+        folded = {}
+        for key in self._all_keys():
+            for name, count in self._shard(key).compact().items():
+                folded[f"{key}/{name}"] = count
+        return folded
+
+    @contextmanager
+    def batch(self) -> Iterator[Dict[str, Any]]:
+        """
+        Run every shard touched inside the block in one JsonStorage batch.
+
+        Each shard writes its dirty files once on exit; if the block raises,
+        all shards discard their buffered changes.
+        """
+        if self._batch is not None:
+            yield {}
+            return
+
+        stats: Dict[str, Any] = {}
+        self._batch_stats = {}
+        with ExitStack() as stack:
+            self._batch = stack
+            try:
+                yield stats
+            finally:
+                self._batch = None
+
+        files = []
+        for key, shard_stats in self._batch_stats.items():
+            files += [name if name == self.metadata_file.name else f"{key}/{name}"
+                      for name in shard_stats.get("files", [])]
+        stats.update({
+            "saves": sum(s.get("saves", 0) for s in self._batch_stats.values()),
+            "writes": sum(s.get("writes", 0) for s in self._batch_stats.values()),
+            "files": list(dict.fromkeys(files)),
+        })
+        self.last_batch_stats = stats
+
+    def get_metadata(self) -> Dict[str, Any]:
+        return read_metadata(self.memory_dir)
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        totals = {"hits": 0, "misses": 0, "entries": 0, "writes": 0, "stale_writes": 0}
+        for shard in self._shards.values():
+            for name, value in shard.get_cache_stats().items():
+                totals[name] += value
+        totals["shards"] = len(self._shards)
+        return totals
+
+    def clear_cache(self):
+        for shard in self._shards.values():
+            shard.clear_cache()
+
+    def close(self):
+        for shard in self._shards.values():
+            shard.close()
+
+    # ========== Queries ==========
+
+    def recent(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+    ) -> List[Dict]:
+        """Open shards newest first, skipping months outside [since, until), until limit is met."""
+        results: List[Dict] = []
+        for key in reversed(memory_shards.keys_between(self._keys(memory_type), since, until)):
+            if limit is not None and len(results) >= limit:
+                break
+            remaining = None if limit is None else limit - len(results)
+            results += self._shard(key).recent(memory_type, remaining, since, until, status, category)
+        return results
+
+    def timeline(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        after: Optional[memory_shards.TimelineKey] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[memory_shards.TimelineKey, Dict]]:
+        """Like recent(), also skipping the months newer than the cursor."""
+        results: List[Tuple[memory_shards.TimelineKey, Dict]] = []
+        newest_key = None if after is None else memory_shards.shard_key(after[0])
+        for key in reversed(memory_shards.keys_between(self._keys(memory_type), since, until)):
+            if limit is not None and len(results) >= limit:
+                break
+            if newest_key is not None and key > newest_key:
+                continue
+            remaining = None if limit is None else limit - len(results)
+            results += self._shard(key).timeline(memory_type, remaining, after, since, until, category)
+        return results
+
+    def select(
+        self,
+        memory_type: str,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+        importance: Optional[str] = None,
+    ) -> List[Dict]:
+        return [memory for key in self._keys(memory_type)
+                for memory in self._shard(key).select(memory_type, status, category, importance)]
+
+    def search(self, query: str, memory_types: List[str]) -> List[Dict]:
+        return [memory for memory_type in memory_types for key in self._keys(memory_type)
+                for memory in self._shard(key).search(query, [memory_type])]
+
+    def search_ranked(self, query: str, memory_types: List[str],
+                      top_k: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """Rank over every shard at once, so term statistics cover the whole store."""
+        sources = [source for memory_type in memory_types for key in self._keys(memory_type)
+                   for source in self._shard(key).rank_sources([memory_type])]
+        return memory_rank.rank_bm25(query, sources, top_k)
+
+    def semantic_search(self, query: str, memory_types: List[str], k: int) -> List[Tuple[Dict, float]]:
+        """Merge the top k of every shard (IDF weights are per shard)."""
+        return merge_similar([self._shard(key).semantic_search(query, [memory_type], k)
+                              for memory_type in memory_types for key in self._keys(memory_type)], k)
+
+    def query_by_context(self, context_tags: List[str], limit: int) -> List[Dict]:
+        """Merge the top `limit` of every shard, keeping type then shard order for ties."""
+        if limit <= 0:
+            return []
+        wanted = set(context_tags)
+        type_order = {memory_type: i for i, memory_type in enumerate(MEMORY_TYPES)}
+
+        def scored():
+            for shard_index, key in enumerate(self._all_keys()):
+                # Equal ranks within a shard come back in type, then insertion order
+                for position, memory in enumerate(self._shard(key).query_by_context(context_tags, limit)):
+                    matched = len(wanted.intersection(record_tags(memory)))
+                    order = (-type_order.get(memory.get("type"), len(MEMORY_TYPES)), -shard_index, -position)
+                    yield context_rank(memory, matched) + order, memory
+
+        return [memory for _, memory in heapq.nlargest(limit, scored(), key=lambda x: x[0])]
+
+    def transition_candidates(
+        self,
+        memory_type: str,
+        active_before: datetime,
+        contextual_before: datetime,
+    ) -> List[Dict]:
+        return [memory for key in self._keys(memory_type)
+                for memory in self._shard(key).transition_candidates(
+                    memory_type, active_before, contextual_before)]
+
+    def find_duplicate(self, memory_type: str, content: str, category: str) -> Optional[str]:
+        for key in self._keys(memory_type):
+            memory_id = self._shard(key).find_duplicate(memory_type, content, category)
+            if memory_id is not None:
+                return memory_id
+        return None
+
+    def find_similar(self, memory_type: str, content: str, category: str,
+                     threshold: float) -> List[Tuple[str, float]]:
+        matches = [match for key in self._keys(memory_type)
+                   for match in self._shard(key).find_similar(memory_type, content, category, threshold)]
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def count(self, memory_type: str, status: Optional[str] = None) -> int:
+        return sum(self._shard(key).count(memory_type, status) for key in self._keys(memory_type))
+
+    def categories(self, memory_type: str) -> List[str]:
+        found = set()
+        for key in self._keys(memory_type):
+            found.update(self._shard(key).categories(memory_type))
+        return sorted(found)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    category TEXT,
+    importance TEXT,
+    timestamp TEXT,
+    access_count INTEGER NOT NULL DEFAULT 0,
+    content_norm TEXT NOT NULL,
+    content_lower TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (type, id)
+);
+CREATE INDEX IF NOT EXISTS idx_memories_status ON memories (type, status);
+CREATE INDEX IF NOT EXISTS idx_memories_category ON memories (type, category, status);
+CREATE INDEX IF NOT EXISTS idx_memories_importance ON memories (importance, status);
+CREATE INDEX IF NOT EXISTS idx_memories_timestamp ON memories (type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_memories_content ON memories (type, category, content_norm);
+CREATE INDEX IF NOT EXISTS idx_memories_recency ON memories (
+    type, importance, COALESCE(NULLIF(json_extract(data, '$.last_accessed'), ''), timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS memory_tags (
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tag_lower TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_memory_tags_memory ON memory_tags (type, id);
+
+CREATE TABLE IF NOT EXISTS context_tags (
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_context_tags_tag ON context_tags (tag);
+CREATE INDEX IF NOT EXISTS idx_context_tags_memory ON context_tags (type, id);
+
+CREATE TABLE IF NOT EXISTS tags (
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags (tag);
+CREATE INDEX IF NOT EXISTS idx_tags_memory ON tags (type, id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Bump when tables derived from the record data change; older databases
+# are backfilled on open
+SQLITE_SCHEMA_VERSION = 2
+
+# Last access time, or creation time if never accessed (matches idx_memories_recency)
+_RECENCY_SQL = "COALESCE(NULLIF(json_extract(m.data, '$.last_accessed'), ''), m.timestamp)"
+
+# Result order of multi-type queries: facts, preferences, experiences
+_TYPE_ORDER_SQL = "CASE m.type WHEN 'fact' THEN 0 WHEN 'preference' THEN 1 ELSE 2 END"
+
+# Creation time as sorted by recent(); '' unless it starts like an ISO date (memory_shards.timestamp_key)
+_TIMESTAMP_KEY_SQL = "CASE WHEN m.timestamp GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' THEN m.timestamp ELSE '' END"
+
+
+class SqliteStorage(MemoryStorage):
+    """Single-file SQLite backend with indexed queries."""
+
+    backend_name = "sqlite"
+
+    def __init__(self, memory_dir: Path, db_file: str = SQLITE_FILE):
+        """
+        Initialize SQLite storage.
+
+        Args:
+            memory_dir: Memory directory
+            db_file: Database file name inside memory_dir
+        """
+        self.memory_dir = Path(memory_dir)
+        self.memory_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.memory_dir / db_file
+
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+
+        self._batch_depth = 0
+        self._batch_saves = 0
+        self.write_count = 0
+        self.last_batch_stats: Optional[Dict[str, Any]] = None
+
+        if self._get_meta("created") is None:
+            now = get_current_timestamp()
+            self._write(lambda: self._set_meta({
+                "created": now, "last_updated": now, "version": "1.0",
+                "schema_version": str(SQLITE_SCHEMA_VERSION),
+            }))
+        elif int(self._get_meta("schema_version") or 1) < SQLITE_SCHEMA_VERSION:
+            self._write(self._upgrade_schema)
+
+    def close(self):
+        self.conn.close()
+
+    # ========== Transactions ==========
+
+    def _write(self, fn):
+        """Run fn inside a transaction (or the enclosing batch transaction)."""
+        if self._batch_depth:
+            self._batch_saves += 1
+            fn()
+            return
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            fn()
+            self._set_meta({"last_updated": get_current_timestamp()})
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        self.write_count += 1
+
+    @contextmanager
+    def batch(self) -> Iterator[Dict[str, Any]]:
+        """Run all mutations in one transaction; rolled back if the block raises."""
+        stats: Dict[str, Any] = {}
+        if self._batch_depth == 0:
+            self._batch_saves = 0
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._batch_depth += 1
+        try:
+            yield stats
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.execute("ROLLBACK")
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            if self._batch_saves:
+                self._set_meta({"last_updated": get_current_timestamp()})
+            self.conn.execute("COMMIT")
+            self.write_count += 1
+            stats.update({"saves": self._batch_saves, "writes": 1, "files": [self.db_path.name]})
+            self.last_batch_stats = stats
+
+    # ========== Metadata ==========
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, values: Dict[str, str]):
+        self.conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            list(values.items()),
+        )
+
+    def get_metadata(self) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = dict(self.conn.execute("SELECT key, value FROM meta"))
+        metadata["backend"] = self.backend_name
+        return metadata
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        return {"writes": self.write_count}
+
+    # ========== Writes ==========
+
+    def _upgrade_schema(self):
+        """Rebuild derived rows of every record for the current schema."""
+        rows = self.conn.execute("SELECT type, data FROM memories ORDER BY seq").fetchall()
+        for memory_type, data in rows:
+            self._put(memory_type, json.loads(data))
+        self._set_meta({"schema_version": str(SQLITE_SCHEMA_VERSION)})
+
+    def _put(self, memory_type: str, record: Dict):
+        """Insert or replace a record and its tag rows."""
+        memory_id = record["id"]
+        self.conn.execute(
+            "INSERT INTO memories (type, id, status, category, importance, timestamp, "
+            "access_count, content_norm, content_lower, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(type, id) DO UPDATE SET status = excluded.status, "
+            "category = excluded.category, importance = excluded.importance, "
+            "timestamp = excluded.timestamp, access_count = excluded.access_count, "
+            "content_norm = excluded.content_norm, content_lower = excluded.content_lower, "
+            "data = excluded.data",
+            (
+                memory_type, memory_id, record["status"], record.get("category"),
+                record.get("importance"), record.get("timestamp"),
+                record.get("access_count", 0) or 0,
+                normalize_content(record["content"]), record["content"].lower(),
+                json.dumps(record, ensure_ascii=False),
+            ),
+        )
+        self.conn.execute("DELETE FROM memory_tags WHERE type = ? AND id = ?", (memory_type, memory_id))
+        self.conn.executemany(
+            "INSERT INTO memory_tags (type, id, tag_lower) VALUES (?, ?, ?)",
+            [(memory_type, memory_id, tag.lower()) for tag in record.get("tags") or []],
+        )
+        self.conn.execute("DELETE FROM context_tags WHERE type = ? AND id = ?", (memory_type, memory_id))
+        self.conn.executemany(
+            "INSERT INTO context_tags (type, id, tag) VALUES (?, ?, ?)",
+            [(memory_type, memory_id, tag) for tag in dict.fromkeys(record.get("context_tags") or [])],
+        )
+        self.conn.execute("DELETE FROM tags WHERE type = ? AND id = ?", (memory_type, memory_id))
+        self.conn.executemany(
+            "INSERT INTO tags (type, id, tag) VALUES (?, ?, ?)",
+            [(memory_type, memory_id, tag) for tag in dict.fromkeys(record.get("tags") or [])],
+        )
+
+    def _delete(self, memory_type: str, memory_id: str):
+        for table in ("memories", "memory_tags", "context_tags", "tags"):
+            self.conn.execute(f"DELETE FROM {table} WHERE type = ? AND id = ?", (memory_type, memory_id))
+
+    def _apply_ops(self, memory_type: str, ops: List[Dict]):
+        for op in ops:
+            kind = op.get("op")
+            if kind == OP_ADD:
+                self._put(memory_type, op["record"])
+            elif kind in (OP_UPDATE, OP_DEPRECATE):
+                record = self.get(memory_type, op["id"])
+                if record is not None:
+                    record.update(op.get("fields", {}))
+                    self._put(memory_type, record)
+            elif kind == OP_DELETE:
+                self._delete(memory_type, op["id"])
+
+    def apply(self, memory_type: str, ops: List[Dict], rebuild: Optional[Rebuild] = None):
+        """Write ops in one transaction; rebuild runs inside it, so it reads the committed state."""
+        self._write(lambda: self._apply_ops(memory_type, rebuild() if rebuild else ops))
+
+    # ========== Reads ==========
+
+    def _records(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        return [json.loads(row[0]) for row in self.conn.execute(sql, params)]
+
+    def load(self, memory_type: str) -> Dict[str, Dict]:
+        return {r["id"]: r for r in self._records(
+            "SELECT data FROM memories m WHERE m.type = ? ORDER BY m.seq", (memory_type,))}
+
+    def get(self, memory_type: str, memory_id: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT data FROM memories WHERE type = ? AND id = ?", (memory_type, memory_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_duplicate(self, memory_type: str, content: str, category: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT id FROM memories WHERE type = ? AND category = ? AND content_norm = ? "
+            "AND status = 'active' ORDER BY seq LIMIT 1",
+            (memory_type, category, normalize_content(content)),
+        ).fetchone()
+        return row[0] if row else None
+
+    def select(
+        self,
+        memory_type: str,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+        importance: Optional[str] = None,
+    ) -> List[Dict]:
+        clauses = ["m.type = ?"]
+        params: List[Any] = [memory_type]
+        for column, value in (("status", status), ("category", category), ("importance", importance)):
+            if value is not None:
+                clauses.append(f"m.{column} = ?")
+                params.append(value)
+        return self._records(
+            f"SELECT data FROM memories m WHERE {' AND '.join(clauses)} ORDER BY m.seq", tuple(params))
+
+    def _timeline_rows(
+        self,
+        memory_type: str,
+        limit: Optional[int],
+        after: Optional[memory_shards.TimelineKey],
+        since: memory_shards.Bound,
+        until: memory_shards.Bound,
+        status: Optional[str],
+        category: Optional[str],
+    ) -> List[Tuple]:
+        """(timestamp_key, seq, id, data) rows in recent() order."""
+        clauses = ["m.type = ?"]
+        params: List[Any] = [memory_type]
+        for column, value in (("status", status), ("category", category)):
+            if value is not None:
+                clauses.append(f"m.{column} = ?")
+                params.append(value)
+        since, until = memory_shards.to_bound(since), memory_shards.to_bound(until)
+        if since is not None or until is not None:
+            clauses.append(f"{_TIMESTAMP_KEY_SQL} != ''")
+        if since is not None:
+            clauses.append("m.timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("m.timestamp < ?")
+            params.append(until)
+        if after is not None:
+            clauses.append(
+                f"({_TIMESTAMP_KEY_SQL} < ? OR ({_TIMESTAMP_KEY_SQL} = ? AND m.seq > "
+                "COALESCE((SELECT seq FROM memories WHERE type = ? AND id = ?), ?)))")
+            params.extend([after[0], after[0], memory_type, after[2], after[1]])
+        params.append(-1 if limit is None else max(limit, 0))
+        return self.conn.execute(
+            f"SELECT {_TIMESTAMP_KEY_SQL}, m.seq, m.id, m.data FROM memories m "
+            f"WHERE {' AND '.join(clauses)} ORDER BY {_TIMESTAMP_KEY_SQL} DESC, m.seq LIMIT ?",
+            tuple(params)).fetchall()
+
+    def recent(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+    ) -> List[Dict]:
+        rows = self._timeline_rows(memory_type, limit, None, since, until, status, category)
+        return [json.loads(row[3]) for row in rows]
+
+    def timeline(
+        self,
+        memory_type: str,
+        limit: Optional[int] = None,
+        after: Optional[memory_shards.TimelineKey] = None,
+        since: memory_shards.Bound = None,
+        until: memory_shards.Bound = None,
+        category: Optional[str] = None,
+    ) -> List[Tuple[memory_shards.TimelineKey, Dict]]:
+        rows = self._timeline_rows(memory_type, limit, after, since, until, "active", category)
+        return [((timestamp, seq, memory_id), json.loads(data)) for timestamp, seq, memory_id, data in rows]
+
+    def search(self, query: str, memory_types: List[str]) -> List[Dict]:
+        query_lower = query.lower()
+        placeholders = ", ".join("?" for _ in memory_types)
+        return self._records(
+            f"SELECT data FROM memories m WHERE m.type IN ({placeholders}) AND m.status = 'active' "
+            "AND (instr(m.content_lower, ?) > 0 OR EXISTS (SELECT 1 FROM memory_tags t "
+            "WHERE t.type = m.type AND t.id = m.id AND instr(t.tag_lower, ?) > 0)) "
+            f"ORDER BY {_TYPE_ORDER_SQL}, m.seq",
+            (*memory_types, query_lower, query_lower),
+        )
+
+    def query_by_context(self, context_tags: List[str], limit: int) -> List[Dict]:
+        if not context_tags or limit <= 0:
+            return []
+        tags = list(dict.fromkeys(context_tags))
+        placeholders = ", ".join("?" for _ in tags)
+        # Count distinct matched tags over both tag tables, then rank like context_rank()
+        return self._records(
+            "SELECT m.data FROM ("
+            "SELECT type, id, COUNT(DISTINCT tag) AS matched FROM ("
+            f"SELECT type, id, tag FROM context_tags WHERE tag IN ({placeholders}) "
+            f"UNION ALL SELECT type, id, tag FROM tags WHERE tag IN ({placeholders})"
+            ") GROUP BY type, id"
+            ") t JOIN memories m ON m.type = t.type AND m.id = t.id "
+            "WHERE m.status = 'active' "
+            "ORDER BY t.matched DESC, m.access_count DESC, "
+            f"COALESCE({_RECENCY_SQL}, '') DESC, "
+            f"{_TYPE_ORDER_SQL}, m.seq LIMIT ?",
+            (*tags, *tags, limit),
+        )
+
+    def transition_candidates(
+        self,
+        memory_type: str,
+        active_before: datetime,
+        contextual_before: datetime,
+    ) -> List[Dict]:
+        active_iso = active_before.isoformat()
+        return self._records(
+            "SELECT data FROM memories m WHERE m.type = ? AND m.status = 'active' AND ("
+            f"(m.importance = 'active' AND {_RECENCY_SQL} < ?) "
+            f"OR (m.importance = 'contextual' AND {_RECENCY_SQL} < ?) "
+            "OR (COALESCE(m.importance, '') NOT IN ('active', 'core') "
+            f"AND m.access_count >= ? AND {_RECENCY_SQL} >= ?)"
+            ") ORDER BY m.seq",
+            (memory_type, active_iso, contextual_before.isoformat(), PROMOTE_ACCESS_COUNT, active_iso),
+        )
+
+    def count(self, memory_type: str, status: Optional[str] = None) -> int:
+        if status is None:
+            row = self.conn.execute("SELECT COUNT(*) FROM memories WHERE type = ?", (memory_type,))
+        else:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM memories WHERE type = ? AND status = ?", (memory_type, status))
+        return row.fetchone()[0]
+
+    def categories(self, memory_type: str) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT DISTINCT category FROM memories WHERE type = ?", (memory_type,))
+        return sorted(row[0] for row in rows)
+
+
+def read_metadata(memory_dir: Path) -> Dict[str, Any]:
+    """Read metadata.json without creating it ({} if missing or unreadable)."""
+    try:
+        with open(Path(memory_dir) / "metadata.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_metadata(memory_dir: Path, metadata: Dict[str, Any]):
+    """Write metadata.json."""
+    with open(Path(memory_dir) / "metadata.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+
+def read_backend_setting(memory_dir: Path) -> str:
+    """Get the configured backend from metadata.json ("json" if unset)."""
+    return read_metadata(memory_dir).get("backend", "json")
+
+
+def read_store_format(memory_dir: Path) -> str:
+    """Get the JSON snapshot format from metadata.json ("json" if unset)."""
+    return read_metadata(memory_dir).get("store_format", "json")
+
+
+def store_paths(memory_dir: Path, memory_type: str) -> List[Path]:
+    """Snapshot paths of a JSON backend store: one, or one per shard (oldest month first)."""
+    file_name = store_file_name(memory_type, read_store_format(memory_dir))
+    manifest = memory_shards.load_manifest(memory_dir)
+    if manifest is None:
+        return [Path(memory_dir) / file_name]
+    return [memory_shards.shard_dir(memory_dir, key) / file_name
+            for key in manifest["shards"].get(memory_type, [])]
+
+
+def read_store(
+    memory_dir: Path,
+    memory_type: str,
+    compact: bool = False,
+    lazy: bool = False,
+) -> Dict[str, Dict]:
+    """
+    Read one store through the configured backend without creating files.
+
+    For scripts that only read memories (quick_load, reminders, exports).
+
+    Args:
+        memory_dir: Memory directory
+        memory_type: fact, preference or experience
+        compact: Return read-only CompactMemory records instead of dicts,
+            which take a fraction of the memory for large stores
+        lazy: Return a read-only MmapStore over the store's binary snapshot
+            if it is up to date, so nothing is parsed until accessed (a
+            ShardChain of them for a sharded directory)
+    """
+    if read_backend_setting(memory_dir) == "sqlite":
+        storage = SqliteStorage(memory_dir)
+        try:
+            data = storage.load(memory_type)
+        finally:
+            storage.close()
+        return compact_records(data) if compact else data
+
+    paths = store_paths(memory_dir, memory_type)
+    if lazy and paths:
+        stores = [memory_mmap.open_store(path) for path in paths]
+        if all(store is not None for store in stores):
+            return stores[0] if len(stores) == 1 else memory_shards.ShardChain(stores)
+
+    if len(paths) == 1:
+        data = memory_journal.load_store(paths[0])
+    else:
+        data = {}
+        for path in paths:
+            data.update(memory_journal.load_store(path))
+    return compact_records(data) if compact else data
+
+
+def read_recent(
+    memory_dir: Path,
+    memory_type: str,
+    limit: int,
+    status: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Read the newest records of a store without creating files.
+
+    A sharded directory is read newest month first and only until limit
+    records were found; binary snapshots are used where up to date.
+
+    Args:
+        memory_dir: Memory directory
+        memory_type: fact, preference or experience
+        limit: Maximum number of records
+        status: Only records with this status (any if None)
+    """
+    if read_backend_setting(memory_dir) == "sqlite":
+        storage = SqliteStorage(memory_dir)
+        try:
+            return storage.recent(memory_type, limit, status=status)
+        finally:
+            storage.close()
+
+    results: List[Dict] = []
+    for path in reversed(store_paths(memory_dir, memory_type)):
+        if len(results) >= limit:
+            break
+        store = memory_mmap.open_store(path)
+        records = (store if store is not None else memory_journal.load_store(path)).values()
+        if status is not None:
+            records = [r for r in records if r.get("status") == status]
+        results += memory_shards.newest(records, limit - len(results))
+    return results
+
+
+def create_storage(memory_dir: Path, backend: Optional[str] = None, **options) -> MemoryStorage:
+    """
+    Create the storage backend for a memory directory.
+
+    Args:
+        memory_dir: Memory directory
+        backend: "json" or "sqlite"; read from metadata.json if None
+        **options: Backend options (journal, journal_threshold for JSON)
+
+    Returns:
+        Storage backend instance
+    """
+    if backend is None:
+        backend = read_backend_setting(memory_dir)
+
+    if backend == "json":
+        if memory_shards.is_sharded(memory_dir):
+            return ShardedStorage(memory_dir, **options)
+        return JsonStorage(memory_dir, **options)
+    if backend == "sqlite":
+        return SqliteStorage(memory_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def _json_shards(storage: MemoryStorage) -> List[JsonStorage]:
+    """The JsonStorage of every shard of a JSON backend storage (itself if unsharded)."""
+    if isinstance(storage, ShardedStorage):
+        return [storage._shard(key) for key in storage._all_keys()]
+    return [storage]
+
+
+@contextmanager
+def _migrating(storages: List[JsonStorage], *paths: Path) -> Iterator[None]:
+    """
+    Hold the locks of a migration's files exclusive while it runs.
+
+    Takes the lock of every path (such as the shard manifest) and of every
+    store of the storages, through the storages' own StoreLocks so their
+    reads inside the block do not wait on the migration itself. Writers in
+    other processes wait until the migration is done; the generations are
+    bumped on the way out, so they reload instead of trusting their caches.
+    """
+    with ExitStack() as stack:
+        for path in paths:
+            stack.enter_context(StoreLock(lock_path(path)).exclusive())
+        locks = [stack.enter_context(storage._lock(file_path).exclusive())
+                 for storage in storages for file_path in storage._store_files]
+        yield
+        for lock in locks:
+            lock.bump()
+
+
+def migrate_json_to_sqlite(memory_dir: Path) -> Dict[str, int]:
+    """
+    Copy the JSON stores into memory.db and switch the directory to SQLite.
+
+    The JSON files are left in place as a backup. Running it again upserts
+    the same records, so a re-run is harmless.
+
+    Args:
+        memory_dir: Memory directory
+
+    Returns:
+        Dict of memory type -> number of migrated records
+    """
+    source = create_storage(memory_dir, "json")
+    target = SqliteStorage(memory_dir)
+    migrated = {}
+
+    try:
+        with _migrating(_json_shards(source)), target.batch():
+            for memory_type in MEMORY_TYPES:
+                records = source.load(memory_type)
+                target.apply(memory_type, [make_op(OP_ADD, memory_id, record=record)
+                                           for memory_id, record in records.items()])
+                migrated[memory_type] = len(records)
+
+            created = source.get_metadata().get("created")
+            if created:
+                target._set_meta({"created": created})
+
+            # Switched over before the JSON stores are unlocked
+            metadata = source.get_metadata()
+            metadata["backend"] = "sqlite"
+            write_metadata(memory_dir, metadata)
+    finally:
+        target.close()
+    return migrated
+
+
+def backfill_epochs(memory_dir: Path) -> Dict[str, int]:
+    """
+    Write the epoch fields (ts_epoch, ...) of records stored before they existed.
+
+    New writes set them through make_op(); this one-time migration fills in
+    (or corrects) the rest, so readers never fall back to parsing ISO
+    strings. Running it again changes nothing.
+
+    Args:
+        memory_dir: Memory directory (any backend)
+
+    Returns:
+        Dict of memory type -> number of updated records
+    """
+    storage = create_storage(memory_dir)
+    updated = {}
+    try:
+        with storage.batch():
+            for memory_type in MEMORY_TYPES:
+                ops = []
+                for memory_id, record in storage.load(memory_type).items():
+                    fields = {epoch: to_epoch_micros(record[field]) for field, epoch in EPOCH_FIELDS.items()
+                              if field in record and (epoch not in record or
+                                                      record[epoch] != to_epoch_micros(record[field]))}
+                    if fields:
+                        ops.append(make_op(OP_UPDATE, memory_id, fields=fields))
+                if ops:
+                    storage.apply(memory_type, ops)
+                updated[memory_type] = len(ops)
+        storage.compact()
+    finally:
+        storage.close()
+    return updated
+
+
+def convert_store_format(memory_dir: Path, store_format: str) -> Dict[str, int]:
+    """
+    Rewrite the JSON backend's snapshots in another format ("json" or "jsonl").
+
+    Each store (every shard of it, if sharded) is loaded with its journal
+    and access log, written as a compacted snapshot in the target format,
+    and the old snapshot is removed. metadata.json records the new format.
+    Converting to the current format just compacts the stores. Writers in
+    other processes wait on the store locks until the conversion is done.
+
+    Args:
+        memory_dir: Memory directory
+        store_format: Target snapshot format
+
+    Returns:
+        Dict of memory type -> number of converted records
+    """
+    if store_format not in STORE_FORMATS:
+        raise ValueError(f"Unknown store format: {store_format}")
+
+    memory_dir = Path(memory_dir)
+    manifest = memory_shards.load_manifest(memory_dir)
+    if manifest is None:
+        directories = [memory_dir]
+    else:
+        keys = sorted(set().union(*manifest["shards"].values()))
+        directories = [memory_shards.shard_dir(memory_dir, key) for key in keys]
+
+    old_format = read_store_format(memory_dir)
+    sources = [JsonStorage(directory, store_format=old_format, metadata_file=memory_dir / "metadata.json")
+               for directory in directories]
+    converted = {memory_type: 0 for memory_type in MEMORY_TYPES}
+    with _migrating(sources, *([memory_shards.manifest_path(memory_dir)] if manifest else [])):
+        for source in sources:
+            for memory_type in MEMORY_TYPES:
+                records = source.load(memory_type)
+                old_path = source.files[memory_type]
+                new_path = source.memory_dir / store_file_name(memory_type, store_format)
+
+                # Journal and access log are shared by both formats and folded here
+                memory_journal.compact(new_path, records)
+                memory_mmap.write_binary(new_path, records, JsonStorage._file_signature(new_path))
+                if old_path != new_path:
+                    old_path.unlink()
+                    if memory_jsonl.is_jsonl(old_path):
+                        memory_jsonl.offsets_path(old_path).unlink(missing_ok=True)
+                converted[memory_type] += len(records)
+
+        metadata = read_metadata(memory_dir)
+        metadata["store_format"] = store_format
+        write_metadata(memory_dir, metadata)
+    return converted
+
+
+def _remove_store(store_path: Path):
+    """Delete a store snapshot together with its journal, access log and derived files."""
+    for path in (
+        store_path,
+        memory_journal.journal_path(store_path),
+        memory_journal.access_log_path(store_path),
+        *index_files(store_path),
+        core_view_path(store_path),
+        memory_mmap.binary_path(store_path),
+        memory_jsonl.offsets_path(store_path),
+    ):
+        path.unlink(missing_ok=True)
+
+
+def shard_stores(memory_dir: Path) -> Dict[str, int]:
+    """
+    Split the JSON stores into month shards (see memory_shards).
+
+    Every record goes to the shard of its timestamp's month, in store
+    order, and the unsharded snapshots are removed. From then on
+    create_storage() returns a ShardedStorage for the directory.
+
+    Args:
+        memory_dir: Memory directory
+
+    Returns:
+        Dict of memory type -> number of shards written
+    """
+    memory_dir = Path(memory_dir)
+    if memory_shards.is_sharded(memory_dir):
+        raise ValueError(f"Already sharded: {memory_dir}")
+
+    source = JsonStorage(memory_dir)
+    manifest = memory_shards.new_manifest()
+    with _migrating([source], memory_shards.manifest_path(memory_dir)):
+        if memory_shards.is_sharded(memory_dir):
+            raise ValueError(f"Already sharded: {memory_dir}")
+        for memory_type in MEMORY_TYPES:
+            groups: Dict[str, Dict[str, Dict]] = {}
+            for memory_id, record in source.load(memory_type).items():
+                groups.setdefault(memory_shards.shard_key(record.get("timestamp")), {})[memory_id] = record
+
+            for key, records in groups.items():
+                store_path = memory_shards.shard_dir(memory_dir, key) / source.files[memory_type].name
+                store_path.parent.mkdir(parents=True, exist_ok=True)
+                memory_journal.compact(store_path, records)
+                memory_mmap.write_binary(store_path, records, JsonStorage._file_signature(store_path))
+            manifest["shards"][memory_type] = sorted(groups)
+
+        # The manifest switches the directory over; only then drop the old stores
+        memory_shards.save_manifest(memory_dir, manifest)
+        for store_path in source.files.values():
+            _remove_store(store_path)
+    return {memory_type: len(keys) for memory_type, keys in manifest["shards"].items()}
+
+
+def merge_shards(memory_dir: Path) -> Dict[str, int]:
+    """
+    Merge month shards back into one store per type (undo shard_stores).
+
+    Args:
+        memory_dir: Memory directory
+
+    Returns:
+        Dict of memory type -> number of merged records
+    """
+    memory_dir = Path(memory_dir)
+    if not memory_shards.is_sharded(memory_dir):
+        raise ValueError(f"Not sharded: {memory_dir}")
+
+    source = ShardedStorage(memory_dir)
+    merged = {}
+    with _migrating(_json_shards(source), memory_shards.manifest_path(memory_dir)):
+        if not memory_shards.is_sharded(memory_dir):
+            raise ValueError(f"Not sharded: {memory_dir}")
+        for memory_type in MEMORY_TYPES:
+            records = source.load(memory_type)
+            store_path = memory_dir / store_file_name(memory_type, source.options["store_format"])
+            memory_journal.compact(store_path, records)
+            memory_mmap.write_binary(store_path, records, JsonStorage._file_signature(store_path))
+            merged[memory_type] = len(records)
+
+        memory_shards.manifest_path(memory_dir).unlink()
+        shutil.rmtree(memory_dir / memory_shards.SHARDS_DIR, ignore_errors=True)
+    return merged
@@ -0,0 +1,296 @@
+"""
+Offline vector index for semantic recall.
+
+Memories are embedded locally, without an embedding service: the content
+is lowercased and stripped of whitespace and punctuation, split into
+character bigrams plus CJK unigrams, and each gram is hashed into one of
+DIMENSIONS signed buckets ("feature hashing"). Bucket weights are
+1 + ln(count). At query time both sides are weighted by the smoothed IDF
+of each bucket, ln((1 + N) / (1 + df)) + 1, and compared by cosine, so
+"我养的猫" still finds "意外是一只黑猫" through the rare "猫" while common
+characters count little. Document frequencies are kept per bucket and
+updated on every write.
+
+With NumPy the vectors are rows of one float32 matrix and a query is a
+matrix-vector product. Small stores are scored brute force; from
+IVF_MIN_ROWS live rows on, the rows are clustered with spherical k-means
+(about sqrt(N) clusters, trained on a sample) and a query only scores the
+rows of the IVF_PROBES clusters nearest to it. New rows join their
+nearest cluster; the clusters are retrained once the store has doubled
+or halved since training. Without NumPy every vector is a sparse dict
+and queries are scored brute force.
+
+The index lives in each store's IndexSet (name "vector"), so JsonStorage
+keeps it in sync with every journal operation. It is not persisted:
+building it costs a pass over the store, so that happens on the first
+semantic search of a process (ensure()), and until then updates are
+ignored.
+"""
+
+import math
+import heapq
+import hashlib
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple, Any
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+DIMENSIONS = 512
+
+# Live rows from which queries go through the clustered index
+IVF_MIN_ROWS = 20000
+# Clusters scored per query (recall vs. speed; about 85% of the exact top 10 at 30k rows)
+IVF_PROBES = 24
+# Rows sampled to train the clusters, and k-means iterations
+IVF_TRAIN_SAMPLE = 20000
+IVF_ITERATIONS = 6
+
+Sparse = Dict[int, float]
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(gram: str) -> Tuple[int, float]:
+    """Bucket and sign of a gram (stable across processes, unlike hash())."""
+    value = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+    return value % DIMENSIONS, (1.0 if value >> 63 else -1.0)
+
+
+def text_features(text: str) -> Sparse:
+    """Hashed gram weights of a text (bucket -> weight, zero buckets dropped)."""
+    text = "".join(ch for ch in text.lower() if ch.isalnum())
+    grams = [text[i:i + 2] for i in range(len(text) - 1)]
+    grams.extend(ch for ch in text if not ch.isascii())
+    if len(text) == 1:
+        grams.append(text)
+
+    counts: Dict[str, int] = {}
+    for gram in grams:
+        counts[gram] = counts.get(gram, 0) + 1
+
+    features: Sparse = {}
+    for gram, count in counts.items():
+        bucket, sign = _bucket(gram)
+        features[bucket] = features.get(bucket, 0.0) + sign * (1 + math.log(count))
+    return {bucket: weight for bucket, weight in features.items() if weight}
+
+
+class VectorIndex:
+    """
+    Hashed n-gram TF-IDF vectors of the active records of one store.
+
+    Implements the MemoryIndex interface of memory_index, lazily: records
+    are only indexed after ensure() built the index from the store.
+    """
+
+    name = "vector"
+    fields = ("status", "content")
+    persisted = False
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.built = False
+        # id -> matrix row (NumPy) or insertion number
+        self.rows: Dict[str, int] = {}
+        self.next_row = 0
+        self.df = [0] * DIMENSIONS
+        # NumPy: one matrix row per record, freed rows are reused
+        self.matrix = None
+        self.row_ids: List[Optional[str]] = []
+        self.free: List[int] = []
+        self.assign = None
+        self.centroids = None
+        self.trained_rows = 0
+        # Without NumPy: sparse vector per record
+        self.vectors: Dict[str, Sparse] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # ---------- MemoryIndex interface ----------
+
+    def attach(self, owner: Any):
+        pass
+
+    def build(self, records: Any):
+        # Built from the whole store by ensure(), on the first semantic search
+        pass
+
+    def add(self, record: Dict):
+        if not self.built or record.get("status") != "active":
+            return
+        features = text_features(record["content"])
+        if not features:
+            return
+        for bucket in features:
+            self.df[bucket] += 1
+
+        memory_id = record["id"]
+        if np is None:
+            self.vectors[memory_id] = features
+            self.rows[memory_id] = self.next_row
+            self.next_row += 1
+            return
+
+        row = self.free.pop() if self.free else self._new_row()
+        self.matrix[row] = 0.0
+        self.matrix[row, list(features)] = list(features.values())
+        self.row_ids[row] = memory_id
+        self.rows[memory_id] = row
+        if self.centroids is not None:
+            self.assign[row] = int(np.argmax(self.centroids @ self._unit_rows([row], self._idf())[0]))
+            if len(self.rows) > 2 * self.trained_rows:
+                self.centroids = None
+
+    def remove(self, record: Dict):
+        memory_id = record["id"]
+        if not self.built or memory_id not in self.rows:
+            return
+        row = self.rows.pop(memory_id)
+        if np is None:
+            features = self.vectors.pop(memory_id)
+        else:
+            features = dict.fromkeys(np.flatnonzero(self.matrix[row]).tolist())
+            self.matrix[row] = 0.0
+            self.row_ids[row] = None
+            self.free.append(row)
+            if self.centroids is not None:
+                self.assign[row] = -1
+                if 2 * len(self.rows) < self.trained_rows:
+                    self.centroids = None
+        for bucket in features:
+            self.df[bucket] -= 1
+
+    # ---------- Building ----------
+
+    def ensure(self, data: Dict[str, Dict]):
+        """Build the index from the store dict unless it is already built."""
+        if self.built:
+            return
+        self._reset()
+        self.built = True
+        if np is not None:
+            self.matrix = np.zeros((max(len(data), 16), DIMENSIONS), dtype=np.float32)
+            self.row_ids = [None] * len(self.matrix)
+            self.free = list(range(len(self.matrix) - 1, -1, -1))
+        for record in data.values():
+            self.add(record)
+
+    def _new_row(self) -> int:
+        """Grow the matrix (doubling) and return the first new row."""
+        size = len(self.matrix)
+        self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        self.row_ids.extend([None] * size)
+        if self.assign is not None:
+            self.assign = np.concatenate([self.assign, np.full(size, -1, dtype=np.int32)])
+        self.free.extend(range(2 * size - 1, size, -1))
+        return size
+
+    def _idf(self):
+        n_docs = len(self.rows)
+        if np is not None:
+            return np.log((1 + n_docs) / (1 + np.asarray(self.df, dtype=np.float64))).astype(np.float32) + 1
+        return [math.log((1 + n_docs) / (1 + df)) + 1 for df in self.df]
+
+    def _unit_rows(self, rows, idf):
+        """IDF-weighted, L2-normalized copies of matrix rows."""
+        weighted = self.matrix[rows] * idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return weighted / norms
+
+    def _train(self, idf):
+        """Cluster the live rows with spherical k-means on a sample."""
+        live = np.array(sorted(self.rows.values()), dtype=np.int64)
+        clusters = max(1, int(math.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        sample = live if len(live) <= IVF_TRAIN_SAMPLE else rng.choice(live, IVF_TRAIN_SAMPLE, replace=False)
+        points = self._unit_rows(sample, idf)
+        centroids = points[rng.choice(len(points), clusters, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            labels = np.argmax(points @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, points)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+
+        self.assign = np.full(len(self.matrix), -1, dtype=np.int32)
+        for start in range(0, len(live), 8192):
+            chunk = live[start:start + 8192]
+            self.assign[chunk] = np.argmax(self._unit_rows(chunk, idf) @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.trained_rows = len(live)
+
+    # ---------- Queries ----------
+
+    def search(self, query: str, k: int, exhaustive: bool = False) -> List[Tuple[str, float]]:
+        """
+        Get the k records most similar to query by cosine.
+
+        Args:
+            query: Search text
+            k: Number of results
+            exhaustive: Score every row even when the store is large
+                enough for the clustered index
+
+        Returns:
+            (id, similarity) pairs, most similar first; records sharing no
+            bucket with the query are left out
+        """
+        features = text_features(query)
+        if not features or not self.rows or k <= 0:
+            return []
+        if np is None:
+            return self._search_sparse(features, k)
+
+        idf = self._idf()
+        query_vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        query_vector[list(features)] = list(features.values())
+        query_vector *= idf
+        query_norm = float(np.linalg.norm(query_vector))
+        if query_norm == 0:
+            return []
+
+        if len(self.rows) >= IVF_MIN_ROWS and not exhaustive:
+            if self.centroids is None:
+                self._train(idf)
+            nearest = np.argsort(-(self.centroids @ (query_vector / query_norm)))[:IVF_PROBES]
+            rows = np.flatnonzero(np.isin(self.assign, nearest))
+            candidates = self.matrix[rows]
+        else:
+            rows = None
+            candidates = self.matrix
+
+        dots = candidates @ (query_vector * idf)
+        norms = np.sqrt(np.einsum("ij,ij,j->i", candidates, candidates, idf * idf))
+        scores = np.where(norms > 0, dots / (np.where(norms > 0, norms, 1) * query_norm), 0.0)
+
+        count = min(k, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.lexsort((top, -scores[top]))]
+        results = []
+        for i in top.tolist():
+            row = int(rows[i]) if rows is not None else i
+            if scores[i] > 0 and self.row_ids[row] is not None:
+                results.append((self.row_ids[row], float(scores[i])))
+        return results
+
+    def _search_sparse(self, features: Sparse, k: int) -> List[Tuple[str, float]]:
+        idf = self._idf()
+        query = {bucket: weight * idf[bucket] for bucket, weight in features.items()}
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+
+        def scored():
+            for memory_id, vector in self.vectors.items():
+                dot = sum(weight * vector[b] * idf[b] for b, weight in query.items() if b in vector)
+                if dot > 0:
+                    norm = math.sqrt(sum((w * idf[b]) ** 2 for b, w in vector.items()))
+                    yield dot / (norm * query_norm), -self.rows[memory_id], memory_id
+
+        return [(memory_id, score) for score, _, memory_id in
+                heapq.nlargest(k, scored(), key=lambda entry: entry[:2])]
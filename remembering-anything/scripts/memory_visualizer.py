@@ -17,6 +17,9 @@ from datetime import datetime, timedelta
 from collections import Counter
 import random
 from path_config import get_user_data_dir, get_outputs_dir
+from memory_storage import read_store
+from memory_columns import ColumnarView
+from memory_schema import MICROS_PER_DAY, to_epoch_micros, from_epoch_micros, record_epoch
 
 
 class MemoryVisualizer:
@@ -32,9 +35,12 @@ class MemoryVisualizer:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
         # Load memories
-        self.facts = self._load_json("memory/facts.json")
-        self.preferences = self._load_json("memory/preferences.json")
-        self.experiences = self._load_json("memory/experiences.json")
+        self.facts = self._load_store("fact")
+        self.preferences = self._load_store("preference")
+        self.experiences = self._load_store("experience")
+
+        # Columnar metadata for statistics
+        self.columns = [ColumnarView(store) for store in (self.facts, self.preferences, self.experiences)]
 
     def _load_json(self, relative_path):
         """Load JSON file from user-data."""
@@ -44,6 +50,10 @@ class MemoryVisualizer:
                 return json.load(f)
         return {}
 
+    def _load_store(self, memory_type):
+        """Load a memory store from user-data/memory via the configured backend."""
+        return read_store(self.user_data / "memory", memory_type, compact=True)
+
     def generate_html(self):
         """Generate the main HTML visualization."""
         # Calculate statistics
@@ -313,13 +323,8 @@ class MemoryVisualizer:
 
     def _calculate_stats(self):
         """Calculate memory statistics."""
-        all_memories = list(self.facts.values()) + list(self.preferences.values()) + list(self.experiences.values())
-
         # Get date range
-        dates = []
-        for mem in all_memories:
-            if 'timestamp' in mem:
-                dates.append(datetime.fromisoformat(mem['timestamp'].replace('Z', '+00:00')))
+        dates = [date for date in (columns.earliest() for columns in self.columns) if date]
 
         days_recorded = 0
         if dates:
@@ -327,7 +332,7 @@ class MemoryVisualizer:
             days_recorded = (datetime.now() - earliest).days + 1
 
         return {
-            'total_memories': len(all_memories),
+            'total_memories': sum(len(columns) for columns in self.columns),
             'facts_count': len(self.facts),
             'preferences_count': len(self.preferences),
             'experiences_count': len(self.experiences),
@@ -341,24 +346,21 @@ class MemoryVisualizer:
 
         for memory_dict in [self.facts, self.preferences, self.experiences]:
             for mem_id, mem in memory_dict.items():
-                if 'timestamp' in mem:
-                    timeline_items.append({
-                        'date': datetime.fromisoformat(mem['timestamp'].replace('Z', '+00:00')),
-                        'content': mem.get('content', ''),
-                        'type': mem.get('type', 'memory')
-                    })
+                epoch = record_epoch(mem, 'timestamp')
+                if epoch is not None:
+                    timeline_items.append((epoch, mem))
 
         # Sort by date
-        timeline_items.sort(key=lambda x: x['date'], reverse=True)
+        timeline_items.sort(key=lambda x: x[0], reverse=True)
 
         # Generate HTML for recent items
         html = ""
-        for item in timeline_items[:10]:  # Show last 10 items
-            date_str = item['date'].strftime('%Y-%m-%d')
+        for epoch, mem in timeline_items[:10]:  # Show last 10 items
+            date_str = from_epoch_micros(epoch).strftime('%Y-%m-%d')
             html += f"""
                 <div class="timeline-item">
                     <div class="timeline-date">{date_str}</div>
-                    <div class="timeline-content">{item['content']}</div>
+                    <div class="timeline-content">{mem.get('content', '')}</div>
                 </div>
             """
 
@@ -406,8 +408,9 @@ class MemoryVisualizer:
             return ""
 
         # Calculate days with cat
-        timestamp = datetime.fromisoformat(cat_memory['timestamp'].replace('Z', '+00:00'))
-        days = (datetime.now() - timestamp).days + 1
+        epoch = record_epoch(cat_memory, 'timestamp')
+        timestamp = from_epoch_micros(epoch)
+        days = (to_epoch_micros(datetime.now()) - epoch) // MICROS_PER_DAY + 1
 
         # Check if image exists
         image_path = self.user_data / "media" / "images" / "意外.jpg"
@@ -14,6 +14,40 @@ import subprocess
 import re
 from pathlib import Path
 
+# 同一进程内按目录缓存检测结果（常驻进程 memory_daemon 每次调用都要检测），
+# CLAUDE.md 或 git 配置变化后失效：cwd -> (文件签名, 结果)
+_detect_cache: dict = {}
+
+
+def _file_signature(path: Path) -> tuple | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _detect_signature(cwd: Path) -> tuple | None:
+    """
+    检测结果依赖的文件签名：两处 CLAUDE.md 和所在仓库的 .git/config
+
+    .git 是文件（worktree、子模块）时配置位置不确定，返回 None（不缓存）
+    """
+    git_config = None
+    for directory in (cwd, *cwd.parents):
+        git = directory / ".git"
+        if git.is_dir():
+            git_config = git / "config"
+            break
+        if git.exists():
+            return None
+    return (
+        _file_signature(cwd / ".claude" / "CLAUDE.md"),
+        _file_signature(cwd / "CLAUDE.md"),
+        str(git_config),
+        _file_signature(git_config) if git_config else None,
+    )
+
 
 def detect_from_claude_md() -> str | None:
     """从 CLAUDE.md 读取 project_id"""
@@ -89,9 +123,23 @@ def detect_project() -> dict:
         "source": "claude_md" | "git_remote" | "directory",
         "cwd": "/absolute/path/to/project"
     }
+
+    同一进程内重复检测同一目录时直接返回缓存（相关文件未变化）
     """
-    cwd = str(Path.cwd())
+    cwd_path = Path.cwd()
+    signature = _detect_signature(cwd_path)
+    cached = _detect_cache.get(cwd_path)
+    if signature is not None and cached is not None and cached[0] == signature:
+        return dict(cached[1])
+
+    result = _detect(str(cwd_path))
+    if signature is not None:
+        _detect_cache[cwd_path] = (signature, result)
+    return dict(result)
+
 
+def _detect(cwd: str) -> dict:
+    """按优先级检测（不使用缓存）"""
     # 1. 尝试从 CLAUDE.md 读取
     project_id = detect_from_claude_md()
     if project_id:
@@ -21,6 +21,7 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent))
 
 from project_detector import detect_project
+from memory_storage import read_store, read_recent
 
 # 获取 skill 目录
 SKILL_DIR = Path(__file__).parent.parent
@@ -39,12 +40,17 @@ def load_json_file(file_path: Path) -> dict | list:
         return {}
 
 
-def load_global_memory() -> dict:
-    """加载全局记忆（直接在 memory 目录下）"""
+def load_global_memory(storage=None) -> dict:
+    """加载全局记忆（直接在 memory 目录下；有二进制快照时按需解码，不解析整个 JSON）
+
+    experiences 不在这里加载，最近经历由 load_recent_from_experiences 单独读取
+    传入 storage（常驻进程已加载的存储）时直接使用其缓存
+    """
+    if storage is not None:
+        return {"facts": storage.load("fact"), "preferences": storage.load("preference")}
     return {
-        "facts": load_json_file(MEMORY_DIR / "facts.json"),
-        "preferences": load_json_file(MEMORY_DIR / "preferences.json"),
-        "experiences": load_json_file(MEMORY_DIR / "experiences.json")
+        "facts": read_store(MEMORY_DIR, "fact", lazy=True),
+        "preferences": read_store(MEMORY_DIR, "preference", lazy=True)
     }
 
 
@@ -60,26 +66,20 @@ def load_project_memory(project_id: str) -> dict | None:
     return None
 
 
-def load_recent_from_experiences() -> dict | None:
+def load_recent_from_experiences(storage=None) -> dict | None:
     """
     从 experiences.json 读取最近的经历
 
     experiences.json 是会被 memory_staging.py 实际更新的文件
+    （按月分片时只读最新的分片）
     返回最近一条 experience，格式：
     {"content": "...", "date": "...", "status": "active"}
     """
-    experiences_file = MEMORY_DIR / "experiences.json"
-    if not experiences_file.exists():
-        return None
-
-    data = load_json_file(experiences_file)
-    if not data:
-        return None
-
-    # 按 timestamp 排序，取最新的
-    experiences = list(data.values())
-    experiences.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-
+    # 按 timestamp 取最新的一条
+    if storage is not None:
+        experiences = storage.recent("experience", 1, status=None)
+    else:
+        experiences = read_recent(MEMORY_DIR, "experience", 1)
     if not experiences:
         return None
 
@@ -175,8 +175,8 @@ def format_project_summary(project_mem: dict | None) -> dict:
     return project_mem
 
 
-def main():
-    """主函数：加载记忆并输出简化摘要"""
+def main(storage=None):
+    """主函数：加载记忆并输出简化摘要（storage 见 load_global_memory）"""
     try:
         # 1. 检测当前项目
         project_info = detect_project()
@@ -184,7 +184,7 @@ def main():
         project_source = project_info.get("source")
 
         # 2. 加载全局记忆
-        global_mem = load_global_memory()
+        global_mem = load_global_memory(storage)
         core = extract_core_info(global_mem)
 
         # 3. 加载项目记忆（任何有 project_id 的情况都尝试加载）
@@ -219,7 +219,7 @@ def main():
 
         # 如果项目没有活动，使用全局 experiences 的最新记录
         if not recent_content:
-            global_recent = load_recent_from_experiences()
+            global_recent = load_recent_from_experiences(storage)
             if global_recent:
                 recent_content = global_recent["content"]
                 recent_date = global_recent["date"]
@@ -14,6 +14,10 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Any
 
+from memory_storage import read_store
+from memory_columns import ColumnarView
+from memory_schema import MICROS_PER_DAY, to_epoch_micros, from_epoch_micros, record_epoch
+
 
 class SmartReminder:
     """Generate smart reminders with personality."""
@@ -25,9 +29,14 @@ class SmartReminder:
         self.user_data = self.skill_dir / "user-data"
 
         # Load memories
-        self.facts = self._load_json("memory/facts.json")
-        self.preferences = self._load_json("memory/preferences.json")
-        self.experiences = self._load_json("memory/experiences.json")
+        self.facts = self._load_store("fact")
+        self.preferences = self._load_store("preference")
+        self.experiences = self._load_store("experience")
+
+        # Columnar metadata for the time/status/category filters
+        self.fact_columns = ColumnarView(self.facts)
+        self.preference_columns = ColumnarView(self.preferences)
+        self.experience_columns = ColumnarView(self.experiences)
 
         # Load or create reminder history
         self.reminder_history = self._load_json("memory/reminder_history.json")
@@ -40,6 +49,10 @@ class SmartReminder:
                 return json.load(f)
         return {}
 
+    def _load_store(self, memory_type: str) -> dict:
+        """Load a memory store from user-data/memory via the configured backend."""
+        return read_store(self.user_data / "memory", memory_type, compact=True)
+
     def _save_json(self, data: dict, relative_path: str):
         """Save JSON file to user-data."""
         file_path = self.user_data / relative_path
@@ -91,8 +104,7 @@ class SmartReminder:
             return None
 
         # Calculate days
-        timestamp = datetime.fromisoformat(cat_memory['timestamp'].replace('Z', '+00:00'))
-        days = (datetime.now() - timestamp).days + 1
+        days = (to_epoch_micros(datetime.now()) - record_epoch(cat_memory, 'timestamp')) // MICROS_PER_DAY + 1
 
         # Different reminders based on milestones
         reminders = []
@@ -120,18 +132,21 @@ class SmartReminder:
 
         # Check recent experiences for projects
         recent_projects = []
-        for exp in self.experiences.values():
-            if exp.get('status') == 'active':
-                content = exp.get('content', '')
-                if '项目' in content or '代码' in content or '开发' in content:
-                    # Check last update
-                    last_update = datetime.fromisoformat(exp['last_updated'].replace('Z', '+00:00'))
-                    days_since = (datetime.now() - last_update).days
-
-                    if days_since > 7:
-                        reminders.append(f"（戳戳）那个{content[:20]}...好久没动了，还记得吗？")
-                    elif days_since > 3:
-                        reminders.append(f"（歪头）{content[:20]}进展怎么样了？")
+        now = to_epoch_micros(datetime.now())
+        for exp_id in self.experience_columns.where(status='active'):
+            exp = self.experiences[exp_id]
+            content = exp.get('content', '')
+            if '项目' in content or '代码' in content or '开发' in content:
+                # Check last update
+                last_update = record_epoch(exp, 'last_updated')
+                if last_update is None:
+                    continue
+                days_since = (now - last_update) // MICROS_PER_DAY
+
+                if days_since > 7:
+                    reminders.append(f"（戳戳）那个{content[:20]}...好久没动了，还记得吗？")
+                elif days_since > 3:
+                    reminders.append(f"（歪头）{content[:20]}进展怎么样了？")
 
         return reminders[:2]  # Max 2 work reminders
 
@@ -141,14 +156,17 @@ class SmartReminder:
         now = datetime.now()
 
         # Check for monthly anniversaries
-        for fact in self.facts.values():
-            if fact.get('category') == 'location':
-                timestamp = datetime.fromisoformat(fact['timestamp'].replace('Z', '+00:00'))
-                months = (now.year - timestamp.year) * 12 + now.month - timestamp.month
-
-                if months > 0 and now.day == timestamp.day:
-                    location = fact.get('content', '某地')
-                    reminders.append(f"（回忆）在{location}已经{months}个月了呢")
+        for fact_id in self.fact_columns.where(category='location'):
+            fact = self.facts[fact_id]
+            epoch = record_epoch(fact, 'timestamp')
+            if epoch is None:
+                continue
+            timestamp = from_epoch_micros(epoch)
+            months = (now.year - timestamp.year) * 12 + now.month - timestamp.month
+
+            if months > 0 and now.day == timestamp.day:
+                location = fact.get('content', '某地')
+                reminders.append(f"（回忆）在{location}已经{months}个月了呢")
 
         return reminders[:1]  # Max 1 milestone reminder
 
@@ -158,12 +176,10 @@ class SmartReminder:
         old_memories = []
         cutoff = datetime.now() - timedelta(days=7)
 
-        for memory_dict in [self.facts, self.preferences, self.experiences]:
-            for mem in memory_dict.values():
-                if 'timestamp' in mem:
-                    timestamp = datetime.fromisoformat(mem['timestamp'].replace('Z', '+00:00'))
-                    if timestamp < cutoff:
-                        old_memories.append(mem)
+        for memory_dict, columns in [(self.facts, self.fact_columns),
+                                     (self.preferences, self.preference_columns),
+                                     (self.experiences, self.experience_columns)]:
+            old_memories.extend(memory_dict[mem_id] for mem_id in columns.where(before=cutoff))
 
         if not old_memories:
             return None
@@ -0,0 +1,78 @@
+"""Concurrent writer processes sharing one memory directory (memory_lock)."""
+
+import sys
+import json
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import memory_lock
+from memory_manager import MemoryManager
+from memory_storage import create_storage
+
+PROCESSES = 8
+ROUNDS = 50
+# Small enough that the journals are compacted while the writers run
+JOURNAL_BYTES = 16 * 1024
+
+
+def writer(memory_dir: str, number: int, hot_id: str, start, errors):
+    """Each round adds a fact, counts an access to a fact every writer touches and stages an item."""
+    try:
+        import memory_staging
+        from memory_lock import StoreLock, lock_path
+
+        # Stage into the test directory instead of the user's staging area
+        memory_staging.STAGING_FILE = Path(memory_dir) / ".staging.json"
+        memory_staging._STAGING_LOCK = StoreLock(lock_path(memory_staging.STAGING_FILE))
+        mm = MemoryManager(memory_dir, journal_threshold=JOURNAL_BYTES, similarity_threshold=None)
+
+        start.wait()
+        for i in range(ROUNDS):
+            mm.add_fact(f"writer {number} fact {i}", category="stress", source="test")
+            mm.mark_accessed(hot_id, "fact")
+            memory_staging.add_to_staging("experience", f"writer {number} staged {i}")
+            if i % 10 == 9:
+                mm.flush_access()
+        mm.flush_access()
+        mm.close()
+    except BaseException as e:
+        errors.put(f"writer {number}: {e!r}")
+        raise
+
+
+@pytest.mark.skipif(memory_lock.fcntl is None, reason="file locks need fcntl")
+def test_concurrent_writers_lose_nothing(tmp_path):
+    mm = MemoryManager(str(tmp_path))
+    hot_id = mm.add_fact("每个进程都会访问的事实", category="hot", source="test")
+    mm.close()
+
+    start = multiprocessing.Event()
+    errors = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=writer, args=(str(tmp_path), n, hot_id, start, errors))
+                 for n in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    start.set()
+    for process in processes:
+        process.join(timeout=300)
+
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    assert failures == []
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    # Read back from disk with a fresh storage
+    expected = {f"writer {n} fact {i}" for n in range(PROCESSES) for i in range(ROUNDS)}
+    facts = create_storage(tmp_path).load("fact")
+    added = [m["content"] for m in facts.values() if m["category"] == "stress"]
+    assert sorted(added) == sorted(expected)
+    assert facts[hot_id]["access_count"] == PROCESSES * ROUNDS
+
+    with open(tmp_path / ".staging.json", "r", encoding="utf-8") as f:
+        staged = [item["content"] for item in json.load(f)]
+    assert sorted(staged) == sorted(f"writer {n} staged {i}" for n in range(PROCESSES) for i in range(ROUNDS))
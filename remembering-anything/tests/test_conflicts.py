@@ -0,0 +1,26 @@
+"""Conflict maintenance of MemoryManager fact writes."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from memory_manager import MemoryManager
+from memory_conflicts import conflict_id
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_moving_fact_out_of_single_value_category_clears_conflict(tmp_path, backend):
+    mm = MemoryManager(str(tmp_path), backend=backend)
+    mm.add_fact("住在北京", category="location", source="test")
+    moved = mm.add_fact("住在上海", category="location", source="test")
+    assert [c["conflict_id"] for c in mm.detect_conflicts()] == [conflict_id("location")]
+
+    assert mm.update_fact(moved, category="hobby")
+    assert mm.detect_conflicts() == []
+    mm.close()
+
+    # The saved report is gone too, not only this manager's view
+    assert MemoryManager(str(tmp_path), backend=backend).detect_conflicts() == []
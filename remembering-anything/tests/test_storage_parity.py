@@ -0,0 +1,111 @@
+"""The JSON and SQLite backends (and a migrated JSON directory) answer the same queries alike."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from memory_manager import MemoryManager
+from memory_schema import EPOCH_FIELDS
+from memory_storage import migrate_json_to_sqlite
+
+# Differ between two runs of the same workload
+VOLATILE = {"id", "supersedes", *EPOCH_FIELDS, *EPOCH_FIELDS.values()}
+
+
+def workload(mm: MemoryManager):
+    """Adds, updates, deprecations, deletions and accesses across all three stores."""
+    python = mm.add_fact("Python 是主力语言", category="skill", source="test",
+                         tags=["python", "编程"], importance="core", context_tags=["coding"])
+    mm.add_fact("也写一些 Rust", category="skill", source="test", tags=["rust"], context_tags=["coding"])
+    beijing = mm.add_fact("住在北京", category="location", source="test", importance="core")
+    mm.add_fact("住在上海", category="location", source="test", supersedes=beijing)
+    moved = mm.add_fact("每天跑步五公里", category="habit", source="test", context_tags=["health"])
+    gone = mm.add_fact("临时记录，稍后删除", category="misc", source="test")
+    mm.add_fact("周末写 Python 小工具", category="hobby", source="test",
+                tags=["python"], importance="contextual", context_tags=["coding", "weekend"])
+
+    mm.add_preference("代码注释用中文", category="communication", source="test",
+                      strength="strong", importance="core", context_tags=["coding"])
+    mm.add_preference("回答尽量简短", category="communication", source="test", tags=["style"])
+    mm.add_preference("不吃香菜", category="food", source="test", importance="archived")
+
+    trip = mm.add_experience("2025 年去过成都", category="travel", source="test",
+                             date="2025-05", outcome="喜欢火锅", context_tags=["travel"])
+    mm.add_experience("用 Python 重写了数据管道", category="work", source="test",
+                      outcome="性能提升三倍", tags=["python"], importance="core", context_tags=["coding"])
+
+    mm.update_fact(moved, category="health", tags=["跑步"], importance="active")
+    mm.update_fact(python, confidence=0.9)
+    mm.delete_memory(gone, "fact")
+    mm.deprecate_memory(trip, "experience")
+    for memory_id, memory_type in ((python, "fact"), (python, "fact"), (moved, "fact")):
+        mm.mark_accessed(memory_id, memory_type)
+
+
+QUERIES = {
+    "active facts": lambda mm: mm.get_active_facts(),
+    "active facts by category": lambda mm: mm.get_active_facts(category="skill"),
+    "active facts, first page": lambda mm: mm.get_active_facts(limit=2),
+    "active preferences": lambda mm: mm.get_active_preferences(),
+    "active experiences": lambda mm: mm.get_active_experiences(),
+    "search": lambda mm: mm.search_memories("python"),
+    "search one type": lambda mm: mm.search_memories("住在", memory_type="fact"),
+    "search bm25": lambda mm: mm.search_memories("Python 工具", rank="bm25", top_k=3),
+    "context": lambda mm: mm.query_by_context(["coding", "health"], limit=10),
+    "core": lambda mm: mm.get_memories_by_importance("core"),
+    "archived": lambda mm: mm.get_memories_by_importance("archived"),
+    "statistics": lambda mm: {k: v for k, v in mm.get_statistics().items() if k != "last_updated"},
+}
+
+
+def normalize(value):
+    """Drop ids, timestamps and epochs, which differ between runs, from query results."""
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items() if k not in VOLATILE}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return value
+
+
+def run_queries(mm: MemoryManager):
+    return {name: normalize(query(mm)) for name, query in QUERIES.items()}
+
+
+@pytest.fixture(scope="module")
+def expected(tmp_path_factory):
+    mm = MemoryManager(str(tmp_path_factory.mktemp("json")), backend="json")
+    workload(mm)
+    results = run_queries(mm)
+    mm.close()
+    return results
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_backends_agree(tmp_path, expected, backend):
+    mm = MemoryManager(str(tmp_path), backend=backend)
+    workload(mm)
+    results = run_queries(mm)
+    mm.close()
+    for name in QUERIES:
+        assert results[name] == expected[name], name
+
+
+def test_migrated_directory_agrees(tmp_path, expected):
+    mm = MemoryManager(str(tmp_path), backend="json")
+    workload(mm)
+    before = {name: query(mm) for name, query in QUERIES.items()}
+    mm.close()
+
+    migrate_json_to_sqlite(tmp_path)
+    mm = MemoryManager(str(tmp_path))
+    assert mm.storage.backend_name == "sqlite"
+    after = {name: query(mm) for name, query in QUERIES.items()}
+    mm.close()
+
+    # The migration keeps ids and timestamps: the results match field for field
+    for name in QUERIES:
+        assert after[name] == before[name], name
+        assert normalize(after[name]) == expected[name], name